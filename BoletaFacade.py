@@ -1,11 +1,69 @@
-from fpdf import FPDF
 from datetime import datetime
+import hashlib
+import json
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
 import os
 from database import get_db_session
-from models import Pedido as PedidoModel, PedidoItem
+from models import Boleta, Pedido as PedidoModel, PedidoItem
 from sqlalchemy.orm import Session, joinedload
 from crud import boleta_crud
 from error_handler import logger, RestauranteException
+from plantilla_boleta import obtener_plantilla
+
+# Raíz del árbol de boletas (se reparte por AAAA/MM/DD, ver ruta_boleta)
+BOLETAS_DIR = "boletas"
+
+# Pool compartido para generar boletas fuera del hilo principal de Tk.
+# Pocos workers: cada boleta abre su propia sesión de BD.
+_pool_boletas = ThreadPoolExecutor(max_workers=2, thread_name_prefix="boletas")
+
+
+def _renderizar_pdf(datos: dict) -> bytes:
+    """
+    Dibuja la boleta descrita por ``datos`` (ver BoletaFacade._datos_pdf) y
+    retorna el contenido del PDF. Usa la plantilla compilada del hilo: las
+    regiones fijas ya están dibujadas y solo se agregan los datos del pedido.
+    """
+    return obtener_plantilla().renderizar(datos)
+
+
+def ruta_boleta(pedido_id: int, fecha: datetime, datos: dict) -> str:
+    """
+    Ruta de una boleta: ``boletas/AAAA/MM/DD/boleta_<pedido_id>_<hash>.pdf``.
+
+    El directorio se reparte por la fecha del pedido para que ninguno crezca
+    sin límite. El hash es de los datos de la boleta (ver
+    BoletaFacade._datos_pdf), no de los bytes del PDF, que incluyen la fecha
+    de creación: regenerar la misma boleta da el mismo archivo y dos boletas
+    distintas nunca lo comparten.
+    """
+    canonico = json.dumps({'pedido_id': pedido_id, **datos}, sort_keys=True, default=str)
+    digest = hashlib.sha256(canonico.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(BOLETAS_DIR, fecha.strftime("%Y"), fecha.strftime("%m"), fecha.strftime("%d"),
+                        f"boleta_{pedido_id}_{digest}.pdf")
+
+
+def _guardar_pdf(contenido: bytes, pdf_path: str) -> str:
+    """Escribe el PDF de forma atómica (archivo temporal + os.replace)."""
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    temporal = f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, pdf_path)
+    return pdf_path
+
+
+def _generar_pdf(datos: dict, pedido_id: int) -> str:
+    """
+    Dibuja y guarda la boleta de un pedido; retorna la ruta del PDF. Es una
+    función de módulo para poder ejecutarla en un ProcessPoolExecutor.
+    """
+    contenido = _renderizar_pdf(datos)
+    return _guardar_pdf(contenido, ruta_boleta(pedido_id, datos['fecha_pedido'], datos))
+
 
 class BoletaFacade:
     """
@@ -34,101 +92,47 @@ class BoletaFacade:
                 joinedload(PedidoModel.cliente)
             ).filter(PedidoModel.id == self.pedido_id).one_or_none()
 
-            print(f"DEBUG: Buscando pedido con ID: {self.pedido_id}") # Debug print
             if pedido_db:
-                print(f"DEBUG: Pedido con ID {self.pedido_id} encontrado.") # Debug print
-                self.fecha_pedido = pedido_db.fecha
-                self.total = float(pedido_db.total)
-                self.subtotal = round(self.total / 1.19, 2)
-                self.iva = round(self.total - self.subtotal, 2)
-
-                # Obtener información del cliente
-                if pedido_db.cliente:
-                    self.cliente_nombre = f"{pedido_db.cliente.nombre} {pedido_db.cliente.apellido}"
-                    self.cliente_email = pedido_db.cliente.email
-
-                for item in pedido_db.items:
-                    self.detalle_items.append({
-                        'nombre': item.menu.nombre,
-                        'cantidad': item.cantidad,
-                        'precio_unitario': float(item.precio_unitario)
-                    })
+                self._cargar_detalle(pedido_db)
                 return True  # Indicar que los detalles se cargaron correctamente
-            print(f"DEBUG: Pedido con ID {self.pedido_id} NO encontrado.") # Debug print
+            logger.warning(f"Pedido con ID {self.pedido_id} no encontrado para generar boleta")
             return False  # Indicar que no se encontró el pedido
         finally:
             session.close()
 
-    def crear_pdf(self):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(0, 10, "Boleta Restaurante", ln=True, align='L')
-        pdf.set_font("Arial", size=12)
-        pdf.cell(0, 10, "Razón Social del Negocio", ln=True, align='L')
-        pdf.cell(0, 10, "RUT: 12345678-9", ln=True, align='L')
-        pdf.cell(0, 10, "Dirección: Calle Falsa 123", ln=True, align='L')
-        pdf.cell(0, 10, "Teléfono: +56 9 1234 5678", ln=True, align='L')
-        pdf.ln(5)
-        
-        # Información del cliente
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Datos del Cliente", ln=True, align='L')
-        pdf.set_font("Arial", size=11)
-        pdf.cell(0, 8, f"Cliente: {self.cliente_nombre}", ln=True, align='L')
-        pdf.cell(0, 8, f"Email: {self.cliente_email}", ln=True, align='L')
-        pdf.cell(0, 8, f"Fecha: {self.fecha_pedido.strftime('%d/%m/%Y %H:%M:%S')}", ln=True, align='L')
-        pdf.ln(10)
-        
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(70, 10, "Nombre", border=1)
-        pdf.cell(20, 10, "Cantidad", border=1)
-        pdf.cell(35, 10, "Precio Unitario", border=1)
-        pdf.cell(30, 10, "Subtotal", border=1)
-        pdf.ln()
-        
-        pdf.set_font("Arial", size=12)
-        for item in self.detalle_items:
-            nombre = item['nombre']
-            cantidad = item['cantidad']
-            precio_unitario = item['precio_unitario']
-            subtotal_item = precio_unitario * cantidad
-            pdf.cell(70, 10, nombre, border=1)
-            pdf.cell(20, 10, str(cantidad), border=1)
-            pdf.cell(35, 10, f"${precio_unitario:.2f}", border=1)
-            pdf.cell(30, 10, f"${subtotal_item:.2f}", border=1)
-            pdf.ln()
-
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(120, 10, "Subtotal:", 0, 0, 'R')
-        pdf.cell(30, 10, f"${self.subtotal:.2f}", ln=True, align='R')
-        
-        pdf.cell(120, 10, "IVA (19%):", 0, 0, 'R')
-        pdf.cell(30, 10, f"${self.iva:.2f}", ln=True, align='R')
-        
-        pdf.cell(120, 10, "Total:", 0, 0, 'R')
-        pdf.cell(30, 10, f"${self.total:.2f}", ln=True, align='R')
-        
-        pdf.set_font("Arial", 'I', 10)
-        pdf.cell(0, 10, "Gracias por su compra. Para cualquier consulta, llámenos al +56 9 777 5678.", 0, 1, 'C')
-        pdf.cell(0, 10, "Los productos adquiridos no tienen garantía.", 0, 1, 'C')
-        
+    def _cargar_detalle(self, pedido_db):
+        """Copia a la fachada los datos de un pedido ya cargado con items, menús y cliente."""
+        self.fecha_pedido = pedido_db.fecha
+        self.total = float(pedido_db.total)
+        self.subtotal = round(self.total / 1.19, 2)
+        self.iva = round(self.total - self.subtotal, 2)
 
-        # Crear un nombre único para la boleta usando timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        pdf_filename = f"boleta_{timestamp}.pdf"
-        
-        # Crear directorio para boletas si no existe
-        boletas_dir = "boletas"
-        if not os.path.exists(boletas_dir):
-            os.makedirs(boletas_dir)
-            
-        # Guardar en el directorio de boletas
-        pdf_path = os.path.join(boletas_dir, pdf_filename)
-        pdf.output(pdf_path)
-        return pdf_path
+        # Obtener información del cliente
+        if pedido_db.cliente:
+            self.cliente_nombre = f"{pedido_db.cliente.nombre} {pedido_db.cliente.apellido}"
+            self.cliente_email = pedido_db.cliente.email
+
+        for item in pedido_db.items:
+            self.detalle_items.append({
+                'nombre': item.menu.nombre,
+                'cantidad': item.cantidad,
+                'precio_unitario': float(item.precio_unitario)
+            })
+
+    def _datos_pdf(self) -> dict:
+        """Datos necesarios para dibujar la boleta, en un dict serializable (apto para otro proceso)."""
+        return {
+            'cliente_nombre': self.cliente_nombre,
+            'cliente_email': self.cliente_email,
+            'fecha_pedido': self.fecha_pedido,
+            'detalle_items': self.detalle_items,
+            'subtotal': self.subtotal,
+            'iva': self.iva,
+            'total': self.total,
+        }
+
+    def crear_pdf(self):
+        return _generar_pdf(self._datos_pdf(), self.pedido_id)
 
     def generar_boleta(self):
         """
@@ -145,9 +149,42 @@ class BoletaFacade:
         logger.info(f"PDF de boleta creado en: {pdf_path}")
         
         # Guardar boleta en la BD
+        self._registrar_boleta(pdf_path)
+        return pdf_path
+
+    def generar_boleta_en_memoria(self) -> Tuple[bytes, str, Future]:
+        """
+        Genera la boleta sin pasar por disco en el camino crítico.
+
+        El PDF se dibuja en memoria y se retorna de inmediato para mostrarlo
+        (``CTkPDFViewer(stream=...)``); la escritura del archivo y el registro
+        en la BD quedan encolados en el pool de boletas.
+
+        Returns:
+            (contenido del PDF, ruta donde se guardará, Future del guardado)
+        """
+        if not self.generar_detalle_boleta():
+            raise RestauranteException(
+                f"No se pudo generar la boleta porque el pedido con ID {self.pedido_id} no fue encontrado."
+            )
+
+        datos = self._datos_pdf()
+        contenido = _renderizar_pdf(datos)
+        pdf_path = ruta_boleta(self.pedido_id, self.fecha_pedido, datos)
+        guardado = _pool_boletas.submit(self._persistir_pdf, contenido, pdf_path)
+        return contenido, pdf_path, guardado
+
+    def _persistir_pdf(self, contenido: bytes, pdf_path: str) -> str:
+        """Escribe el PDF ya dibujado y registra la boleta en la BD."""
+        _guardar_pdf(contenido, pdf_path)
+        logger.info(f"PDF de boleta creado en: {pdf_path}")
+        self._registrar_boleta(pdf_path)
+        return pdf_path
+
+    def _registrar_boleta(self, pdf_path: str):
+        """Guarda la boleta (montos y ruta del PDF) en la BD."""
         session = get_db_session()
         try:
-            from decimal import Decimal
             boleta = boleta_crud.create_boleta(
                 session=session,
                 pedido_id=self.pedido_id,
@@ -158,9 +195,115 @@ class BoletaFacade:
                 estado='generada'
             )
             logger.info(f"Boleta guardada en BD - ID: {boleta.id}, Pedido ID: {self.pedido_id}")
-            return pdf_path
+            return boleta
         except Exception as e:
             logger.error(f"Error al guardar boleta en BD: {str(e)}", exc_info=True)
             raise RestauranteException(f"Error al guardar boleta en BD: {str(e)}")
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    @staticmethod
+    def buscar_pdf(pedido_id: int) -> Optional[str]:
+        """Ruta del PDF de la boleta de un pedido, consultando la BD (sin recorrer directorios)."""
+        session: Session = get_db_session()
+        try:
+            boleta = boleta_crud.get_boleta_by_pedido_id(session, pedido_id)
+            return boleta.pdf_path if boleta else None
+        finally:
+            session.close()
+
+    @classmethod
+    def generar_lote(cls, pedido_ids: Iterable[int], procesos: Optional[int] = None) -> Dict[int, str]:
+        """
+        Genera las boletas de muchos pedidos a la vez (p. ej. reimpresión de
+        todo un día tras una caída).
+
+        Carga todos los pedidos con sus items, menús y clientes en una sola
+        consulta, dibuja los PDF en paralelo con un ProcessPoolExecutor y
+        registra todas las boletas nuevas con un único bulk_insert_mappings
+        (las que ya existían solo actualizan su PDF).
+
+        Args:
+            pedido_ids: IDs de los pedidos
+            procesos: Procesos del pool (por defecto, uno por CPU)
+
+        Returns:
+            Dict pedido_id -> ruta del PDF. Los pedidos inexistentes se omiten.
+        """
+        pedido_ids = list(dict.fromkeys(pedido_ids))
+        if not pedido_ids:
+            return {}
+
+        session: Session = get_db_session()
+        try:
+            pedidos_db = session.query(PedidoModel).options(
+                joinedload(PedidoModel.items).joinedload(PedidoItem.menu),
+                joinedload(PedidoModel.cliente)
+            ).filter(PedidoModel.id.in_(pedido_ids)).all()
+
+            fachadas = []
+            for pedido_db in pedidos_db:
+                fachada = cls(pedido_db.id)
+                fachada._cargar_detalle(pedido_db)
+                fachadas.append(fachada)
+            faltantes = set(pedido_ids) - {fachada.pedido_id for fachada in fachadas}
+            if faltantes:
+                logger.warning(f"Lote de boletas: {len(faltantes)} pedidos no encontrados: {sorted(faltantes)}")
+
+            inicio = datetime.now()
+            procesos = procesos or os.cpu_count() or 1
+            # Bloques grandes: cada boleta es barata y así se reduce el costo de IPC
+            chunksize = max(1, len(fachadas) // (4 * procesos))
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                rutas = list(pool.map(_generar_pdf, [f._datos_pdf() for f in fachadas],
+                                      [f.pedido_id for f in fachadas], chunksize=chunksize))
+
+            # Una reimpresión reemplaza el PDF de la boleta existente (una por pedido)
+            existentes = dict(session.query(Boleta.pedido_id, Boleta.id).filter(
+                Boleta.pedido_id.in_([fachada.pedido_id for fachada in fachadas])
+            ).all())
+            # Hora UTC sin zona, como el default de la columna y boleta_crud.create_boleta
+            generada = datetime.utcnow()
+            nuevas, reimpresas = [], []
+            for fachada, ruta in zip(fachadas, rutas):
+                fila = {
+                    'fecha_generacion': generada,
+                    'subtotal': Decimal(str(fachada.subtotal)),
+                    'iva': Decimal(str(fachada.iva)),
+                    'total': Decimal(str(fachada.total)),
+                    'pdf_path': ruta,
+                    'estado': 'generada',
+                }
+                if fachada.pedido_id in existentes:
+                    fila['id'] = existentes[fachada.pedido_id]
+                    reimpresas.append(fila)
+                else:
+                    fila['pedido_id'] = fachada.pedido_id
+                    nuevas.append(fila)
+            session.bulk_insert_mappings(Boleta, nuevas)
+            session.bulk_update_mappings(Boleta, reimpresas)
+            session.commit()
+            logger.info(
+                f"Lote de {len(fachadas)} boletas ({len(nuevas)} nuevas, {len(reimpresas)} reimpresas) generado en "
+                f"{(datetime.now() - inicio).total_seconds():.2f}s"
+            )
+            return {fachada.pedido_id: ruta for fachada, ruta in zip(fachadas, rutas)}
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error al generar lote de boletas: {str(e)}", exc_info=True)
+            raise RestauranteException(f"Error al generar lote de boletas: {str(e)}")
+        finally:
+            session.close()
+
+    def generar_boleta_async(self, en_memoria: bool = False) -> Future:
+        """
+        Encola la generación de la boleta en el pool y retorna de inmediato.
+
+        El Future entrega la ruta del PDF o, con ``en_memoria=True``, la tupla
+        de generar_boleta_en_memoria (o la excepción ocurrida). La interfaz no
+        debe tocar widgets desde el worker: debe consultar el Future desde el
+        hilo de Tk (por ejemplo con ``after``).
+        """
+        if en_memoria:
+            return _pool_boletas.submit(self.generar_boleta_en_memoria)
+        return _pool_boletas.submit(self.generar_boleta)
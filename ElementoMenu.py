@@ -28,6 +28,11 @@ class CrearMenu(IMenu):
         Esta operación es muy eficiente gracias a que la clase Stock utiliza un diccionario
         para el inventario, permitiendo búsquedas de ingredientes en tiempo constante (O(1)).
         """
+        porciones = stock.porciones_disponibles(self.id)
+        if porciones is not None:
+            # Menú presente en el índice de disponibilidad del stock: O(1)
+            return porciones >= 1
+
         stock_disponible = stock.lista_ingredientes
         
         for ingrediente_requerido in self.ingredientes:
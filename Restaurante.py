@@ -13,19 +13,23 @@ from BoletaFacade import BoletaFacade
 import pandas as pd #pandas
 from menu_pdf import create_menu_pdf
 from ctk_pdf_viewer import CTkPDFViewer #para ver los pdf
+from tabla_paginada import TablaPaginada # tablas paginadas con actualización diferencial
+from carga_csv import cargar_csv_en_stock, leer_vista_previa # carga de csv por bloques
 import os # para manejar las rutas
-from database import initialize_database, get_db_session
+from database import initialize_database, session_scope
 from models import Cliente
 from sqlalchemy.exc import IntegrityError
-from crud import cliente_crud, pedido_crud, ingrediente_crud, menu_crud
+from crud import cliente_crud, pedido_crud, ingrediente_crud, menu_crud, boleta_crud
 from ElementoMenu import CrearMenu
 from statistics_tab import StatisticsTab
 from error_handler import (
     logger,                  # Logger centralizado
     ValidadorCantidad,       # Validador de cantidades (Template Method)
     ValidadorNombre,         # Validador de nombres (Template Method)
+    CSVException,            # Errores de formato del CSV
 )
 from reportes import generar_reporte  # Generador de reportes (JSON, CSV, HTML)
+from cache_manager import cache_iconos  # Caché LRU de iconos decodificados
 #importamos todo lo que sea necesario
 
 class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para las ventanas
@@ -69,7 +73,7 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         }
 
         self.stock = Stock() # se crea el stock
-        self.menus_creados = set() #se crea un conjunto vacio para los menus creados
+        self.tarjetas = {} # registro de tarjetas de menú por id: widgets y disponibilidad mostrada
         self.pedido = Pedido() # se crea el pedido
         self.clientes = {} # Diccionario para almacenar clientes cargados
 
@@ -84,17 +88,21 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def actualizar_treeview(self): # se crea para actualizar el treeview
-        for item in self.tree.get_children(): # se recorre el treeview con un for
-            self.tree.delete(item) # se elimina el item
-
-        # Iterar sobre los valores del diccionario de stock
-        for ingrediente in self.stock.lista_ingredientes.values(): # se recorre los ingredientes del stock
-            self.tree.insert("", "end", values=(ingrediente.nombre, ingrediente.unidad, ingrediente.cantidad))    
-            #se inserta el ingrediente en el treeview
+        # Recarga la página visible del stock; solo se tocan las filas que cambiaron
+        self.tabla_stock.refrescar()
         
         # Actualizar la visualización de los menús cuando cambia el stock
         self.actualizar_menus()
 
+    def _cargar_pagina_stock(self, despues_de_id, limite):
+        """Página de ingredientes para la tabla de stock (paginación por clave)."""
+        with session_scope() as session:
+            # Se pide una fila extra solo para saber si existe una página siguiente
+            ingredientes = ingrediente_crud.get_ingredientes_pagina(session, despues_de_id or 0, limite + 1)
+            siguiente = ingredientes[limite - 1].id if len(ingredientes) > limite else None
+            filas = [(str(ing.id), (ing.nombre, ing.unidad, ing.cantidad)) for ing in ingredientes[:limite]]
+        return filas, siguiente
+
     def on_tab_change(self): #se crea la funcion de cambio de pantalla
         selected_tab = self.tabview.get() # se obtiene la pestaña seleccionada
         if selected_tab == "Gestión de Clientes":
@@ -192,14 +200,16 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         self.boton_limpiar_cliente = ctk.CTkButton(frame_botones_cliente, text="Limpiar", command=self.limpiar_campos_cliente)
         self.boton_limpiar_cliente.grid(row=1, column=0, columnspan=2, padx=5, pady=(5,0), sticky="ew")
 
-        # --- Treeview ---
-        self.tree_clientes = ttk.Treeview(frame_treeview, columns=("ID", "Nombre", "Apellido", "Email"), show="headings")
-        self.tree_clientes.heading("ID", text="ID")
-        self.tree_clientes.heading("Nombre", text="Nombre")
-        self.tree_clientes.heading("Apellido", text="Apellido")
-        self.tree_clientes.heading("Email", text="Email")
+        # --- Treeview (paginado) ---
+        self.tabla_clientes = TablaPaginada(
+            frame_treeview,
+            columnas=("ID", "Nombre", "Apellido", "Email"),
+            cargar_pagina=self._cargar_pagina_clientes,
+            fg_color="transparent",
+        )
+        self.tabla_clientes.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.tree_clientes = self.tabla_clientes.tree
         self.tree_clientes.column("ID", width=30)
-        self.tree_clientes.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         self.tree_clientes.bind("<<TreeviewSelect>>", self.seleccionar_cliente)
 
         self.boton_eliminar_cliente = ctk.CTkButton(frame_treeview, text="Eliminar Cliente Seleccionado", command=self.eliminar_cliente, **self.button_styles['danger'])
@@ -208,18 +218,23 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         self.cargar_clientes_en_treeview()
 
     def cargar_clientes_en_treeview(self):
-        for item in self.tree_clientes.get_children():
-            self.tree_clientes.delete(item)
-        
-        session = get_db_session()
-        try:
-            clientes = cliente_crud.get_all_clientes(session)
-            self.clientes.clear()
-            for cliente in clientes:
-                self.tree_clientes.insert("", "end", values=(cliente.id, cliente.nombre, cliente.apellido, cliente.email))
-                self.clientes[cliente.id] = cliente
-        finally:
-            session.close()
+        self.tabla_clientes.refrescar()
+
+    def _cargar_pagina_clientes(self, despues_de_id, limite):
+        """Página de clientes para la tabla de clientes (paginación por clave)."""
+        with session_scope() as session:
+            # self.clientes se usa después de la transacción: que el commit no los expire
+            session.expire_on_commit = False
+            # Se pide una fila extra solo para saber si existe una página siguiente
+            clientes = cliente_crud.get_clientes_pagina(session, despues_de_id or 0, limite + 1)
+            siguiente = clientes[limite - 1].id if len(clientes) > limite else None
+            clientes = clientes[:limite]
+            filas = [
+                (str(cliente.id), (cliente.id, cliente.nombre, cliente.apellido, cliente.email))
+                for cliente in clientes
+            ]
+        self.clientes = {cliente.id: cliente for cliente in clientes}
+        return filas, siguiente
 
     def seleccionar_cliente(self, event=None):
         seleccion = self.tree_clientes.selection()
@@ -265,18 +280,17 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if not self.validar_email(email):
             return
 
-        session = get_db_session()
         try:
-            cliente_crud.create_cliente(session, nombre, apellido, email)
-            CTkMessagebox(title="Éxito", message="Cliente agregado correctamente.", icon="info")
-            self.cargar_clientes_en_treeview()
-            self.limpiar_campos_cliente()
+            with session_scope() as session:
+                cliente_crud.create_cliente(session, nombre, apellido, email)
         except IntegrityError:
             CTkMessagebox(title="Error de Duplicado", message=f"El email '{email}' ya está registrado.", icon="error")
         except Exception as e:
             CTkMessagebox(title="Error", message=f"Ocurrió un error: {e}", icon="error")
-        finally:
-            session.close()
+        else:
+            CTkMessagebox(title="Éxito", message="Cliente agregado correctamente.", icon="info")
+            self.cargar_clientes_en_treeview()
+            self.limpiar_campos_cliente()
 
     def actualizar_cliente(self):
         seleccion = self.tree_clientes.selection()
@@ -295,18 +309,17 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if not self.validar_email(email):
             return
 
-        session = get_db_session()
         try:
-            cliente_crud.update_cliente(session, cliente_id, nombre, apellido, email)
-            CTkMessagebox(title="Éxito", message="Cliente actualizado correctamente.", icon="info")
-            self.cargar_clientes_en_treeview()
-            self.limpiar_campos_cliente()
+            with session_scope() as session:
+                cliente_crud.update_cliente(session, cliente_id, nombre, apellido, email)
         except IntegrityError:
             CTkMessagebox(title="Error de Duplicado", message=f"El email '{email}' ya está registrado por otro cliente.", icon="error")
         except Exception as e:
             CTkMessagebox(title="Error", message=f"Ocurrió un error: {e}", icon="error")
-        finally:
-            session.close()
+        else:
+            CTkMessagebox(title="Éxito", message="Cliente actualizado correctamente.", icon="info")
+            self.cargar_clientes_en_treeview()
+            self.limpiar_campos_cliente()
 
     def eliminar_cliente(self):
         seleccion = self.tree_clientes.selection()
@@ -322,20 +335,20 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if msg.get() != "Sí":
             return
 
-        session = get_db_session()
         try:
-            if not cliente_crud.delete_cliente(session, cliente_id):
-                CTkMessagebox(title="Acción no permitida", message="No se puede eliminar un cliente que tiene pedidos asociados.", icon="error")
-                return
-
-            CTkMessagebox(title="Éxito", message="Cliente eliminado correctamente.", icon="info")
-            self.cargar_clientes_en_treeview()
-            self.limpiar_campos_cliente()
+            with session_scope() as session:
+                eliminado = cliente_crud.delete_cliente(session, cliente_id)
         except Exception as e:
-            session.rollback()
             CTkMessagebox(title="Error", message=f"Ocurrió un error: {e}", icon="error")
-        finally:
-            session.close()
+            return
+
+        if not eliminado:
+            CTkMessagebox(title="Acción no permitida", message="No se puede eliminar un cliente que tiene pedidos asociados.", icon="error")
+            return
+
+        CTkMessagebox(title="Éxito", message="Cliente eliminado correctamente.", icon="info")
+        self.cargar_clientes_en_treeview()
+        self.limpiar_campos_cliente()
 
     def configurar_pestana3(self): # se crea la funcion para configurar la pestaña 3
         label = ctk.CTkLabel(self.tab3, text="Carga de archivo CSV") # se crea la etiqueta
@@ -352,35 +365,52 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
 
         self.frame_tabla_csv = ctk.CTkFrame(self.tab3) # se crea el frame de la tabla csv
         self.frame_tabla_csv.pack(fill="both", expand=True, padx=10, pady=10) # se empaqueta el frame
-        self.df_csv = None   # se crea el dataframe vacio
+        self.df_csv = None   # se crea el dataframe vacio (solo la vista previa)
+        self.archivo_csv = None # ruta del csv que se agregara al stock por bloques
         self.tabla_csv = None # se crea la tabla vacia
 
+        self.label_progreso_csv = ctk.CTkLabel(self.frame_tabla_csv, text="") # avance de la carga al stock
+        self.label_progreso_csv.pack(side="bottom")
+
         self.boton_agregar_stock = ctk.CTkButton(self.frame_tabla_csv, text="Agregar al Stock") # se crea el boton para agragar el stock
         self.boton_agregar_stock.pack(side="bottom", pady=10) # se empaqueta el boton
  
     def agregar_csv_al_stock(self): # se crea la funcion para agregra el csv al stock
-        if self.df_csv is None: # se verifica el dataframe
+        if self.archivo_csv is None: # se verifica que haya un archivo cargado
             CTkMessagebox(title="Error", message="Primero debes cargar un archivo CSV.", icon="warning") # mensaje de error
             return # retorna el mensaje de error
 
-        if 'nombre' not in self.df_csv.columns or 'cantidad' not in self.df_csv.columns: # verifica la columnas del csv
-            CTkMessagebox(title="Error", message="El CSV debe tener columnas 'nombre' y 'cantidad'.", icon="warning") # mensaje de error
-            return # retorna el mensaje de error
-        
-        for _, row in self.df_csv.iterrows(): # recorre las filas dell csv
-            nombre = str(row['nombre'])
-            cantidad = Decimal(str(row['cantidad']))
-            unidad = str(row['unidad']) 
-            # si no existe la unidad se pone unid por defecto
-            ingrediente = Ingrediente(nombre=nombre,unidad=unidad,cantidad=cantidad) # se crea el ingredientes con sus datos
-            self.stock.agregar_ingrediente(ingrediente) # se agrega el ingrediente al stock
-        CTkMessagebox(title="Stock Actualizado", message="Ingredientes agregados al stock correctamente.", icon="info")
+        def mostrar_progreso(filas, fraccion):
+            # se muestra el avance entre bloques para que la ventana no se congele
+            self.label_progreso_csv.configure(text=f"Procesando... {filas} filas ({fraccion:.0%})")
+            self.label_progreso_csv.update_idletasks()
+
+        try:
+            # el archivo se recorre por bloques en una sola transacción; si no existe la unidad se pone unid por defecto
+            resultado = cargar_csv_en_stock(self.archivo_csv, self.stock, progreso=mostrar_progreso)
+        except Exception as e:
+            logger.error(f"Error al agregar CSV al stock: {str(e)}", exc_info=True)
+            self.label_progreso_csv.configure(text="")
+            CTkMessagebox(title="Error", message=f"No se pudo agregar el CSV al stock: {e}", icon="warning")
+            return
+        self.label_progreso_csv.configure(text=f"Carga completa: {resultado.filas} filas")
+        CTkMessagebox(
+            title="Stock Actualizado",
+            message=(
+                "Ingredientes agregados al stock correctamente.\n\n"
+                f"Nuevos: {resultado.insertados} | Actualizados: {resultado.actualizados} "
+                f"({resultado.filas} filas en {resultado.segundos:.2f}s)"
+            ),
+            icon="info"
+        )
         # mensaje de exito
         self.actualizar_treeview()   # se actualiza la pantalla
 
     def cargar_csv(self): # se crea la funcion para cargar el csv
         """
         Carga un archivo CSV con ingredientes.
+        Solo valida el encabezado y lee una vista previa; el archivo completo
+        se procesa por bloques al agregarlo al stock.
         Registra todas las acciones en logs centralizados.
         """
         logger.info("Iniciando carga de archivo CSV")
@@ -394,18 +424,16 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if archivo: # si se selecciona un archivo
             logger.info(f"Archivo seleccionado: {archivo}")
             try: # se intenta cargar el archivo
-                self.df_csv = pd.read_csv(archivo) # se carga el archivo csv
-                logger.debug(f"CSV cargado con {len(self.df_csv)} filas")
-                
-                if not all(col in self.df_csv.columns for col in ['nombre', 'unidad', 'cantidad']): # verifica la columnas del csv
-                    logger.error("CSV inválido: falta columnas requeridas (nombre, unidad, cantidad)")
-                    CTkMessagebox(title="Error", message="El archivo CSV debe contener las columnas: nombre, unidad y cantidad", icon="warning")
-                    # se detiene la carga del archivo
-                    return # retorna el mensaje de error
-                
+                self.df_csv = leer_vista_previa(archivo) # se valida el encabezado y se leen las primeras filas
+                self.archivo_csv = archivo
                 logger.info("CSV validado correctamente con columnas: nombre, unidad, cantidad")
+                logger.debug(f"Vista previa del CSV con {len(self.df_csv)} filas")
+                self.label_progreso_csv.configure(text="")
                 self.mostrar_dataframe_en_tabla(self.df_csv) # se muestea el dataframe en la tabla
                 self.boton_agregar_stock.configure(command=self.agregar_csv_al_stock)
+            except CSVException as e:
+                logger.error(f"CSV inválido: {str(e)}")
+                CTkMessagebox(title="Error", message=str(e), icon="warning")
             except Exception as e:
                 logger.error(f"Error al cargar CSV: {str(e)}")
                 CTkMessagebox(title="Error", message=f"Error al cargar el archivo CSV: {str(e)}", icon="warning")
@@ -416,14 +444,21 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if self.tabla_csv:
             self.tabla_csv.destroy()
 
-        self.tabla_csv = ttk.Treeview(self.frame_tabla_csv, columns=list(df.columns), show="headings")
+        def cargar_pagina(inicio, limite):
+            # Solo se materializan las filas de la página visible
+            inicio = inicio or 0
+            bloque = df.iloc[inicio:inicio + limite]
+            filas = [
+                (str(inicio + i), valores)
+                for i, valores in enumerate(bloque.itertuples(index=False, name=None))
+            ]
+            siguiente = inicio + limite if inicio + limite < len(df) else None
+            return filas, siguiente
+
+        self.tabla_csv = TablaPaginada(self.frame_tabla_csv, columnas=list(df.columns), cargar_pagina=cargar_pagina)
         for col in df.columns:
-            self.tabla_csv.heading(col, text=col)
-            self.tabla_csv.column(col, width=100, anchor="center")
-
-
-        for _, row in df.iterrows():
-            self.tabla_csv.insert("", "end", values=list(row))
+            self.tabla_csv.tree.column(col, width=100, anchor="center")
+        self.tabla_csv.refrescar()
 
         self.tabla_csv.pack(expand=True, fill="both", padx=10, pady=10)
 
@@ -493,21 +528,14 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
     def mostrar_boleta(self):
         """Muestra la boleta más reciente en el visor PDF."""
         try:
-            # Verificar si existe el directorio de boletas
-            if not os.path.exists("boletas"):
+            # La ruta de la boleta más reciente se obtiene de la BD, sin recorrer el árbol de boletas
+            with session_scope() as session:
+                ultima_boleta = boleta_crud.get_ultima_boleta(session)
+                ruta_boleta = ultima_boleta.pdf_path if ultima_boleta is not None else None
+            if ruta_boleta is None or not os.path.exists(ruta_boleta):
                 CTkMessagebox(title="Error", message="No hay boletas generadas para mostrar.", icon="warning")
                 return
 
-            # Obtener la lista de boletas y ordenarlas por fecha
-            boletas = [f for f in os.listdir("boletas") if f.startswith("boleta_")]
-            if not boletas:
-                CTkMessagebox(title="Error", message="No hay boletas generadas para mostrar.", icon="warning")
-                return
-
-            # Obtener la boleta más reciente
-            ultima_boleta = max(boletas)  # Como el formato incluye timestamp, max() dará la más reciente
-            ruta_boleta = os.path.join("boletas", ultima_boleta)
-
             if self.pdf_viewer_boleta is not None:
                 self.pdf_viewer_boleta.pack_forget()
                 self.pdf_viewer_boleta.destroy()
@@ -568,41 +596,40 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         )
         self.boton_editar_stock.pack(pady=10)
 
-        self.tree = ttk.Treeview(self.tab1, columns=("Nombre", "Unidad","Cantidad"), show="headings",height=25)
-        
-        self.tree.heading("Nombre", text="Nombre")
-        self.tree.heading("Unidad", text="Unidad")
-        self.tree.heading("Cantidad", text="Cantidad")
-        self.tree.pack(expand=True, fill="both", padx=10, pady=10)
+        self.tabla_stock = TablaPaginada(
+            self.tab1,
+            columnas=("Nombre", "Unidad", "Cantidad"),
+            cargar_pagina=self._cargar_pagina_stock,
+            height=25,
+        )
+        self.tabla_stock.pack(expand=True, fill="both", padx=10, pady=10)
+        self.tree = self.tabla_stock.tree
 
         self.boton_generar_menu = ctk.CTkButton(frame_treeview, text="Generar Menú", command=self.generar_menus)
         self.boton_generar_menu.pack(pady=10)
 
     def tarjeta_click(self, event, menu):
-        # Verificar stock
-        faltantes = []
-        for ing_necesario in menu.ingredientes:
-            encontrado = False
-            for ing_stock in self.stock.lista_ingredientes.values():
-                if ing_necesario.ingrediente.nombre == ing_stock.nombre:
-                    encontrado = True
-                    if float(ing_stock.cantidad) < float(ing_necesario.cantidad_necesaria):
-                        faltantes.append(f"{ing_necesario.ingrediente.nombre}: necesita {ing_necesario.cantidad_necesaria} {ing_necesario.ingrediente.unidad}, hay {ing_stock.cantidad} {ing_stock.unidad}")
-                    break
-            if not encontrado:
-                faltantes.append(f"{ing_necesario.ingrediente.nombre}: necesita {ing_necesario.cantidad_necesaria} {ing_necesario.ingrediente.unidad}, no hay en stock")
-
-        if faltantes:
-            mensaje = f"No hay suficientes ingredientes para preparar el menú '{menu.nombre}'.\n\nIngredientes necesarios:\n"
-            mensaje += "\n".join(faltantes)
+        # Verificar y reservar en una sola transacción contra la BD, para que
+        # dos terminales no puedan vender el mismo stock. La tabla de stock se
+        # recarga con la misma sesión; las tarjetas se refrescan después de
+        # confirmar, cuando el stock en memoria ya refleja la reserva
+        with session_scope():
+            resultado = self.stock.try_reserve(menu.id)
+            self.tabla_stock.refrescar()
+        self.actualizar_menus()
+
+        if not resultado.exitosa:
+            logger.warning(f"Reserva rechazada para '{menu.nombre}': {resultado.motivo or f'{len(resultado.faltantes)} faltantes'}")
+            if resultado.motivo is not None:
+                mensaje = f"No se pudo reservar el menú '{menu.nombre}'.\n\n{resultado.motivo}"
+            else:
+                mensaje = f"No hay suficientes ingredientes para preparar el menú '{menu.nombre}'.\n\nIngredientes necesarios:\n"
+                mensaje += "\n".join(str(faltante) for faltante in resultado.faltantes)
             CTkMessagebox(title="Stock Insuficiente", 
                          message=mensaje, 
                          icon="warning")
             return
         
-        # Reservar ingredientes
-        self.stock.reservar_ingredientes(menu.ingredientes)
-        
         # Convertir models.Menu a CrearMenu
         ingredientes_para_pedido = [
             Ingrediente(
@@ -624,40 +651,52 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         self.actualizar_treeview_pedido()
         total = self.pedido.calcular_total()
         self.label_total.configure(text=f"Total: ${total:.2f}")
-        
-        # Actualizar vista del stock
-        self.actualizar_treeview()
-        
-        # ✅ NUEVO: Regenerar tarjetas de menú para mostrar cambios en tiempo real
-        self.generar_menus()
     
-    def cargar_icono_menu(self, ruta_icono):
-        imagen = Image.open(ruta_icono)
-        icono_menu = ctk.CTkImage(imagen, size=(64, 64))
+    def cargar_icono_menu(self, ruta_icono, size=(64, 64)):
+        # Los iconos decodificados se comparten entre tarjetas y regeneraciones;
+        # el mtime en la clave invalida la entrada si el archivo cambia en disco
+        ruta = os.path.abspath(ruta_icono)
+        clave = (ruta, size, os.path.getmtime(ruta))
+        icono_menu = cache_iconos.get(clave)
+        if icono_menu is None:
+            with Image.open(ruta) as imagen:
+                imagen.load()
+                icono_menu = ctk.CTkImage(imagen.copy(), size=size)
+            cache_iconos.set(clave, icono_menu)
         return icono_menu
 
     def generar_menus(self):
-        # Limpiar el frame de tarjetas existente SOLO si es necesario
+        # Reconstruye todas las tarjetas desde la BD (carga inicial o botón "Generar Menú")
         for widget in self.tarjetas_frame.winfo_children():
             widget.destroy()
         
-        # Recrear todas las tarjetas
-        self.menus_creados.clear()
-        session = get_db_session()
-        try:
+        self.tarjetas.clear()
+        with session_scope() as session:
+            # Las tarjetas usan los menús después de la transacción: que el commit no los expire
+            session.expire_on_commit = False
             self.menus = menu_crud.get_all_menus(session)
+            self.stock.registrar_menus(self.menus)
             for menu in self.menus:
                 self.crear_tarjeta(menu)
-                self.menus_creados.add(menu)
-        finally:
-            session.close()
             
     def actualizar_menus(self):
         """Actualiza la visualización de los menús cuando cambia el stock (optimizado para evitar parpadeos)"""
-        # Solo regenerar si no hay menús creados aún
-        if not hasattr(self, 'menus_creados') or not self.menus_creados:
+        # Solo se construyen las tarjetas si no existen aún; después basta con
+        # reconfigurar las que cambiaron de disponibilidad
+        if not self.tarjetas:
             self.generar_menus()
-        # Si ya existen menús, no hacer nada para evitar parpadeos
+        else:
+            self.refrescar_tarjetas()
+
+    def refrescar_tarjetas(self):
+        """
+        Reconfigura solo las tarjetas cuya disponibilidad cambió, consultando
+        el índice del stock. No destruye widgets ni vuelve a consultar la BD.
+        """
+        for menu_id, tarjeta_info in self.tarjetas.items():
+            disponible = self.stock.menu_disponible(menu_id)
+            if disponible != tarjeta_info['disponible']:
+                self._aplicar_estado_tarjeta(tarjeta_info, disponible)
 
     def eliminar_menu(self):
         seleccion = self.treeview_menu.selection()
@@ -677,43 +716,47 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
             if msg.get() != "Sí":
                 return
 
-        # Procesar cada menú seleccionado
-        for sel in seleccion:
-            item = self.treeview_menu.item(sel)
-            nombre_menu = item['values'][0]
-            
-            # Encontrar el menú que se va a eliminar
-            menu_a_eliminar = None
-            for menu in self.pedido.menus.values():
-                if menu.nombre == nombre_menu:
-                    menu_a_eliminar = menu
-                    break
-                    
-            if menu_a_eliminar:
-                # Ajustar la cantidad de ingredientes a devolver
-                ingredientes_ajustados = []
-                for ingrediente in menu_a_eliminar.ingredientes:
-                    ing_ajustado = Ingrediente(
-                        nombre=ingrediente.nombre,
-                        unidad=ingrediente.unidad,
-                        cantidad=ingrediente.cantidad * menu_a_eliminar.cantidad
-                    )
-                    ingredientes_ajustados.append(ing_ajustado)
-                
-                # Devolver los ingredientes al stock
-                self.stock.devolver_ingredientes(ingredientes_ajustados)
+        # Los ingredientes de todos los menús seleccionados se devuelven en una
+        # sola transacción, que también recarga la tabla de stock
+        eliminados = []
+        with session_scope():
+            for sel in seleccion:
+                item = self.treeview_menu.item(sel)
+                nombre_menu = item['values'][0]
                 
-                # Eliminar del pedido
-                self.pedido.eliminar_menu(nombre_menu)
+                # Encontrar el menú que se va a eliminar
+                menu_a_eliminar = None
+                for menu in self.pedido.menus.values():
+                    if menu.nombre == nombre_menu:
+                        menu_a_eliminar = menu
+                        break
+                        
+                if menu_a_eliminar:
+                    # Ajustar la cantidad de ingredientes a devolver
+                    ingredientes_ajustados = []
+                    for ingrediente in menu_a_eliminar.ingredientes:
+                        ing_ajustado = Ingrediente(
+                            nombre=ingrediente.nombre,
+                            unidad=ingrediente.unidad,
+                            cantidad=ingrediente.cantidad * menu_a_eliminar.cantidad
+                        )
+                        ingredientes_ajustados.append(ing_ajustado)
+                    
+                    # Devolver los ingredientes al stock
+                    self.stock.devolver_ingredientes(ingredientes_ajustados)
+                    eliminados.append(nombre_menu)
+            self.tabla_stock.refrescar()
+
+        # Eliminar del pedido solo lo que ya se devolvió al stock
+        for nombre_menu in eliminados:
+            self.pedido.eliminar_menu(nombre_menu)
         
         # Actualizar vistas
         self.actualizar_treeview_pedido()
-        self.actualizar_treeview()
+        self.actualizar_menus()
         total = self.pedido.calcular_total()
         self.label_total.configure(text=f"Total: ${total:.2f}")
         
-        # ✅ NUEVO: Regenerar tarjetas de menú para mostrar cambios en tiempo real
-        self.generar_menus()
 
     def eliminar_todo(self):
         if not self.pedido.menus:
@@ -730,9 +773,9 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if msg.get() != "Sí":
             return
 
-        # Devolver todos los ingredientes al stock
+        # Devolver todos los ingredientes al stock en una sola transacción
+        ingredientes_ajustados = []
         for menu in self.pedido.menus.values():
-            ingredientes_ajustados = []
             for ingrediente in menu.ingredientes:
                 ing_ajustado = Ingrediente(
                     nombre=ingrediente.nombre,
@@ -740,18 +783,18 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
                     cantidad=ingrediente.cantidad * menu.cantidad
                 )
                 ingredientes_ajustados.append(ing_ajustado)
+        with session_scope():
             self.stock.devolver_ingredientes(ingredientes_ajustados)
+            self.tabla_stock.refrescar()
 
         # Crear un nuevo pedido vacío
         self.pedido = Pedido()
         
         # Actualizar vistas
         self.actualizar_treeview_pedido()
-        self.actualizar_treeview()
+        self.actualizar_menus()
         self.label_total.configure(text="Total: $0.00")
         
-        # ✅ NUEVO: Regenerar tarjetas de menú para mostrar cambios en tiempo real
-        self.generar_menus()
 
     def generar_boleta(self):
         """
@@ -783,55 +826,82 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
             CTkMessagebox(title="Error", message="El cliente seleccionado no es válido.", icon="warning")
             return
 
-        session = get_db_session()
+        items_data = []
+        total_pedido = 0
+        for menu in self.pedido.menus.values():
+            items_data.append({
+                'menu_id': menu.id,
+                'cantidad': menu.cantidad,
+                'precio_unitario': menu.precio
+            })
+            total_pedido += menu.precio * menu.cantidad
+            logger.debug(f"Item en boleta: {menu.nombre} x {menu.cantidad} = ${menu.precio * menu.cantidad:.2f}")
+
         try:
-            items_data = []
-            total_pedido = 0
-            for menu in self.pedido.menus.values():
-                items_data.append({
-                    'menu_id': menu.id,
-                    'cantidad': menu.cantidad,
-                    'precio_unitario': menu.precio
-                })
-                total_pedido += menu.precio * menu.cantidad
-                logger.debug(f"Item en boleta: {menu.nombre} x {menu.cantidad} = ${menu.precio * menu.cantidad:.2f}")
-            
-            nuevo_pedido = pedido_crud.create_pedido(session, cliente_id, items_data)
-            logger.info(f"Pedido creado en BD con ID: {nuevo_pedido.id}")
-            
-            boleta = BoletaFacade(nuevo_pedido.id)
-            pdf_path = boleta.generar_boleta()
-            logger.info(f"Boleta generada en: {pdf_path}")
+            with session_scope() as session:
+                pedido_id = pedido_crud.create_pedido(session, cliente_id, items_data).id
+        except Exception as e:
+            logger.error(f"Error al generar boleta: {str(e)}", exc_info=True)
+            CTkMessagebox(title="Error", message=f"Error al generar la boleta: {str(e)}", icon="warning")
+            return
+        logger.info(f"Pedido creado en BD con ID: {pedido_id}")
+
+        # El PDF y el registro de la boleta se generan en segundo plano, con
+        # el pedido ya confirmado; la caja queda libre de inmediato
+        futuro = BoletaFacade(pedido_id).generar_boleta_async(en_memoria=True)
+        self.after(100, self._esperar_boleta, futuro, pedido_id, total_pedido)
 
-            if not os.path.exists(pdf_path):
-                logger.error(f"Archivo de boleta no encontrado: {pdf_path}")
-                raise FileNotFoundError(f"No se pudo encontrar el archivo de la boleta: {pdf_path}")
+        self.pedido = Pedido()
+        self.actualizar_treeview_pedido()
+        self.label_total.configure(text="Total: $0.00")
+
+    def _esperar_boleta(self, futuro, pedido_id, total_pedido):
+        """Consulta desde el hilo de Tk si la boleta ya se dibujó y, si es así, la muestra."""
+        if not futuro.done():
+            self.after(100, self._esperar_boleta, futuro, pedido_id, total_pedido)
+            return
+
+        try:
+            # El PDF llega en memoria; el archivo se sigue escribiendo en segundo plano
+            contenido, pdf_path, guardado = futuro.result()
                 
             if self.pdf_viewer_boleta is not None:
                 self.pdf_viewer_boleta.pack_forget()
                 self.pdf_viewer_boleta.destroy()
             
             abs_pdf = os.path.abspath(pdf_path)
-            self.pdf_viewer_boleta = CTkPDFViewer(self.pdf_frame_boleta, file=abs_pdf)
+            self.pdf_viewer_boleta = CTkPDFViewer(self.pdf_frame_boleta, file=abs_pdf, stream=contenido)
             self.pdf_viewer_boleta.pack(expand=True, fill="both")
-            
-            self.pedido = Pedido()
-            self.actualizar_treeview_pedido()
-            self.label_total.configure(text="Total: $0.00")
-            
+            self.after(100, self._esperar_guardado_boleta, guardado, pedido_id, total_pedido)
+        except Exception as e:
+            logger.error(f"Error al generar boleta del pedido {pedido_id}: {str(e)}", exc_info=True)
+            CTkMessagebox(
+                title="Error",
+                message=f"El pedido {pedido_id} quedó registrado, pero no se pudo generar su boleta: {str(e)}",
+                icon="warning"
+            )
+
+    def _esperar_guardado_boleta(self, guardado, pedido_id, total_pedido):
+        """Informa cuando el PDF de la boleta quedó escrito en disco y registrado en la BD."""
+        if not guardado.done():
+            self.after(100, self._esperar_guardado_boleta, guardado, pedido_id, total_pedido)
+            return
+
+        try:
+            abs_pdf = os.path.abspath(guardado.result())
             logger.info(f"Boleta procesada exitosamente - Total: ${total_pedido:.2f}")
             CTkMessagebox(
                 title="Exito",
                 message=f"Boleta generada exitosamente y guardada en:\n{abs_pdf}",
                 icon="info"
             )
-            
         except Exception as e:
-            session.rollback()
-            logger.error(f"Error al generar boleta: {str(e)}", exc_info=True)
-            CTkMessagebox(title="Error", message=f"Error al generar la boleta: {str(e)}", icon="warning")
-        finally:
-            session.close()
+            logger.error(f"Error al guardar la boleta del pedido {pedido_id}: {str(e)}", exc_info=True)
+            CTkMessagebox(
+                title="Error",
+                message=f"La boleta del pedido {pedido_id} se generó, pero no se pudo guardar: {str(e)}",
+                icon="warning"
+            )
 
     def configurar_pestana2(self):
         # Frame principal de la pestaña de Pedido
@@ -916,8 +986,7 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         self.boton_generar_boleta.grid(row=1, column=0, sticky="ew", padx=10, pady=10)
 
     def actualizar_clientes_combobox(self):
-        session = get_db_session()
-        try:
+        with session_scope() as session:
             clientes = session.query(Cliente).order_by(Cliente.nombre).all()
             # Usamos map y lambda para formatear la lista de clientes
             lista_formateada = list(map(lambda c: f"{c.id} - {c.nombre} {c.apellido}", clientes))
@@ -931,44 +1000,34 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
                     self.combo_clientes_pedido.set(lista_formateada[0])
 
             self.combo_clientes_pedido.configure(values=lista_formateada)
-        finally:
-            session.close()
 
     def crear_tarjeta(self, menu):
-        # Usamos filter para encontrar si el menú ya fue creado
-        if any(filter(lambda m: m.nombre == menu.nombre, self.menus_creados)):
-             pass # Opcional: se podría actualizar en lugar de saltar
-
-        # Verificar si hay suficientes ingredientes
-        hay_ingredientes = self.stock.verificar_ingredientes_suficientes(menu.ingredientes)
-
-        # Configurar el estilo de la tarjeta según disponibilidad
         tarjeta = ctk.CTkFrame(
             self.tarjetas_frame,
             corner_radius=10,
             border_width=2,
-            border_color="#4CAF50" if hay_ingredientes else "#FF6B6B",
             width=120,
             height=150,
-            fg_color="gray17" if hay_ingredientes else "#2C2C2C",
         )
-        
-        # Configurar interactividad solo si hay ingredientes
-        if hay_ingredientes:
-            tarjeta.bind("<Button-1>", lambda event, m=menu: self.tarjeta_click(event, m))
-            tarjeta.bind("<Enter>", lambda event: tarjeta.configure(
-                border_color="#1976D2",
-                fg_color="gray16"
-            ))
-            tarjeta.bind("<Leave>", lambda event: tarjeta.configure(
-                border_color="#4CAF50",
-                fg_color="gray17"
-            ))
-            # Cursor de mano para indicar que es clickeable
-            tarjeta.configure(cursor="hand2")
-        else:
-            # Cursor de no-permitido para indicar que está deshabilitado
-            tarjeta.configure(cursor="circle")
+        tarjeta_info = {'menu': menu, 'frame': tarjeta, 'imagen': None, 'texto': None, 'disponible': None}
+
+        # Los eventos se enlazan una sola vez; cada manejador consulta la
+        # disponibilidad actual de la tarjeta, así refrescarla no requiere re-enlazar
+        def click(event, m=menu):
+            if tarjeta_info['disponible']:
+                self.tarjeta_click(event, m)
+
+        def entrar(event):
+            if tarjeta_info['disponible']:
+                tarjeta.configure(border_color="#1976D2", fg_color="gray16")
+
+        def salir(event):
+            if tarjeta_info['disponible']:
+                tarjeta.configure(border_color="#4CAF50", fg_color="gray17")
+
+        tarjeta.bind("<Button-1>", click)
+        tarjeta.bind("<Enter>", entrar)
+        tarjeta.bind("<Leave>", salir)
 
         # Cargar imagen si existe
         if getattr(menu, "icono_path", None):
@@ -976,37 +1035,48 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
                 icono = self.cargar_icono_menu(menu.icono_path)
                 imagen_label = ctk.CTkLabel(tarjeta, image=icono, text="", bg_color="transparent")
                 imagen_label.pack(pady=(10, 5), padx=10)
-                if hay_ingredientes:
-                    imagen_label.bind("<Button-1>", lambda event, m=menu: self.tarjeta_click(event, m))
-                    imagen_label.configure(cursor="hand2")
-                else:
-                    imagen_label.configure(cursor="circle")
+                imagen_label.bind("<Button-1>", click)
+                tarjeta_info['imagen'] = imagen_label
             except Exception as e:
                 logger.warning(f"No se pudo cargar la imagen '{menu.icono_path}': {e}")
 
+        texto_label = ctk.CTkLabel(tarjeta, text="", bg_color="transparent")
+        texto_label.pack(pady=(0, 10), padx=5)
+        texto_label.bind("<Button-1>", click)
+        tarjeta_info['texto'] = texto_label
+
+        self._aplicar_estado_tarjeta(tarjeta_info, self.stock.menu_disponible(menu.id))
+        self.tarjetas[menu.id] = tarjeta_info
+        
+        # Añadir la tarjeta al grid dinámicamente
+        num_tarjetas = len(self.tarjetas_frame.winfo_children())
+        tarjeta.grid(row=0, column=num_tarjetas, padx=10, pady=10)
+
+    def _aplicar_estado_tarjeta(self, tarjeta_info, hay_ingredientes):
+        """Configura borde, colores, cursor y etiqueta AGOTADO según la disponibilidad."""
+        menu = tarjeta_info['menu']
+        tarjeta_info['disponible'] = hay_ingredientes
+
+        # Cursor de mano si es clickeable, de no-permitido si está agotado
+        cursor = "hand2" if hay_ingredientes else "circle"
+        tarjeta_info['frame'].configure(
+            border_color="#4CAF50" if hay_ingredientes else "#FF6B6B",
+            fg_color="gray17" if hay_ingredientes else "#2C2C2C",
+            cursor=cursor,
+        )
+        if tarjeta_info['imagen'] is not None:
+            tarjeta_info['imagen'].configure(cursor=cursor)
+
         # Construir texto de la tarjeta
         nombre_texto = f"{menu.nombre}\n${menu.precio:.2f}"
         if not hay_ingredientes:
             nombre_texto += "\n🚫 AGOTADO"
-        
-        texto_label = ctk.CTkLabel(
-            tarjeta,
+        tarjeta_info['texto'].configure(
             text=nombre_texto,
             text_color="white" if hay_ingredientes else "#FF6B6B",
             font=("Helvetica", 11, "bold" if not hay_ingredientes else "normal"),
-            bg_color="transparent",
+            cursor=cursor,
         )
-        texto_label.pack(pady=(0, 10), padx=5)
-        
-        if hay_ingredientes:
-            texto_label.bind("<Button-1>", lambda event, m=menu: self.tarjeta_click(event, m))
-            texto_label.configure(cursor="hand2")
-        else:
-            texto_label.configure(cursor="circle")
-        
-        # Añadir la tarjeta al grid dinámicamente
-        num_tarjetas = len(self.tarjetas_frame.winfo_children())
-        tarjeta.grid(row=0, column=num_tarjetas, padx=10, pady=10)
 
 
     def validar_nombre(self, nombre):
@@ -1052,18 +1122,11 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
 
         logger.info(f"Ingresando nuevo ingrediente: {nombre} ({cantidad} {unidad})")
 
-        session = get_db_session()
         try:
-            ingrediente_existente = ingrediente_crud.get_ingrediente_by_name(session, nombre)
-            if ingrediente_existente:
-                # Actualizar cantidad si el ingrediente ya existe
-                nueva_cantidad = ingrediente_existente.cantidad + Decimal(cantidad)
-                ingrediente_crud.update_ingrediente(session, ingrediente_existente.id, nombre, unidad, nueva_cantidad)
-                logger.info(f"Ingrediente '{nombre}' actualizado. Nueva cantidad: {nueva_cantidad} {unidad}")
-            else:
-                # Crear nuevo ingrediente
-                ingrediente_crud.create_ingrediente(session, nombre, unidad, Decimal(cantidad))
-                logger.info(f"Ingrediente '{nombre}' creado exitosamente. Cantidad: {cantidad} {unidad}")
+            # Suma la cantidad si el ingrediente ya existe o lo crea; el stock
+            # mantiene al día la memoria y el índice de disponibilidad de menús
+            self.stock.agregar_ingrediente(Ingrediente(nombre=nombre, unidad=unidad, cantidad=Decimal(cantidad)))
+            logger.info(f"Ingrediente '{nombre}' ingresado. Cantidad actual: {self.stock.lista_ingredientes[nombre].cantidad} {unidad}")
             
             self.actualizar_treeview()
 
@@ -1072,11 +1135,8 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
             self.entry_cantidad.delete(0, 'end')
             self.combo_unidad.set("unid")
         except Exception as e:
-            session.rollback()
             logger.error(f"Error al ingresar ingrediente: {str(e)}")
             CTkMessagebox(title="Error", message=f"Ocurrió un error: {e}", icon="error")
-        finally:
-            session.close()
 
     def eliminar_ingrediente(self):
         seleccion = self.tree.selection()
@@ -1094,28 +1154,15 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
         if msg.get() != "Sí":
             return
 
-        session = get_db_session()
         try:
-            # Obtener el ingrediente de la base de datos
-            ingrediente_db = ingrediente_crud.get_ingrediente_by_name(session, nombre_ingrediente)
-            
-            if ingrediente_db:
-                # Actualizar la cantidad a 0 en la base de datos
-                ingrediente_crud.update_ingrediente(session, ingrediente_db.id, ingrediente_db.nombre, ingrediente_db.unidad, Decimal(0))
-                
-                # Actualizar la cantidad en el stock en memoria
-                if nombre_ingrediente in self.stock.lista_ingredientes:
-                    self.stock.lista_ingredientes[nombre_ingrediente].cantidad = Decimal(0)
-                
+            # Actualizar la cantidad a 0 en la BD, en memoria y en el índice de disponibilidad
+            if self.stock.actualizar_stock(nombre_ingrediente, Decimal(0)):
                 self.actualizar_treeview()
                 CTkMessagebox(title="Éxito", message=f"El ingrediente '{nombre_ingrediente}' ha sido marcado como agotado.", icon="info")
             else:
                 CTkMessagebox(title="Error", message="El ingrediente no se encontró en la base de datos.", icon="error")
         except Exception as e:
-            session.rollback()
             CTkMessagebox(title="Error", message=f"Ocurrió un error inesperado: {e}", icon="error")
-        finally:
-            session.close()
 
     def editar_stock_ingrediente(self):
         seleccion = self.tree.selection()
@@ -1145,25 +1192,15 @@ class AplicacionConPestanas(ctk.CTk): # se crea la clase de la aplicacion para l
             CTkMessagebox(title="Error de Validación", message="Por favor, ingrese un número válido para la cantidad.", icon="warning")
             return
 
-        session = get_db_session()
         try:
-            ingrediente_db = ingrediente_crud.get_ingrediente_by_name(session, nombre_ingrediente)
-            if ingrediente_db:
-                ingrediente_crud.update_ingrediente(session, ingrediente_db.id, ingrediente_db.nombre, ingrediente_db.unidad, nueva_cantidad)
-                
-                # Actualizar el stock en memoria
-                if nombre_ingrediente in self.stock.lista_ingredientes:
-                    self.stock.lista_ingredientes[nombre_ingrediente].cantidad = nueva_cantidad
-                
+            # Actualiza la BD, el stock en memoria y el índice de disponibilidad
+            if self.stock.actualizar_stock(nombre_ingrediente, nueva_cantidad):
                 self.actualizar_treeview()
                 CTkMessagebox(title="Éxito", message=f"Stock de '{nombre_ingrediente}' actualizado correctamente.", icon="info")
             else:
                 CTkMessagebox(title="Error", message="El ingrediente no se encontró en la base de datos.", icon="error")
         except Exception as e:
-            session.rollback()
             CTkMessagebox(title="Error", message=f"Ocurrió un error inesperado: {e}", icon="error")
-        finally:
-            session.close()
 
     def _configurar_pestana_estadisticas(self):
         self.statistics_tab_instance = StatisticsTab(self.tab_estadisticas)
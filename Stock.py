@@ -1,18 +1,105 @@
 from Ingrediente import Ingrediente as AppIngrediente
-from models import Ingrediente as OrmIngrediente, MenuIngrediente
-from typing import Dict, List
-from database import get_db_session
+from models import Ingrediente as OrmIngrediente, Menu, MenuIngrediente
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+from database import session_scope
+from sqlalchemy import case, event, exists, update, func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from decimal import Decimal
+from sqlalchemy.orm.attributes import set_committed_value
+from decimal import Decimal, InvalidOperation
+from error_handler import StockException, logger
+import threading
+import time
+
+# Cambios a la memoria que esperan la confirmación de la transacción
+_CLAVE_ESPERA = 'stock_pendiente'
+_CLAVE_EVENTOS = 'stock_eventos'
+
+# Filas de un IN (...) al releer ingredientes tras una carga masiva
+_LOTE_RELECTURA = 500
+
+# Lecturas y descuentos que intenta try_reserve si pierde una carrera
+_INTENTOS_RESERVA = 3
+
+
+def _aplicar_pendientes(session: Session) -> None:
+    for accion in session.info.pop(_CLAVE_ESPERA, []):
+        accion()
+
+
+def _descartar_pendientes(session: Session) -> None:
+    session.info.pop(_CLAVE_ESPERA, None)
+
+
+# INSERT con soporte de ON CONFLICT ... DO UPDATE, por motor de base de datos
+_INSERTS_CON_UPSERT = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+@dataclass(frozen=True)
+class Faltante:
+    """Ingrediente que no alcanza para una reserva."""
+    nombre: str
+    unidad: Optional[str]
+    necesario: Decimal
+    disponible: Decimal
+
+    def __str__(self):
+        return f"{self.nombre}: necesita {self.necesario} {self.unidad}, hay {self.disponible} {self.unidad}"
+
+
+@dataclass(frozen=True)
+class ResultadoReserva:
+    """
+    Resultado de Stock.try_reserve: la reserva fue exitosa si no hay
+    faltantes ni un motivo de rechazo (menú inexistente o sin receta, o
+    stock que cambió en todos los intentos).
+    """
+    menu_id: int
+    cantidad: int
+    faltantes: List[Faltante] = field(default_factory=list)
+    motivo: Optional[str] = None
+
+    @property
+    def exitosa(self) -> bool:
+        return not self.faltantes and self.motivo is None
+
+    def __str__(self):
+        if self.motivo is not None:
+            return self.motivo
+        return "\n".join(str(faltante) for faltante in self.faltantes)
+
+
+@dataclass(frozen=True)
+class ResultadoCarga:
+    """Resumen de una carga masiva con Stock.bulk_upsert."""
+    filas: int
+    insertados: int
+    actualizados: int
+    segundos: float
+
+    @property
+    def filas_por_segundo(self) -> float:
+        return self.filas / self.segundos if self.segundos > 0 else 0.0
+
 
 class Stock:
     def __init__(self):
         self.lista_ingredientes: Dict[str, AppIngrediente] = {}
+        self._lock = threading.Lock()
+        # Índice de disponibilidad: receta por menú, menús que usa cada
+        # ingrediente y porciones máximas preparables de cada menú
+        self._recetas: Dict[int, Dict[str, Decimal]] = {}
+        self._menus_por_ingrediente: Dict[str, Set[int]] = {}
+        self._porciones: Dict[int, int] = {}
         self._load_ingredients_from_db()
+        self._load_recetas_from_db()
 
     def _load_ingredients_from_db(self):
-        session: Session = get_db_session()
-        try:
+        with session_scope() as session:
             ingredientes_db = session.query(OrmIngrediente).all()
             for ing_db in ingredientes_db:
                 self.lista_ingredientes[ing_db.nombre] = AppIngrediente(
@@ -20,93 +107,441 @@ class Stock:
                     unidad=ing_db.unidad,
                     cantidad=ing_db.cantidad
                 )
-        finally:
-            session.close()
+
+    def _load_recetas_from_db(self):
+        with session_scope() as session:
+            filas = (
+                session.query(Menu.id, OrmIngrediente.nombre, MenuIngrediente.cantidad_necesaria)
+                .outerjoin(MenuIngrediente, MenuIngrediente.menu_id == Menu.id)
+                .outerjoin(OrmIngrediente, OrmIngrediente.id == MenuIngrediente.ingrediente_id)
+                .all()
+            )
+
+        recetas: Dict[int, Dict[str, Decimal]] = {}
+        for menu_id, nombre, cantidad_necesaria in filas:
+            receta = recetas.setdefault(menu_id, {})
+            if nombre is not None:
+                receta[nombre] = cantidad_necesaria
+        with self._lock:
+            self._reconstruir_indice(recetas)
+
+    def registrar_menus(self, menus: List[Menu]):
+        """
+        Reconstruye el índice de disponibilidad a partir de menús ya cargados
+        (con sus ingredientes), por ejemplo tras crear o editar menús.
+        """
+        recetas = {
+            menu.id: {mi.ingrediente.nombre: mi.cantidad_necesaria for mi in menu.ingredientes}
+            for menu in menus
+        }
+        with self._lock:
+            self._reconstruir_indice(recetas)
+
+    def _reconstruir_indice(self, recetas: Dict[int, Dict[str, Decimal]]):
+        self._recetas = recetas
+        self._menus_por_ingrediente = {}
+        for menu_id, receta in recetas.items():
+            for nombre in receta:
+                self._menus_por_ingrediente.setdefault(nombre, set()).add(menu_id)
+        self._porciones = {menu_id: self._calcular_porciones(receta) for menu_id, receta in recetas.items()}
+
+    def _calcular_porciones(self, receta: Dict[str, Decimal]) -> int:
+        """
+        Porciones preparables con el stock en memoria. Una receta sin
+        ingredientes con cantidad positiva da 0, igual que try_reserve la rechaza.
+        """
+        porciones = None
+        for nombre, necesario in receta.items():
+            if necesario <= 0:
+                continue
+            ing_stock = self.lista_ingredientes.get(nombre)
+            if ing_stock is None or ing_stock.cantidad <= 0:
+                return 0
+            alcanza = int(ing_stock.cantidad // necesario)
+            porciones = alcanza if porciones is None else min(porciones, alcanza)
+        return porciones or 0
+
+    def _recalcular_menus(self, nombres_ingredientes):
+        """Recalcula solo los menús que usan alguno de los ingredientes indicados."""
+        afectados = set()
+        for nombre in nombres_ingredientes:
+            afectados |= self._menus_por_ingrediente.get(nombre, set())
+        for menu_id in afectados:
+            self._porciones[menu_id] = self._calcular_porciones(self._recetas[menu_id])
+
+    def porciones_disponibles(self, menu_id: int) -> Optional[int]:
+        """
+        Porciones que se pueden preparar de un menú con el stock actual.
+        Devuelve None si el menú no está en el índice.
+        """
+        return self._porciones.get(menu_id)
+
+    def menu_disponible(self, menu_id: int) -> bool:
+        return self._porciones.get(menu_id, 0) >= 1
 
     def agregar_ingrediente(self, ingrediente_app: AppIngrediente):
-        session: Session = get_db_session()
-        try:
-            ing_existente_db = session.query(OrmIngrediente).filter_by(nombre=ingrediente_app.nombre).first()
-            if ing_existente_db:
-                ing_existente_db.cantidad += ingrediente_app.cantidad
-                self.lista_ingredientes[ing_existente_db.nombre].cantidad = ing_existente_db.cantidad
+        with session_scope() as session:
+            ing_db = (
+                session.query(OrmIngrediente)
+                .filter_by(nombre=ingrediente_app.nombre)
+                .with_for_update()
+                .populate_existing()
+                .first()
+            )
+            if ing_db:
+                ing_db.cantidad += ingrediente_app.cantidad
             else:
-                ing_orm = OrmIngrediente(
+                ing_db = OrmIngrediente(
                     nombre=ingrediente_app.nombre,
                     unidad=ingrediente_app.unidad,
                     cantidad=ingrediente_app.cantidad
                 )
-                session.add(ing_orm)
-                self.lista_ingredientes[ing_orm.nombre] = AppIngrediente(
-                    nombre=ing_orm.nombre,
-                    unidad=ing_orm.unidad,
-                    cantidad=ing_orm.cantidad
+                session.add(ing_db)
+            self._reflejar_al_confirmar(session, [(ing_db.nombre, ing_db.unidad, ing_db.cantidad)])
+
+    def bulk_upsert(self, datos, tamano_lote: int = 1000) -> ResultadoCarga:
+        """
+        Suma al stock muchos ingredientes en una sola transacción.
+
+        Acepta un DataFrame con columnas ``nombre``, ``cantidad`` y
+        (opcionalmente) ``unidad``, o un iterable de Ingrediente. Los nombres
+        repetidos se agregan en memoria y luego se ejecuta, por lotes de
+        ``tamano_lote``, un ``INSERT ... ON CONFLICT (nombre) DO UPDATE SET
+        cantidad = cantidad + EXCLUDED.cantidad``. Al final se refresca
+        ``lista_ingredientes`` una sola vez.
+
+        Returns:
+            ResultadoCarga con filas leídas, insertados, actualizados y duración
+        """
+        return self.bulk_upsert_por_bloques([datos], tamano_lote=tamano_lote)
+
+    def bulk_upsert_por_bloques(self, bloques: Iterable, tamano_lote: int = 1000,
+                                progreso: Optional[Callable[[int], None]] = None) -> ResultadoCarga:
+        """
+        Igual que bulk_upsert, pero consumiendo los datos bloque a bloque (por
+        ejemplo, los chunks de ``pd.read_csv(..., chunksize=...)``).
+
+        Cada bloque se agrega y se envía a la BD antes de leer el siguiente,
+        por lo que la memoria queda acotada por el tamaño del bloque. Todos los
+        bloques se confirman en una única transacción: si alguno falla, no se
+        aplica ninguno. ``progreso(filas_procesadas)`` se invoca tras cada bloque.
+        Los ingredientes tocados se releen al final y se reflejan en
+        ``lista_ingredientes`` cuando la transacción se confirma.
+        """
+        inicio = time.perf_counter()
+        filas = 0
+        insertados = 0
+        tocados: Set[str] = set()
+        with session_scope() as session:
+            insert = _INSERTS_CON_UPSERT.get(session.get_bind().dialect.name)
+            if insert is None:
+                raise StockException(
+                    f"La carga masiva no está soportada para el motor '{session.get_bind().dialect.name}'"
+                )
+            for bloque in bloques:
+                agregados: Dict[str, List] = {}
+                for nombre, unidad, cantidad in self._filas_ingredientes(bloque):
+                    filas += 1
+                    if nombre in agregados:
+                        agregados[nombre][1] += cantidad
+                    else:
+                        agregados[nombre] = [unidad, cantidad]
+                nombres = list(agregados)
+                for i in range(0, len(nombres), tamano_lote):
+                    lote = nombres[i:i + tamano_lote]
+                    insertados += self._upsert_lote(session, insert, {nombre: agregados[nombre] for nombre in lote})
+                tocados.update(nombres)
+                if progreso is not None:
+                    progreso(filas)
+
+            nombres = list(tocados)
+            instantaneas = []
+            for i in range(0, len(nombres), _LOTE_RELECTURA):
+                instantaneas.extend(
+                    session.query(OrmIngrediente.nombre, OrmIngrediente.unidad, OrmIngrediente.cantidad)
+                    .filter(OrmIngrediente.nombre.in_(nombres[i:i + _LOTE_RELECTURA]))
+                    .all()
                 )
-            session.commit()
-        finally:
-            session.close()
+            self._reflejar_al_confirmar(session, instantaneas)
+
+        resultado = ResultadoCarga(
+            filas=filas,
+            insertados=insertados,
+            actualizados=len(tocados) - insertados,
+            segundos=time.perf_counter() - inicio,
+        )
+        logger.info(
+            f"Carga masiva de stock: {resultado.filas} filas, {resultado.insertados} insertados, "
+            f"{resultado.actualizados} actualizados en {resultado.segundos:.2f}s "
+            f"({resultado.filas_por_segundo:.0f} filas/s)"
+        )
+        return resultado
+
+    @staticmethod
+    def _upsert_lote(session: Session, insert, lote: Dict[str, List]) -> int:
+        """Ejecuta un INSERT ... ON CONFLICT para un lote y devuelve cuántos nombres eran nuevos."""
+        tabla = OrmIngrediente.__table__
+        existentes = session.query(func.count(OrmIngrediente.id)).filter(OrmIngrediente.nombre.in_(lote.keys())).scalar()
+        stmt = insert(tabla).values([
+            {'nombre': nombre, 'unidad': unidad, 'cantidad': cantidad}
+            for nombre, (unidad, cantidad) in lote.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.nombre],
+            set_={'cantidad': tabla.c.cantidad + stmt.excluded.cantidad},
+        )
+        session.execute(stmt)
+        return len(lote) - existentes
+
+    @staticmethod
+    def _filas_ingredientes(datos):
+        """Normaliza un DataFrame o un iterable de Ingrediente a tuplas (nombre, unidad, cantidad)."""
+        if hasattr(datos, 'itertuples'):
+            unidades = datos['unidad'] if 'unidad' in datos.columns else ['unid'] * len(datos)
+            for nombre, unidad, cantidad in zip(datos['nombre'], unidades, datos['cantidad']):
+                if not isinstance(unidad, str):  # NaN en celdas vacías
+                    unidad = 'unid'
+                if not isinstance(nombre, str) or cantidad is None or cantidad != cantidad:  # NaN != NaN
+                    raise StockException(f"Fila incompleta en la carga masiva: nombre={nombre!r}, cantidad={cantidad!r}")
+                try:
+                    yield str(nombre), unidad, Decimal(str(cantidad))
+                except InvalidOperation:
+                    raise StockException(f"Cantidad inválida para '{nombre}': {cantidad!r}")
+        else:
+            for ingrediente in datos:
+                yield ingrediente.nombre, ingrediente.unidad, Decimal(str(ingrediente.cantidad))
 
     def eliminar_ingrediente(self, nombre_ingrediente: str) -> bool:
-        session: Session = get_db_session()
-        try:
+        with session_scope() as session:
             ing_a_eliminar = session.query(OrmIngrediente).filter_by(nombre=nombre_ingrediente).first()
-            if ing_a_eliminar:
-                if nombre_ingrediente in self.lista_ingredientes:
-                    del self.lista_ingredientes[nombre_ingrediente]
-                session.delete(ing_a_eliminar)
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+            if ing_a_eliminar is None:
+                return False
+            session.delete(ing_a_eliminar)
+            self._al_confirmar(session, lambda: self._olvidar_ingrediente(nombre_ingrediente))
+            return True
+
+    def _olvidar_ingrediente(self, nombre_ingrediente: str) -> None:
+        with self._lock:
+            self.lista_ingredientes.pop(nombre_ingrediente, None)
+            # La BD borra en cascada la relación con los menús que lo usaban
+            for menu_id in self._menus_por_ingrediente.pop(nombre_ingrediente, set()):
+                self._recetas[menu_id].pop(nombre_ingrediente, None)
+                self._porciones[menu_id] = self._calcular_porciones(self._recetas[menu_id])
 
     def verificar_stock(self) -> bool:
         return len(self.lista_ingredientes) > 0
 
     def verificar_ingredientes_suficientes(self, ingredientes_necesarios: List[MenuIngrediente]) -> bool:
+        # Si los ingredientes son la receta de un menú indexado, basta con el índice
+        menu_ids = {ing_necesario.menu_id for ing_necesario in ingredientes_necesarios}
+        if len(menu_ids) == 1:
+            porciones = self.porciones_disponibles(menu_ids.pop())
+            if porciones is not None:
+                return porciones >= 1
+
         for ing_necesario in ingredientes_necesarios:
             ing_stock = self.lista_ingredientes.get(ing_necesario.ingrediente.nombre)
             if ing_stock is None or ing_stock.cantidad < ing_necesario.cantidad_necesaria:
                 return False
         return True
 
-    def reservar_ingredientes(self, ingredientes: List[MenuIngrediente]):
-        session: Session = get_db_session()
-        try:
-            for ing_necesario in ingredientes:
-                ing_stock_db = session.query(OrmIngrediente).filter_by(nombre=ing_necesario.ingrediente.nombre).first()
-                if ing_stock_db:
-                    ing_stock_db.cantidad -= ing_necesario.cantidad_necesaria
-                    self.lista_ingredientes[ing_stock_db.nombre].cantidad = ing_stock_db.cantidad
-            session.commit()
-        finally:
-            session.close()
+    def reservar_ingredientes(self, ingredientes: List[MenuIngrediente], cantidad: int = 1):
+        """
+        Reserva ``cantidad`` porciones del menú al que pertenecen los
+        ingredientes. Envoltorio de try_reserve que lanza StockException si
+        la reserva no se puede hacer.
+        """
+        menu_ids = {ing_necesario.menu_id for ing_necesario in ingredientes}
+        if len(menu_ids) != 1:
+            raise StockException("Los ingredientes a reservar deben ser la receta de un único menú")
+        resultado = self.try_reserve(menu_ids.pop(), cantidad)
+        if not resultado.exitosa:
+            raise StockException(f"No se pudo reservar: {resultado}")
+
+    def try_reserve(self, menu_id: int, qty: int = 1) -> ResultadoReserva:
+        """
+        Verifica y descuenta los ingredientes de ``qty`` porciones de un menú
+        en una sola transacción, sin consultar el inventario en memoria.
+
+        La receta y el stock se leen con un único SELECT que bloquea las filas
+        de ``ingredientes`` (``FOR UPDATE``) y todos los ingredientes se
+        descuentan con un único UPDATE, que además solo se aplica si ninguno
+        quedaría en negativo, para que ninguna terminal pueda sobrevender,
+        incluso en motores sin bloqueo de filas. Un clic cuesta así tres
+        viajes a la BD (SELECT, UPDATE y COMMIT), sin importar el tamaño de
+        la receta.
+
+        Si otra transacción cambia el stock entre la lectura y el descuento,
+        la reserva se reintenta con el stock releído hasta
+        ``_INTENTOS_RESERVA`` veces.
+
+        Returns:
+            ResultadoReserva con la lista de faltantes (vacía si se reservó)
+            o el motivo del rechazo si el menú no existe o no tiene receta
+        """
+        # Dentro de un session_scope() externo el descuento forma parte de la
+        # transacción de esa acción y se confirma (o revierte) junto con ella
+        with session_scope() as session:
+            for _ in range(_INTENTOS_RESERVA):
+                filas = (
+                    session.query(OrmIngrediente, MenuIngrediente.cantidad_necesaria)
+                    .join(MenuIngrediente, MenuIngrediente.ingrediente_id == OrmIngrediente.id)
+                    .filter(MenuIngrediente.menu_id == menu_id)
+                    .with_for_update(of=OrmIngrediente)
+                    .populate_existing()
+                    .all()
+                )
+                # Cantidades no positivas no descuentan nada (ver _calcular_porciones)
+                filas = [(ing_db, necesario) for ing_db, necesario in filas if necesario > 0]
+                if not filas:
+                    # Solo en un rechazo se consulta el menú, para explicar el motivo
+                    if session.get(Menu, menu_id) is None:
+                        motivo = f"El menú {menu_id} no existe"
+                    else:
+                        motivo = f"El menú {menu_id} no tiene ingredientes registrados"
+                    return ResultadoReserva(menu_id=menu_id, cantidad=qty, motivo=motivo)
+                faltantes = self._descontar(
+                    session, [(ing_db, necesario * qty) for ing_db, necesario in filas]
+                )
+                if faltantes is not None:
+                    return ResultadoReserva(menu_id=menu_id, cantidad=qty, faltantes=faltantes)
+            logger.warning(f"Reserva del menú {menu_id} rechazada: el stock cambió en {_INTENTOS_RESERVA} intentos")
+            return ResultadoReserva(
+                menu_id=menu_id, cantidad=qty,
+                motivo="El stock cambió mientras se reservaba; intente nuevamente",
+            )
+
+    def _descontar(self, session: Session, filas: List[Tuple[OrmIngrediente, Decimal]]) -> Optional[List[Faltante]]:
+        """
+        Aplica el descuento de las filas ya bloqueadas en la transacción de la
+        sesión, sin confirmarla ni revertirla: eso lo hace quien abrió el
+        session_scope().
+
+        Si algún ingrediente no alcanza no se descuenta nada y se devuelven
+        los faltantes. Las cantidades descontadas se reflejan en
+        ``lista_ingredientes`` cuando la transacción se confirma; las leídas
+        en un rechazo se reflejan de inmediato.
+
+        Devuelve None si otra transacción cambió el stock entre la lectura y
+        el descuento; en ese caso el UPDATE no modificó ninguna fila y hay
+        que volver a leer.
+        """
+        faltantes = [
+            Faltante(nombre=ing_db.nombre, unidad=ing_db.unidad, necesario=necesario, disponible=ing_db.cantidad)
+            for ing_db, necesario in filas
+            if ing_db.cantidad < necesario
+        ]
+        if faltantes:
+            self._reflejar_cantidades({ing_db.nombre: ing_db.cantidad for ing_db, _ in filas})
+            return faltantes
+
+        tabla = OrmIngrediente.__table__
+        otra = tabla.alias()
+        necesarios = {ing_db.id: necesario for ing_db, necesario in filas}
+        # Todo o nada: si alguna fila quedaría en negativo no se toca ninguna
+        alguno_no_alcanza = exists().where(
+            otra.c.id.in_(necesarios.keys()),
+            otra.c.cantidad < case(necesarios, value=otra.c.id),
+        )
+        resultado = session.execute(
+            update(tabla)
+            .where(tabla.c.id.in_(necesarios.keys()), ~alguno_no_alcanza)
+            .values(cantidad=tabla.c.cantidad - case(necesarios, value=tabla.c.id))
+        )
+        if resultado.rowcount != len(necesarios):
+            # Otra transacción ganó la carrera entre la lectura y el descuento
+            return None
+
+        # El UPDATE no pasa por el ORM: se actualizan las instancias de la sesión
+        # para que el resto de la acción (p. ej. la tabla de stock) lea lo descontado
+        for ing_db, necesario in filas:
+            set_committed_value(ing_db, 'cantidad', ing_db.cantidad - necesario)
+        self._reflejar_al_confirmar(
+            session, [(ing_db.nombre, ing_db.unidad, ing_db.cantidad) for ing_db, _ in filas]
+        )
+        return []
+
+    def _reflejar_cantidades(self, cantidades: Dict[str, Decimal]) -> None:
+        """Copia cantidades de la BD a ``lista_ingredientes`` y recalcula los menús afectados."""
+        with self._lock:
+            for nombre, cantidad in cantidades.items():
+                if nombre in self.lista_ingredientes:
+                    self.lista_ingredientes[nombre].cantidad = cantidad
+            self._recalcular_menus(cantidades.keys())
+
+    def _reflejar_ingredientes(self, instantaneas: List[Tuple[str, Optional[str], Decimal]]) -> None:
+        """
+        Copia tuplas (nombre, unidad, cantidad) leídas de la BD a
+        ``lista_ingredientes``, agregando los que aún no estaban cargados, y
+        recalcula los menús afectados.
+        """
+        with self._lock:
+            for nombre, unidad, cantidad in instantaneas:
+                ing_app = self.lista_ingredientes.get(nombre)
+                if ing_app is None:
+                    self.lista_ingredientes[nombre] = AppIngrediente(nombre=nombre, unidad=unidad, cantidad=cantidad)
+                else:
+                    ing_app.cantidad = cantidad
+            self._recalcular_menus([nombre for nombre, _, _ in instantaneas])
+
+    def _reflejar_al_confirmar(self, session: Session, instantaneas: List[Tuple[str, Optional[str], Decimal]]) -> None:
+        """Refleja en memoria las cantidades escritas en la sesión cuando su transacción se confirma."""
+        instantaneas = list(instantaneas)
+        self._al_confirmar(session, lambda: self._reflejar_ingredientes(instantaneas))
+
+    @staticmethod
+    def _al_confirmar(session: Session, accion: Callable[[], None]) -> None:
+        """
+        Deja ``accion`` pendiente en ``session.info`` y la ejecuta solo si la
+        transacción se confirma (``after_commit``); si se revierte
+        (``after_rollback``) se descarta. Así la memoria nunca refleja
+        cambios que la BD no guardó, aunque la sesión sea la de un
+        session_scope() externo que confirma más tarde.
+
+        ``accion`` no puede consultar la BD: debe trabajar con valores ya
+        leídos.
+        """
+        if not session.info.get(_CLAVE_EVENTOS):
+            session.info[_CLAVE_EVENTOS] = True
+            event.listen(session, 'after_commit', _aplicar_pendientes)
+            event.listen(session, 'after_rollback', _descartar_pendientes)
+        session.info.setdefault(_CLAVE_ESPERA, []).append(accion)
 
     def devolver_ingredientes(self, ingredientes: List[AppIngrediente]):
-        session: Session = get_db_session()
-        try:
-            for ing_devolver in ingredientes:
-                ing_stock_db = session.query(OrmIngrediente).filter_by(nombre=ing_devolver.nombre).first()
-                if ing_stock_db:
-                    ing_stock_db.cantidad += ing_devolver.cantidad
-                    self.lista_ingredientes[ing_stock_db.nombre].cantidad = ing_stock_db.cantidad
-            session.commit()
-        finally:
-            session.close()
+        devoluciones: Dict[str, Decimal] = {}
+        for ing_devolver in ingredientes:
+            devoluciones[ing_devolver.nombre] = devoluciones.get(ing_devolver.nombre, Decimal(0)) + ing_devolver.cantidad
+        if not devoluciones:
+            return
+        with session_scope() as session:
+            ingredientes_db = (
+                session.query(OrmIngrediente)
+                .filter(OrmIngrediente.nombre.in_(devoluciones.keys()))
+                .with_for_update()
+                .populate_existing()
+                .all()
+            )
+            for ing_stock_db in ingredientes_db:
+                ing_stock_db.cantidad += devoluciones[ing_stock_db.nombre]
+            self._reflejar_al_confirmar(
+                session, [(ing_db.nombre, ing_db.unidad, ing_db.cantidad) for ing_db in ingredientes_db]
+            )
 
     def actualizar_stock(self, nombre_ingrediente: str, nueva_cantidad: float):
-        session: Session = get_db_session()
-        try:
-            ing_a_actualizar = session.query(OrmIngrediente).filter_by(nombre=nombre_ingrediente).first()
-            if ing_a_actualizar:
-                dec_nueva_cantidad = Decimal(str(nueva_cantidad))
-                ing_a_actualizar.cantidad = dec_nueva_cantidad
-                self.lista_ingredientes[ing_a_actualizar.nombre].cantidad = dec_nueva_cantidad
-                session.commit()
-                return True
-            return False
-        finally:
-            session.close()
+        with session_scope() as session:
+            ing_a_actualizar = (
+                session.query(OrmIngrediente)
+                .filter_by(nombre=nombre_ingrediente)
+                .populate_existing()
+                .first()
+            )
+            if ing_a_actualizar is None:
+                return False
+            ing_a_actualizar.cantidad = Decimal(str(nueva_cantidad))
+            self._reflejar_al_confirmar(
+                session, [(ing_a_actualizar.nombre, ing_a_actualizar.unidad, ing_a_actualizar.cantidad)]
+            )
+            return True
 
     def obtener_elementos_menu(self) -> List[AppIngrediente]:
         return list(self.lista_ingredientes.values())
\ No newline at end of file
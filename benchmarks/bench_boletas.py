@@ -0,0 +1,85 @@
+"""
+Benchmark de renderizado de boletas: plantilla compilada vs. celda por celda.
+
+Dibuja la misma boleta N veces con ``renderizar_sin_plantilla`` (la forma
+anterior, todo el documento desde cero) y con ``PlantillaBoleta.renderizar``
+(regiones fijas ya dibujadas), e informa boletas por segundo de cada una.
+Antes de medir verifica que ambas producen la misma imagen de cada página.
+Las mediciones se alternan ``--repeticiones`` veces y se informa la
+mediana, junto con el rango de la mejora para ver cuánto es ruido.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_boletas
+    python -m benchmarks.bench_boletas --boletas 5000 --items 12 --repeticiones 9
+
+No requiere base de datos.
+"""
+
+import argparse
+import datetime
+import statistics
+import time
+
+import fitz
+
+from plantilla_boleta import obtener_plantilla, renderizar_sin_plantilla
+
+
+def _datos_ejemplo(items: int) -> dict:
+    detalle = [
+        {'nombre': f"Menú de prueba {i}", 'cantidad': 1 + i % 3, 'precio_unitario': 2500.0 + 100 * i}
+        for i in range(items)
+    ]
+    total = sum(item['precio_unitario'] * item['cantidad'] for item in detalle)
+    subtotal = round(total / 1.19, 2)
+    return {
+        'cliente_nombre': "Cliente Benchmark",
+        'cliente_email': "benchmark@restaurante.cl",
+        'fecha_pedido': datetime.datetime(2025, 1, 1, 12, 30, 0),
+        'detalle_items': detalle,
+        'subtotal': subtotal,
+        'iva': round(total - subtotal, 2),
+        'total': total,
+    }
+
+
+def _mismas_paginas(pdf_a: bytes, pdf_b: bytes) -> bool:
+    doc_a = fitz.open(stream=pdf_a, filetype="pdf")
+    doc_b = fitz.open(stream=pdf_b, filetype="pdf")
+    if doc_a.page_count != doc_b.page_count:
+        return False
+    return all(doc_a[i].get_pixmap().samples == doc_b[i].get_pixmap().samples for i in range(doc_a.page_count))
+
+
+def _medir(renderizar, datos: dict, boletas: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(boletas):
+        renderizar(datos)
+    return boletas / (time.perf_counter() - inicio)
+
+
+def ejecutar(boletas: int, items: int, repeticiones: int) -> None:
+    datos = _datos_ejemplo(items)
+    plantilla = obtener_plantilla()
+    if not _mismas_paginas(renderizar_sin_plantilla(datos), plantilla.renderizar(datos)):
+        raise SystemExit("ERROR: la plantilla no produce la misma boleta que el renderizado completo")
+
+    # Se alternan ambos métodos para que la carga de la máquina afecte a los dos por igual
+    sin_plantilla, con_plantilla = [], []
+    for _ in range(repeticiones):
+        sin_plantilla.append(_medir(renderizar_sin_plantilla, datos, boletas))
+        con_plantilla.append(_medir(plantilla.renderizar, datos, boletas))
+    mejoras = [con / sin for sin, con in zip(sin_plantilla, con_plantilla)]
+    print(f"Boletas: {boletas} | Items por boleta: {items} | Repeticiones: {repeticiones}")
+    print(f"Sin plantilla: {statistics.median(sin_plantilla):.0f} boletas/s")
+    print(f"Con plantilla: {statistics.median(con_plantilla):.0f} boletas/s "
+          f"({statistics.median(mejoras):.2f}x; rango {min(mejoras):.2f}x - {max(mejoras):.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de renderizado de boletas")
+    parser.add_argument("--boletas", type=int, default=2000, help="Boletas a dibujar con cada método")
+    parser.add_argument("--items", type=int, default=5, help="Items por boleta")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Mediciones alternadas por método (se informa la mediana)")
+    args = parser.parse_args()
+    ejecutar(args.boletas, args.items, args.repeticiones)
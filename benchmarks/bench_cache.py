@@ -0,0 +1,78 @@
+"""
+Benchmark de concurrencia de cache_manager.Cache.
+
+Varios hilos hacen una mezcla de lecturas y escrituras (por defecto 90% /
+10%) sobre un conjunto de claves compartido, con 1, 2, 4, 8 y 16 hilos.
+Se compara el caché con un solo lock (``segmentos=1``, el valor por
+defecto) contra el caché con locks por segmento, e informa operaciones por
+segundo de cada uno; sirve para decidir si ``segmentos > 1`` compensa con
+la concurrencia esperada.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_cache
+    python -m benchmarks.bench_cache --operaciones 200000 --claves 5000 --lecturas 0.95
+
+No requiere base de datos.
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from cache_manager import Cache
+
+HILOS = (1, 2, 4, 8, 16)
+
+
+def _trabajar(cache: Cache, operaciones: int, claves: int, lecturas: float, semilla: int,
+              barrera: threading.Barrier) -> None:
+    aleatorio = random.Random(semilla)
+    secuencia = [(aleatorio.randrange(claves), aleatorio.random() < lecturas) for _ in range(operaciones)]
+    barrera.wait()
+    for clave, es_lectura in secuencia:
+        if es_lectura:
+            cache.get(clave)
+        else:
+            cache.set(clave, clave)
+
+
+def _medir(segmentos: int, hilos: int, operaciones: int, claves: int, lecturas: float) -> float:
+    """Operaciones por segundo con ``hilos`` hilos que en total hacen ``operaciones`` operaciones."""
+    cache = Cache(ttl_default=None, max_items=claves, intervalo_limpieza=None, segmentos=segmentos)
+    for clave in range(claves):
+        cache.set(clave, clave)
+
+    por_hilo = operaciones // hilos
+    # La barrera incluye al hilo principal para medir solo desde que todos parten
+    barrera = threading.Barrier(hilos + 1)
+    workers = [
+        threading.Thread(target=_trabajar, args=(cache, por_hilo, claves, lecturas, semilla, barrera))
+        for semilla in range(hilos)
+    ]
+    for worker in workers:
+        worker.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return por_hilo * hilos / (time.perf_counter() - inicio)
+
+
+def ejecutar(operaciones: int, claves: int, lecturas: float, segmentos: int) -> None:
+    print(f"Operaciones: {operaciones} | Claves: {claves} | Lecturas: {lecturas:.0%}")
+    print(f"{'Hilos':>5} | {'1 lock (ops/s)':>15} | {f'{segmentos} segmentos (ops/s)':>22} | {'Mejora':>6}")
+    for hilos in HILOS:
+        un_lock = _medir(1, hilos, operaciones, claves, lecturas)
+        segmentado = _medir(segmentos, hilos, operaciones, claves, lecturas)
+        print(f"{hilos:>5} | {un_lock:>15,.0f} | {segmentado:>22,.0f} | {segmentado / un_lock:>5.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia de cache_manager.Cache")
+    parser.add_argument("--operaciones", type=int, default=400000, help="Operaciones totales por medición")
+    parser.add_argument("--claves", type=int, default=10000, help="Claves distintas")
+    parser.add_argument("--lecturas", type=float, default=0.9, help="Proporción de lecturas (0 a 1)")
+    parser.add_argument("--segmentos", type=int, default=16, help="Segmentos del caché con locks por segmento")
+    args = parser.parse_args()
+    ejecutar(args.operaciones, args.claves, args.lecturas, args.segmentos)
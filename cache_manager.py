@@ -1,87 +1,334 @@
 """
 Módulo de caché para optimizar operaciones frecuentes.
 
-Implementa un sistema de caché con TTL (Time To Live)
-para mejorar el performance de búsquedas repetidas.
+Implementa un sistema de caché acotado con TTL (Time To Live) y
+desalojo LRU para mejorar el performance de búsquedas repetidas.
 """
 
 import time
-from typing import Any, Callable, Optional, Dict
+from typing import Any, Callable, Optional, Dict, Hashable, Iterable, List, Set, Tuple
 from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import sys
 import threading
+import weakref
+
+logger = logging.getLogger("RestauranteApp")
 
 
 class CacheItem:
     """Representa un item en caché con información de expiración"""
     
-    def __init__(self, valor: Any, ttl: Optional[int] = None):
+    __slots__ = ('valor', 'timestamp', 'ttl', 'expira_en', 'tamano')
+    
+    def __init__(self, valor: Any, ttl: Optional[int] = None, tamano: int = 0):
         """
         Inicializa un item de caché.
         
         Args:
             valor: Valor a cachear
             ttl: Tiempo de vida en segundos (None = sin expiración)
+            tamano: Tamaño aproximado en bytes (solo se calcula si el caché limita bytes)
         """
         self.valor = valor
         self.timestamp = time.time()
         self.ttl = ttl
+        self.expira_en = None if ttl is None else time.monotonic() + ttl
+        self.tamano = tamano
     
     def esta_expirado(self) -> bool:
         """Verifica si el item ha expirado"""
-        if self.ttl is None:
-            return False
-        tiempo_transcurrido = time.time() - self.timestamp
-        return tiempo_transcurrido > self.ttl
+        return self.expira_en is not None and time.monotonic() > self.expira_en
+
+
+class BusInvalidacion:
+    """
+    Bus de invalidación: quien modifica datos publica qué entidades
+    cambiaron (por ejemplo, tablas de la BD) y los cachés suscritos a esas
+    entidades descartan lo que tengan guardado. Así los datos cacheados
+    pueden tener TTL largos sin quedar obsoletos.
+
+    Los callbacks reciben ``(entidad, claves)``, donde ``claves`` es el
+    conjunto de claves primarias modificadas, o None si no se conocen (por
+    ejemplo, tras un UPDATE masivo) y debe asumirse que cambió toda la entidad.
+    """
+    
+    def __init__(self):
+        self._suscriptores: Dict[str, List[Callable[[str, Optional[frozenset]], None]]] = {}
+        self._lock = threading.Lock()
+    
+    def suscribir(self, entidad: str, callback: Callable[[str, Optional[frozenset]], None]) -> None:
+        """Registra un callback que se llamará cada vez que cambie la entidad"""
+        with self._lock:
+            self._suscriptores.setdefault(entidad, []).append(callback)
+    
+    def desuscribir(self, entidad: str, callback: Callable[[str, Optional[frozenset]], None]) -> None:
+        """Quita un callback registrado con suscribir"""
+        with self._lock:
+            if callback in self._suscriptores.get(entidad, []):
+                self._suscriptores[entidad].remove(callback)
+    
+    def publicar(self, cambios: Dict[str, Optional[Iterable[Hashable]]]) -> None:
+        """
+        Notifica a los suscriptores de cada entidad modificada.
+        
+        Args:
+            cambios: entidad -> claves modificadas (None = toda la entidad)
+        """
+        for entidad, claves in cambios.items():
+            with self._lock:
+                callbacks = list(self._suscriptores.get(entidad, []))
+            claves = None if claves is None else frozenset(claves)
+            for callback in callbacks:
+                try:
+                    callback(entidad, claves)
+                except Exception:
+                    # Un suscriptor con errores no debe impedir invalidar a los demás
+                    logger.error(f"Error en suscriptor de invalidación de '{entidad}'", exc_info=True)
+
+
+# Bus compartido por la aplicación; la BD publica en él al confirmar transacciones
+bus_invalidacion = BusInvalidacion()
+
+
+class _Barrendero:
+    """
+    Único hilo de fondo que retira los items expirados de todos los Cache
+    con ``intervalo_limpieza``, cada uno a su propio intervalo.
+
+    Los cachés se guardan con referencias débiles: registrarse no los
+    mantiene vivos, y un caché recolectado simplemente deja de limpiarse.
+    """
+
+    def __init__(self):
+        # Caché -> instante (time.monotonic) de su próxima limpieza
+        self._proximas: "weakref.WeakKeyDictionary[Cache, float]" = weakref.WeakKeyDictionary()
+        self._condicion = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+
+    def registrar(self, cache: "Cache") -> None:
+        with self._condicion:
+            if cache in self._proximas:
+                return
+            self._proximas[cache] = time.monotonic() + cache.intervalo_limpieza
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle, name="cache-limpieza", daemon=True)
+                self._hilo.start()
+            # Puede que este caché venza antes que el que se estaba esperando
+            self._condicion.notify()
+
+    def quitar(self, cache: "Cache") -> None:
+        with self._condicion:
+            self._proximas.pop(cache, None)
+
+    def _bucle(self) -> None:
+        while True:
+            with self._condicion:
+                ahora = time.monotonic()
+                vencidos = [cache for cache, proxima in self._proximas.items() if proxima <= ahora]
+                if not vencidos:
+                    proxima = min(self._proximas.values(), default=None)
+                    self._condicion.wait(None if proxima is None else proxima - ahora)
+                    continue
+                for cache in vencidos:
+                    self._proximas[cache] = ahora + cache.intervalo_limpieza
+            # Fuera del lock: limpiar un caché no bloquea el registro de otros
+            for cache in vencidos:
+                try:
+                    cache.limpiar_expirados()
+                except Exception:
+                    logger.exception("Error en la limpieza de fondo del caché")
+            del vencidos, cache
+
+
+_barrendero = _Barrendero()
+
+
+def _estadisticas_vacias() -> Dict[str, int]:
+    return {'hits': 0, 'misses': 0, 'escrituras': 0, 'desalojos': 0, 'expirados': 0}
+
+
+class _Segmento:
+    """
+    Una franja del caché: sus propios items en orden de uso, su lock, su
+    heap de expiraciones y sus contadores. Cache reparte las claves entre
+    segmentos por hash, así que hilos que usan claves distintas casi nunca
+    compiten por el mismo lock.
+    """
+    
+    __slots__ = ('datos', 'lock', 'bytes', 'conteos', 'expiraciones', 'estadisticas', 'max_items', 'max_bytes')
+    
+    def __init__(self, max_items: Optional[int], max_bytes: Optional[int]):
+        self.datos: "OrderedDict[Tuple[str, Hashable], CacheItem]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        # Items por namespace, para no recorrer las claves al pedir estadísticas
+        self.conteos: Dict[str, int] = {}
+        # (expira_en, contador, clave): el contador desempata sin comparar claves
+        self.expiraciones: List[Tuple[float, int, Tuple[str, Hashable]]] = []
+        self.estadisticas: Dict[str, Dict[str, int]] = {}
+        # Parte de los límites del caché que corresponde a este segmento
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+    
+    def stats(self, namespace: str) -> Dict[str, int]:
+        stats = self.estadisticas.get(namespace)
+        if stats is None:
+            stats = self.estadisticas[namespace] = _estadisticas_vacias()
+        return stats
+    
+    def contar(self, namespace: str, delta: int) -> None:
+        restantes = self.conteos.get(namespace, 0) + delta
+        if restantes:
+            self.conteos[namespace] = restantes
+        else:
+            self.conteos.pop(namespace, None)
+    
+    def quitar(self, llave: Tuple[str, Hashable]) -> CacheItem:
+        item = self.datos.pop(llave)
+        self.bytes -= item.tamano
+        self.contar(llave[0], -1)
+        return item
 
 
 class Cache:
     """
-    Implementación de un caché simple con TTL.
+    Caché acotada con TTL y desalojo LRU.
     Thread-safe para uso en aplicaciones multihilo.
+
+    Los items se guardan en un OrderedDict en orden de uso, por lo que
+    desalojar el menos usado recientemente es O(1). El límite puede ser de
+    cantidad de items (``max_items``) y/o de bytes aproximados (``max_bytes``,
+    medidos con ``sys.getsizeof`` del valor).
+
+    Por defecto hay un solo lock (``segmentos=1``). Con ``segmentos > 1``
+    las claves se reparten por hash entre franjas independientes, cada una
+    con su propio lock. Con el GIL la ganancia es pequeña y depende de la
+    carga; con pocos hilos puede ser más lento que un solo lock, así que
+    conviene medirlo antes (``python -m benchmarks.bench_cache``). En ese
+    modo:
+
+    - El LRU es aproximado: cada segmento desaloja su propio item menos
+      usado, no el menos usado de todo el caché.
+    - La capacidad es por segmento: ``max_items`` y ``max_bytes`` se
+      reparten en partes iguales y un segmento lleno desaloja aunque otros
+      tengan espacio, así que con claves o tamaños desparejos el caché
+      guarda menos que el límite total.
+
+    Las estadísticas se suman segmento a segmento, sin bloquear todo el caché.
+
+    Los items expirados se eliminan al accederlos y, además, un hilo de
+    fondo compartido por todos los cachés los retira cada
+    ``intervalo_limpieza`` segundos. Las expiraciones
+    se llevan en un heap, así que la limpieza solo recorre los items
+    efectivamente vencidos.
+
+    Cada clave pertenece a un ``namespace`` (por defecto ``'default'``), lo
+    que permite limpiar y consultar estadísticas por separado, por ejemplo
+    para menús, clientes o reportes.
     """
     
-    def __init__(self, ttl_default: int = 300):
+    def __init__(self,
+                 ttl_default: Optional[int] = 300,
+                 max_items: Optional[int] = 10000,
+                 max_bytes: Optional[int] = None,
+                 intervalo_limpieza: Optional[float] = 60,
+                 segmentos: int = 1):
         """
         Inicializa el caché.
         
         Args:
-            ttl_default: TTL por defecto en segundos (300 = 5 minutos)
+            ttl_default: TTL por defecto en segundos (300 = 5 minutos; None = sin expiración)
+            max_items: Número máximo de items (None = sin límite)
+            max_bytes: Tamaño máximo aproximado en bytes (None = sin límite)
+            intervalo_limpieza: Segundos entre limpiezas de fondo (None = solo al acceder)
+            segmentos: Número de franjas con lock propio (1 = un solo lock global y LRU exacto)
         """
-        self._datos: Dict[str, CacheItem] = {}
-        self._lock = threading.Lock()
+        if max_items is not None:
+            # Cada segmento debe poder guardar al menos un item
+            segmentos = max(1, min(segmentos, max_items))
+        self._segmentos = [
+            _Segmento(self._repartir(max_items, segmentos, i), self._repartir(max_bytes, segmentos, i))
+            for i in range(segmentos)
+        ]
         self.ttl_default = ttl_default
-        self._estadisticas = {
-            'hits': 0,
-            'misses': 0,
-            'escrituras': 0
-        }
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.intervalo_limpieza = intervalo_limpieza
+        self._contador = itertools.count()
+        self._limpieza_iniciada = False
+    
+    @staticmethod
+    def _repartir(limite: Optional[int], partes: int, indice: int) -> Optional[int]:
+        """Parte del límite para el segmento ``indice``; las partes suman exactamente el límite."""
+        if limite is None:
+            return None
+        return limite // partes + (1 if indice < limite % partes else 0)
     
-    def set(self, clave: str, valor: Any, ttl: Optional[int] = None) -> None:
+    def _segmento(self, llave: Tuple[str, Hashable]) -> _Segmento:
+        return self._segmentos[hash(llave) % len(self._segmentos)]
+    
+    def set(self, clave: Hashable, valor: Any, ttl: Optional[int] = None, namespace: str = 'default') -> None:
         """
         Almacena un valor en caché.
         
         Args:
-            clave: Identificador único del valor
+            clave: Identificador único del valor (cualquier valor hashable)
             valor: Valor a almacenar
             ttl: Tiempo de vida (None usa el default)
+            namespace: Grupo al que pertenece la clave
             
         Ejemplo:
             >>> cache = Cache()
             >>> cache.set('usuario_1', {'nombre': 'Juan'}, ttl=600)
         """
         ttl_final = ttl if ttl is not None else self.ttl_default
+        tamano = sys.getsizeof(valor) if self.max_bytes is not None else 0
+        item = CacheItem(valor, ttl_final, tamano)
+        llave = (namespace, clave)
+        segmento = self._segmento(llave)
         
-        with self._lock:
-            self._datos[clave] = CacheItem(valor, ttl_final)
-            self._estadisticas['escrituras'] += 1
+        with segmento.lock:
+            anterior = segmento.datos.pop(llave, None)
+            if anterior is not None:
+                segmento.bytes -= anterior.tamano
+            else:
+                segmento.contar(namespace, 1)
+            segmento.datos[llave] = item
+            segmento.bytes += tamano
+            if item.expira_en is not None:
+                heapq.heappush(segmento.expiraciones, (item.expira_en, next(self._contador), llave))
+            segmento.stats(namespace)['escrituras'] += 1
+            self._desalojar(segmento)
+            # Sin limpieza de fondo (o entre barridos) el heap también debe quedar acotado
+            self._compactar_expiraciones(segmento)
+        self._iniciar_limpieza()
+    
+    def _desalojar(self, segmento: _Segmento) -> None:
+        """Desaloja los items menos usados del segmento mientras se superen sus límites (requiere su lock)."""
+        while segmento.datos and (
+            (segmento.max_items is not None and len(segmento.datos) > segmento.max_items)
+            or (segmento.max_bytes is not None and segmento.bytes > segmento.max_bytes)
+        ):
+            (namespace, _), item = segmento.datos.popitem(last=False)
+            segmento.bytes -= item.tamano
+            segmento.contar(namespace, -1)
+            segmento.stats(namespace)['desalojos'] += 1
     
-    def get(self, clave: str, default: Any = None) -> Any:
+    def get(self, clave: Hashable, default: Any = None, namespace: str = 'default') -> Any:
         """
         Obtiene un valor del caché.
         
         Args:
             clave: Identificador del valor
             default: Valor por defecto si no existe o ha expirado
+            namespace: Grupo al que pertenece la clave
             
         Returns:
             El valor cacheado o el default
@@ -90,70 +337,158 @@ class Cache:
             >>> cache.get('usuario_1')
             {'nombre': 'Juan'}
         """
-        with self._lock:
-            if clave not in self._datos:
-                self._estadisticas['misses'] += 1
+        llave = (namespace, clave)
+        segmento = self._segmento(llave)
+        with segmento.lock:
+            stats = segmento.stats(namespace)
+            item = segmento.datos.get(llave)
+            if item is None:
+                stats['misses'] += 1
                 return default
             
-            item = self._datos[clave]
-            
             if item.esta_expirado():
-                del self._datos[clave]
-                self._estadisticas['misses'] += 1
+                segmento.quitar(llave)
+                stats['expirados'] += 1
+                stats['misses'] += 1
                 return default
             
-            self._estadisticas['hits'] += 1
+            segmento.datos.move_to_end(llave)
+            stats['hits'] += 1
             return item.valor
     
-    def existe(self, clave: str) -> bool:
+    def existe(self, clave: Hashable, namespace: str = 'default') -> bool:
         """Verifica si una clave existe y no está expirada"""
-        with self._lock:
-            if clave not in self._datos:
+        llave = (namespace, clave)
+        segmento = self._segmento(llave)
+        with segmento.lock:
+            item = segmento.datos.get(llave)
+            if item is None:
                 return False
             
-            item = self._datos[clave]
             if item.esta_expirado():
-                del self._datos[clave]
+                segmento.quitar(llave)
+                segmento.stats(namespace)['expirados'] += 1
                 return False
             
             return True
     
-    def eliminar(self, clave: str) -> None:
+    def eliminar(self, clave: Hashable, namespace: str = 'default') -> None:
         """Elimina un valor del caché"""
-        with self._lock:
-            if clave in self._datos:
-                del self._datos[clave]
+        llave = (namespace, clave)
+        segmento = self._segmento(llave)
+        with segmento.lock:
+            if llave in segmento.datos:
+                segmento.quitar(llave)
     
-    def limpiar(self) -> None:
-        """Limpia todo el caché"""
-        with self._lock:
-            self._datos.clear()
-            self._estadisticas = {'hits': 0, 'misses': 0, 'escrituras': 0}
+    def limpiar(self, namespace: Optional[str] = None) -> None:
+        """Limpia todo el caché, o solo un namespace"""
+        for segmento in self._segmentos:
+            with segmento.lock:
+                if namespace is None:
+                    segmento.datos.clear()
+                    segmento.expiraciones.clear()
+                    segmento.bytes = 0
+                    segmento.conteos.clear()
+                    segmento.estadisticas = {}
+                    continue
+                if segmento.conteos.get(namespace):
+                    for llave in [llave for llave in segmento.datos if llave[0] == namespace]:
+                        segmento.quitar(llave)
+                segmento.estadisticas.pop(namespace, None)
+    
+    def invalidar_namespace(self, namespace: str) -> int:
+        """
+        Elimina todos los items de un namespace conservando sus estadísticas.
+        
+        Returns:
+            Número de items eliminados
+        """
+        eliminados = 0
+        for segmento in self._segmentos:
+            with segmento.lock:
+                # Los segmentos sin items del namespace no se recorren
+                if not segmento.conteos.get(namespace):
+                    continue
+                for llave in [llave for llave in segmento.datos if llave[0] == namespace]:
+                    segmento.quitar(llave)
+                    eliminados += 1
+        return eliminados
+    
+    def invalidar_con(self, entidades: Iterable[str], namespace: str = 'default',
+                      bus: Optional[BusInvalidacion] = None) -> None:
+        """
+        Suscribe un namespace al bus de invalidación: cada vez que cambie
+        alguna de las entidades, el namespace completo se descarta.
+        
+        Ejemplo:
+            >>> cache_global.invalidar_con(['menus', 'menu_ingredientes'], namespace='menus')
+        """
+        bus = bus or bus_invalidacion
+        for entidad in entidades:
+            bus.suscribir(entidad, lambda _entidad, _claves: self.invalidar_namespace(namespace))
     
     def limpiar_expirados(self) -> int:
         """
-        Elimina todos los items expirados.
+        Elimina todos los items expirados. Solo recorre las expiraciones
+        vencidas de cada segmento, no todo el caché.
         
         Returns:
             Número de items eliminados
         """
-        with self._lock:
-            claves_expiradas = [
-                clave for clave, item in self._datos.items()
-                if item.esta_expirado()
+        ahora = time.monotonic()
+        eliminados = 0
+        for segmento in self._segmentos:
+            with segmento.lock:
+                expiraciones = segmento.expiraciones
+                while expiraciones and expiraciones[0][0] <= ahora:
+                    expira_en, _, llave = heapq.heappop(expiraciones)
+                    item = segmento.datos.get(llave)
+                    # La entrada del heap puede ser de un valor ya reemplazado o eliminado
+                    if item is not None and item.expira_en == expira_en:
+                        segmento.quitar(llave)
+                        segmento.stats(llave[0])['expirados'] += 1
+                        eliminados += 1
+                self._compactar_expiraciones(segmento)
+        return eliminados
+    
+    def _compactar_expiraciones(self, segmento: _Segmento) -> None:
+        """
+        Reconstruye el heap de expiraciones del segmento cuando las entradas
+        huérfanas (de valores reemplazados, eliminados o desalojados) superan
+        a las vigentes (requiere su lock). Al reconstruirlo queda a lo más con
+        una entrada por item, así que el costo por escritura es O(1) amortizado.
+        """
+        if len(segmento.expiraciones) > 2 * len(segmento.datos) + 64:
+            segmento.expiraciones = [
+                (item.expira_en, next(self._contador), llave)
+                for llave, item in segmento.datos.items() if item.expira_en is not None
             ]
-            
-            for clave in claves_expiradas:
-                del self._datos[clave]
-            
-            return len(claves_expiradas)
+            heapq.heapify(segmento.expiraciones)
     
-    def obtener_estadisticas(self) -> Dict[str, Any]:
+    def _iniciar_limpieza(self) -> None:
+        """Registra (una vez) el caché en el hilo de limpieza de fondo compartido."""
+        if self.intervalo_limpieza is None or self._limpieza_iniciada:
+            return
+        self._limpieza_iniciada = True
+        _barrendero.registrar(self)
+    
+    def detener_limpieza(self) -> None:
+        """Saca el caché de la limpieza de fondo (los expirados se siguen retirando al accederlos)."""
+        self._limpieza_iniciada = True
+        _barrendero.quitar(self)
+    
+    def obtener_estadisticas(self, namespace: Optional[str] = None) -> Dict[str, Any]:
         """
-        Retorna estadísticas de uso del caché.
+        Retorna estadísticas de uso del caché, global o de un namespace.
+        
+        Los contadores de cada segmento (incluidos los items por namespace)
+        se copian con su lock tomado solo durante la copia; la suma y los
+        porcentajes se calculan sin locks y sin recorrer las claves.
         
         Returns:
-            Dict con hits, misses, escrituras y tasa de acierto
+            Dict con hits, misses, escrituras, tasa de acierto, desalojos,
+            expirados y ocupación; sin namespace incluye además las
+            estadísticas de cada uno en 'namespaces'
             
         Ejemplo:
             >>> cache.obtener_estadisticas()
@@ -161,10 +496,210 @@ class Cache:
                 'hits': 42,
                 'misses': 8,
                 'escrituras': 15,
-                'tasa_acierto': 0.84
+                'tasa_acierto': 0.84,
+                ...
             }
         """
+        por_namespace: Dict[str, Dict[str, int]] = {}
+        items_por_namespace: Dict[str, int] = {}
+        bytes_en_cache = 0
+        for segmento in self._segmentos:
+            with segmento.lock:
+                copia = [(ns, dict(stats)) for ns, stats in segmento.estadisticas.items()]
+                conteos = dict(segmento.conteos)
+                bytes_en_cache += segmento.bytes
+            for ns, stats in copia:
+                acumulado = por_namespace.setdefault(ns, _estadisticas_vacias())
+                for campo, valor in stats.items():
+                    acumulado[campo] += valor
+            for ns, cantidad in conteos.items():
+                items_por_namespace[ns] = items_por_namespace.get(ns, 0) + cantidad
+        
+        if namespace is not None:
+            return self._resumen(por_namespace.get(namespace, _estadisticas_vacias()),
+                                 items_por_namespace.get(namespace, 0))
+        
+        totales = _estadisticas_vacias()
+        for stats in por_namespace.values():
+            for campo, valor in stats.items():
+                totales[campo] += valor
+        resumen = self._resumen(totales, sum(items_por_namespace.values()))
+        resumen.update({
+            'bytes_en_cache': bytes_en_cache,
+            'max_items': self.max_items,
+            'max_bytes': self.max_bytes,
+            'segmentos': len(self._segmentos),
+            'namespaces': {
+                ns: self._resumen(stats, items_por_namespace.get(ns, 0))
+                for ns, stats in por_namespace.items()
+            }
+        })
+        return resumen
+    
+    @staticmethod
+    def _resumen(stats: Dict[str, int], items: int) -> Dict[str, Any]:
+        total = stats['hits'] + stats['misses']
+        tasa_acierto = (
+            stats['hits'] / total
+            if total > 0 else 0
+        )
+        
+        return {
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'escrituras': stats['escrituras'],
+            'tasa_acierto': round(tasa_acierto, 2),
+            'items_en_cache': items,
+            'desalojos': stats['desalojos'],
+            'expirados': stats['expirados']
+        }
+    
+    def __len__(self) -> int:
+        return sum(len(segmento.datos) for segmento in self._segmentos)
+    
+    def __repr__(self) -> str:
+        """Representación en string del caché"""
+        stats = self.obtener_estadisticas()
+        return (
+            f"Cache(items={stats['items_en_cache']}, "
+            f"hits={stats['hits']}, "
+            f"misses={stats['misses']}, "
+            f"acierto={stats['tasa_acierto']})"
+        )
+
+
+class CacheLRU(Cache):
+    """
+    Caché acotada por número de elementos con desalojo LRU y sin
+    expiración. Las claves pueden ser cualquier valor hashable, por ejemplo
+    tuplas. Thread-safe. Por defecto usa un solo segmento, es decir, un orden
+    LRU exacto sobre todos los elementos.
+    """
+    
+    def __init__(self, max_items: int = 128, segmentos: int = 1):
+        """
+        Inicializa el caché.
+        
+        Args:
+            max_items: Número máximo de elementos antes de desalojar
+            segmentos: Número de franjas con lock propio
+        """
+        super().__init__(ttl_default=None, max_items=max_items, intervalo_limpieza=None, segmentos=segmentos)
+
+
+class CacheDisco:
+    """
+    Caché persistente de bytes en un directorio, acotada por tamaño total
+    con desalojo LRU. Cada entrada es un archivo cuyo nombre es el hash de la
+    clave; el orden de uso se conserva entre ejecuciones mediante la fecha de
+    modificación de los archivos. Thread-safe.
+    """
+    
+    def __init__(self, directorio: str, max_bytes: int = 100 * 1024 * 1024):
+        """
+        Inicializa el caché. El directorio se crea y se indexa en el primer uso.
+        
+        Args:
+            directorio: Carpeta donde se guardan las entradas
+            max_bytes: Tamaño máximo total antes de desalojar
+        """
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # nombre de archivo -> tamaño en bytes, del menos al más usado
+        self._indice: "Optional[OrderedDict[str, int]]" = None
+        self._bytes = 0
+        self._estadisticas = {
+            'hits': 0,
+            'misses': 0,
+            'escrituras': 0,
+            'desalojos': 0
+        }
+    
+    def _cargar_indice(self) -> None:
+        """Indexa las entradas existentes, ordenadas por último uso (requiere el lock)."""
+        if self._indice is not None:
+            return
+        os.makedirs(self.directorio, exist_ok=True)
+        entradas = []
+        for entrada in os.scandir(self.directorio):
+            if entrada.is_file() and entrada.name.endswith('.bin'):
+                info = entrada.stat()
+                entradas.append((info.st_mtime, entrada.name, info.st_size))
+        entradas.sort()
+        self._indice = OrderedDict((nombre, tamano) for _, nombre, tamano in entradas)
+        self._bytes = sum(self._indice.values())
+    
+    @staticmethod
+    def _nombre(clave: str) -> str:
+        return hashlib.sha256(clave.encode('utf-8')).hexdigest() + '.bin'
+    
+    def get(self, clave: str) -> Optional[bytes]:
+        """Obtiene los bytes guardados para la clave (o None) y los marca como usados recientemente"""
+        nombre = self._nombre(clave)
         with self._lock:
+            self._cargar_indice()
+            if nombre not in self._indice:
+                self._estadisticas['misses'] += 1
+                return None
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                with open(ruta, 'rb') as archivo:
+                    datos = archivo.read()
+                os.utime(ruta)
+            except OSError:
+                # El archivo se borró por fuera: se olvida la entrada
+                self._bytes -= self._indice.pop(nombre)
+                self._estadisticas['misses'] += 1
+                return None
+            self._indice.move_to_end(nombre)
+            self._estadisticas['hits'] += 1
+            return datos
+    
+    def set(self, clave: str, datos: bytes) -> None:
+        """Guarda los bytes para la clave, desalojando los menos usados si se supera el límite"""
+        nombre = self._nombre(clave)
+        ruta = os.path.join(self.directorio, nombre)
+        with self._lock:
+            self._cargar_indice()
+            temporal = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(temporal, 'wb') as archivo:
+                archivo.write(datos)
+            os.replace(temporal, ruta)
+            self._bytes += len(datos) - self._indice.pop(nombre, 0)
+            self._indice[nombre] = len(datos)
+            self._estadisticas['escrituras'] += 1
+            while self._bytes > self.max_bytes and len(self._indice) > 1:
+                desalojado, tamano = self._indice.popitem(last=False)
+                try:
+                    os.remove(os.path.join(self.directorio, desalojado))
+                except OSError:
+                    pass
+                self._bytes -= tamano
+                self._estadisticas['desalojos'] += 1
+    
+    def limpiar(self) -> None:
+        """Elimina todas las entradas del caché"""
+        with self._lock:
+            self._cargar_indice()
+            for nombre in self._indice:
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except OSError:
+                    pass
+            self._indice.clear()
+            self._bytes = 0
+            self._estadisticas = {'hits': 0, 'misses': 0, 'escrituras': 0, 'desalojos': 0}
+    
+    def obtener_estadisticas(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas de uso del caché.
+        
+        Returns:
+            Dict con hits, misses, escrituras, desalojos, tasa de acierto y bytes ocupados
+        """
+        with self._lock:
+            self._cargar_indice()
             total = self._estadisticas['hits'] + self._estadisticas['misses']
             tasa_acierto = (
                 self._estadisticas['hits'] / total
@@ -175,73 +710,154 @@ class Cache:
                 'hits': self._estadisticas['hits'],
                 'misses': self._estadisticas['misses'],
                 'escrituras': self._estadisticas['escrituras'],
+                'desalojos': self._estadisticas['desalojos'],
                 'tasa_acierto': round(tasa_acierto, 2),
-                'items_en_cache': len(self._datos)
+                'items_en_cache': len(self._indice),
+                'bytes_en_cache': self._bytes,
+                'max_bytes': self.max_bytes
             }
-    
-    def __repr__(self) -> str:
-        """Representación en string del caché"""
-        stats = self.obtener_estadisticas()
-        return (
-            f"Cache(items={stats['items_en_cache']}, "
-            f"hits={stats['hits']}, "
-            f"misses={stats['misses']}, "
-            f"acierto={stats['tasa_acierto']})"
-        )
+
+
+# Marca de "no está en caché", distinta de cualquier valor cacheable (incluido None)
+_FALTANTE = object()
 
 
 class cache_funciones:
     """
-    Decorador para cachear resultados de funciones.
+    Decorador para cachear resultados de funciones (memoización).
     Útil para operaciones costosas que se llaman frecuentemente.
+
+    Cada función decorada tiene su propio caché (namespace = nombre
+    calificado de la función) con su propio límite de tamaño, así que
+    limpiar una no afecta a las demás. La clave es la tupla de argumentos,
+    por lo que ``f(1)``, ``f(1.0)`` y ``f('1')`` son entradas distintas, y los resultados
+    None también se cachean.
+
+    Si varios hilos piden a la vez una clave que no está en caché, solo uno
+    ejecuta la función y los demás esperan su resultado (single-flight).
+
+    Con ``invalidar_con`` el caché de la función se descarta cada vez que el
+    bus de invalidación publica un cambio en alguna de esas entidades. El bus
+    es del proceso: para datos que otros procesos modifican conviene un
+    ``ttl`` corto.
+
+    La función decorada expone:
+        - ``limpiar_cache()``: vacía solo el caché de esa función
+        - ``invalidar(*args, **kwargs)``: elimina solo la entrada de esos argumentos
+        - ``estadisticas()``: estadísticas del caché de esa función
+        - ``cache``: la instancia de Cache subyacente
     """
     
-    # Caché global compartida
-    _cache_global = Cache()
-    
-    def __init__(self, ttl: Optional[int] = None):
+    def __init__(self, ttl: Optional[int] = None, max_items: int = 1024,
+                 invalidar_con: Iterable[str] = (), bus: Optional[BusInvalidacion] = None):
         """
         Inicializa el decorador.
         
         Args:
-            ttl: Tiempo de vida del caché en segundos
+            ttl: Tiempo de vida del caché en segundos (None = 300)
+            max_items: Número máximo de resultados guardados para la función
+            invalidar_con: Entidades (tablas) cuyos cambios invalidan el caché
+            bus: Bus de invalidación (por defecto, bus_invalidacion)
             
         Ejemplo:
-            @cache_funciones(ttl=600)
+            @cache_funciones(ttl=3600, invalidar_con=('menus',))
             def obtener_productos_populares():
                 # Operación costosa
                 return productos
         """
         self.ttl = ttl
+        self.max_items = max_items
+        self.invalidar_con = tuple(invalidar_con)
+        self.bus = bus or bus_invalidacion
+    
+    @staticmethod
+    def _clave(args: tuple, kwargs: dict) -> Hashable:
+        """Clave tipada: incluye los tipos para que f(1), f(1.0) y f(True) no se confundan."""
+        nombrados = tuple(sorted(kwargs.items()))
+        return (args, nombrados, tuple(type(v) for v in args), tuple(type(v) for _, v in nombrados))
     
     def __call__(self, func: Callable) -> Callable:
         """Aplica el decorador a una función"""
+        namespace = f"{func.__module__}.{func.__qualname__}"
+        cache = Cache(ttl_default=self.ttl if self.ttl is not None else 300, max_items=self.max_items)
+        en_curso: Dict[Hashable, Future] = {}
+        # Claves en curso invalidadas con invalidar(): su resultado no se guarda
+        obsoletas: Set[Hashable] = set()
+        lock = threading.Lock()
+        # Cambia al vaciar todo el caché: ningún resultado calculado antes se guarda
+        version = [0]
         
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Generar clave única basada en función y argumentos
-            cache_key = f"{func.__name__}_{args}_{kwargs}"
-            
-            # Intentar obtener del caché
-            resultado = self._cache_global.get(cache_key)
-            
-            if resultado is not None:
+            clave = self._clave(args, kwargs)
+            try:
+                resultado = cache.get(clave, _FALTANTE, namespace=namespace)
+            except TypeError:
+                # Argumentos no hashables (listas, dicts...): no se puede cachear
+                return func(*args, **kwargs)
+            if resultado is not _FALTANTE:
                 return resultado
             
-            # Si no está en caché, ejecutar función
-            resultado = func(*args, **kwargs)
-            
-            # Almacenar en caché
-            self._cache_global.set(cache_key, resultado, self.ttl)
+            with lock:
+                futuro = en_curso.get(clave)
+                lider = futuro is None
+                if lider:
+                    futuro = en_curso[clave] = Future()
+                    version_inicial = version[0]
+            if not lider:
+                # Otro hilo ya está calculando esta clave
+                return futuro.result()
             
+            try:
+                resultado = func(*args, **kwargs)
+            except BaseException as e:
+                futuro.set_exception(e)
+                raise
+            else:
+                futuro.set_result(resultado)
+            finally:
+                with lock:
+                    del en_curso[clave]
+                    obsoleta = clave in obsoletas
+                    obsoletas.discard(clave)
+                    if version[0] == version_inicial and not obsoleta and not futuro.exception():
+                        cache.set(clave, resultado, namespace=namespace)
             return resultado
         
-        # Agregar método para limpiar caché como atributo dinámico
-        setattr(wrapper, 'limpiar_cache', lambda: self._cache_global.limpiar())
-        setattr(wrapper, 'estadisticas', lambda: self._cache_global.obtener_estadisticas())
+        def invalidar(*args, **kwargs):
+            clave = self._clave(args, kwargs)
+            with lock:
+                if clave in en_curso:
+                    obsoletas.add(clave)
+                cache.eliminar(clave, namespace=namespace)
+        
+        def limpiar_cache():
+            with lock:
+                version[0] += 1
+                cache.limpiar()
+        
+        def al_cambiar(_entidad, _claves):
+            with lock:
+                version[0] += 1
+                cache.invalidar_namespace(namespace)
+        
+        for entidad in self.invalidar_con:
+            self.bus.suscribir(entidad, al_cambiar)
+        
+        # Agregar métodos para administrar el caché como atributos dinámicos
+        setattr(wrapper, 'limpiar_cache', limpiar_cache)
+        setattr(wrapper, 'invalidar', invalidar)
+        setattr(wrapper, 'estadisticas', lambda: cache.obtener_estadisticas(namespace))
+        setattr(wrapper, 'cache', cache)
         
         return wrapper
 
 
 # Instancia global de caché para usar en la aplicación
 cache_global = Cache(ttl_default=300)
+
+# Iconos decodificados (CTkImage) de las tarjetas de menú, por (ruta, tamaño, mtime)
+cache_iconos = CacheLRU(max_items=128)
+
+# Páginas de PDF ya rasterizadas (PNG) del visor, por (hash del PDF, página, tamaño)
+cache_paginas_pdf = CacheDisco(os.path.join('.cache', 'paginas_pdf'), max_bytes=100 * 1024 * 1024)
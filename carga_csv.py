@@ -0,0 +1,110 @@
+"""
+Carga de archivos CSV de ingredientes por bloques.
+
+Los archivos de la bodega central pueden pesar cientos de MB, así que nunca
+se leen completos en memoria: el encabezado se valida una sola vez y luego el
+archivo se recorre en bloques de ``tamano_bloque`` filas que se envían
+directamente a ``Stock.bulk_upsert_por_bloques``. El consumo de memoria queda
+acotado por el tamaño del bloque, sin importar el tamaño del archivo.
+"""
+
+import csv
+import os
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+from error_handler import CSVException, logger
+
+COLUMNAS_REQUERIDAS = ('nombre', 'unidad', 'cantidad')
+# utf-8-sig descarta el BOM que agregan Excel y la bodega central
+CODIFICACION = 'utf-8-sig'
+
+
+def validar_encabezado(ruta: str) -> List[str]:
+    """
+    Lee solo la primera línea del archivo y verifica que contenga las
+    columnas nombre, unidad y cantidad.
+
+    Returns:
+        Lista de columnas del encabezado
+
+    Raises:
+        CSVException: Si el archivo está vacío o faltan columnas
+    """
+    with open(ruta, newline='', encoding=CODIFICACION) as archivo:
+        encabezado = next(csv.reader(archivo), None)
+    if not encabezado:
+        raise CSVException("El archivo CSV está vacío")
+    columnas = [col.strip() for col in encabezado]
+    faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in columnas]
+    if faltantes:
+        raise CSVException(
+            f"El archivo CSV debe contener las columnas: {', '.join(COLUMNAS_REQUERIDAS)} "
+            f"(faltan: {', '.join(faltantes)})"
+        )
+    return columnas
+
+
+def _es_columna_requerida(columna: str) -> bool:
+    # Misma normalización que validar_encabezado: " nombre" cuenta como "nombre"
+    return columna.strip() in COLUMNAS_REQUERIDAS
+
+
+def _normalizar_columnas(df: pd.DataFrame) -> pd.DataFrame:
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def _leer_csv(archivo, **opciones):
+    # Todo como texto: la cantidad se convierte luego a Decimal sin pasar por float
+    return pd.read_csv(archivo, usecols=_es_columna_requerida, dtype=str,
+                       encoding=CODIFICACION, **opciones)
+
+
+def leer_vista_previa(ruta: str, filas: int = 1000) -> pd.DataFrame:
+    """Lee solo las primeras ``filas`` filas del archivo, para mostrarlas en pantalla."""
+    validar_encabezado(ruta)
+    return _normalizar_columnas(_leer_csv(ruta, nrows=filas))
+
+
+def leer_csv_por_bloques(archivo, tamano_bloque: int = 50000) -> Iterator[pd.DataFrame]:
+    """
+    Recorre un CSV (ruta o archivo abierto) en DataFrames de a lo más
+    ``tamano_bloque`` filas, solo con las columnas requeridas y tipadas como texto.
+    """
+    with _leer_csv(archivo, chunksize=tamano_bloque) as lector:
+        for bloque in lector:
+            yield _normalizar_columnas(bloque)
+
+
+def cargar_csv_en_stock(ruta: str, stock, tamano_bloque: int = 50000,
+                        progreso: Optional[Callable[[int, float], None]] = None):
+    """
+    Suma al stock todos los ingredientes del CSV, bloque a bloque y en una
+    sola transacción.
+
+    Args:
+        ruta: Ruta del archivo CSV
+        stock: Instancia de Stock
+        tamano_bloque: Filas leídas por bloque
+        progreso: Función opcional ``progreso(filas_procesadas, fraccion)``,
+            con ``fraccion`` entre 0 y 1 según los bytes leídos del archivo
+
+    Returns:
+        ResultadoCarga de Stock.bulk_upsert_por_bloques
+
+    Raises:
+        CSVException: Si el encabezado no es válido
+    """
+    validar_encabezado(ruta)
+    tamano_archivo = os.path.getsize(ruta) or 1
+    logger.info(f"Carga por bloques de {ruta} ({tamano_archivo} bytes, bloques de {tamano_bloque} filas)")
+
+    with open(ruta, 'rb') as archivo:
+        avance = None
+        if progreso is not None:
+            def avance(filas: int):
+                progreso(filas, min(archivo.tell() / tamano_archivo, 1.0))
+
+        return stock.bulk_upsert_por_bloques(leer_csv_por_bloques(archivo, tamano_bloque), progreso=avance)
@@ -78,6 +78,19 @@ def get_boleta_by_pedido_id(session: Session, pedido_id: int) -> Boleta:
     return session.query(Boleta).filter(Boleta.pedido_id == pedido_id).first()
 
 
+def get_ultima_boleta(session: Session) -> Optional[Boleta]:
+    """
+    Obtiene la boleta generada más recientemente.
+    
+    Args:
+        session: Sesión de BD
+    
+    Returns:
+        Objeto Boleta o None si no hay boletas
+    """
+    return session.query(Boleta).order_by(Boleta.fecha_generacion.desc(), Boleta.id.desc()).first()
+
+
 def get_all_boletas(session: Session, estado: Optional[str] = None) -> list:
     """
     Obtiene todas las boletas, opcionalmente filtradas por estado.
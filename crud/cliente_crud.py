@@ -8,6 +8,14 @@ def get_all_clientes(session: Session):
     """
     return session.query(Cliente).order_by(Cliente.id).all()
 
+def get_clientes_pagina(session: Session, despues_de_id: int = 0, limite: int = 100):
+    """
+    Recupera una página de clientes ordenada por ID usando paginación por
+    clave (keyset): devuelve hasta 'limite' clientes con ID mayor a
+    'despues_de_id'. A diferencia de OFFSET, el costo no crece con la página.
+    """
+    return session.query(Cliente).filter(Cliente.id > despues_de_id).order_by(Cliente.id).limit(limite).all()
+
 def get_cliente_by_id(session: Session, cliente_id: int):
     """
     Recupera un solo cliente por su ID.
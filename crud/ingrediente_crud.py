@@ -9,6 +9,14 @@ def get_all_ingredientes(session: Session):
     """
     return session.query(Ingrediente).order_by(Ingrediente.id).all()
 
+def get_ingredientes_pagina(session: Session, despues_de_id: int = 0, limite: int = 100):
+    """
+    Recupera una página de ingredientes ordenada por ID usando paginación por
+    clave (keyset): devuelve hasta 'limite' ingredientes con ID mayor a
+    'despues_de_id'.
+    """
+    return session.query(Ingrediente).filter(Ingrediente.id > despues_de_id).order_by(Ingrediente.id).limit(limite).all()
+
 def get_ingrediente_by_name(session: Session, nombre: str):
     """
     Recupera un solo ingrediente por su nombre.
@@ -1,13 +1,60 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload
 from models import Pedido, PedidoItem
+from crud import venta_diaria_crud
 import datetime
 from decimal import Decimal
+from typing import Iterator, Optional
 
 def get_all_pedidos(session: Session):
     """
     Recupera todos los pedidos de la base de datos.
     """
-    return session.query(Pedido).options(joinedload(Pedido.cliente), joinedload(Pedido.items).joinedload(PedidoItem.menu)).order_by(Pedido.fecha.desc()).all()
+    return session.query(Pedido).options(joinedload(Pedido.cliente), selectinload(Pedido.items).joinedload(PedidoItem.menu)).order_by(Pedido.fecha.desc()).all()
+
+def iter_pedidos(session: Session, batch_size: int = 1000, since: Optional[datetime.datetime] = None,
+                 until: Optional[datetime.datetime] = None, streaming: bool = False) -> Iterator[Pedido]:
+    """
+    Recorre los pedidos ordenados por (fecha, id), de a 'batch_size' por vez,
+    con su cliente y sus ítems (y el menú de cada ítem) ya cargados.
+    'since' es inclusivo y 'until' exclusivo.
+
+    Por defecto usa paginación por clave (keyset): cada lote es una consulta
+    corta que continúa después del último (fecha, id) visto, por lo que el
+    costo no crece con el avance y no se mantiene un cursor abierto.
+    Con 'streaming=True' se ejecuta una sola consulta con cursor del lado del
+    servidor (yield_per): una única lectura consistente, pero la sesión no
+    debe confirmarse ni usarse para otras consultas mientras se recorre.
+
+    Cliente e ítems se cargan con selectinload (una consulta IN por lote): un
+    joinedload de los ítems multiplicaría las filas por la cantidad de ítems
+    y no es compatible con yield_per.
+    """
+    consulta = select(Pedido).options(
+        selectinload(Pedido.cliente),
+        selectinload(Pedido.items).joinedload(PedidoItem.menu),
+    )
+    if since is not None:
+        consulta = consulta.where(Pedido.fecha >= since)
+    if until is not None:
+        consulta = consulta.where(Pedido.fecha < until)
+    consulta = consulta.order_by(Pedido.fecha, Pedido.id)
+
+    if streaming:
+        yield from session.scalars(consulta.execution_options(yield_per=batch_size))
+        return
+
+    ultimo = None
+    while True:
+        lote = consulta
+        if ultimo is not None:
+            fecha, pedido_id = ultimo
+            lote = lote.where(or_(Pedido.fecha > fecha, and_(Pedido.fecha == fecha, Pedido.id > pedido_id)))
+        pedidos = session.scalars(lote.limit(batch_size)).all()
+        yield from pedidos
+        if len(pedidos) < batch_size:
+            return
+        ultimo = (pedidos[-1].fecha, pedidos[-1].id)
 
 def get_pedido_by_id(session: Session, pedido_id: int):
     """
@@ -42,7 +89,9 @@ def create_pedido(session: Session, cliente_id: int, items: list, estado: str =
             subtotal=item_subtotal # Add the subtotal here
         )
         session.add(pedido_item)
-    
+
+    # El resumen de ventas se actualiza en la misma transacción que el pedido
+    venta_diaria_crud.registrar_pedido(session, nuevo_pedido.fecha, cliente_id, items)
     session.commit()
     return nuevo_pedido
 
@@ -52,6 +101,8 @@ def delete_pedido(session: Session, pedido_id: int):
     """
     pedido = session.query(Pedido).filter(Pedido.id == pedido_id).first()
     if pedido:
+        items = session.query(PedidoItem).filter(PedidoItem.pedido_id == pedido_id).all()
+        venta_diaria_crud.descontar_pedido(session, pedido.fecha, pedido.cliente_id, items)
         # Eliminar manualmente los ítems primero debido a problemas de cascada en algunas bases de datos.
         session.query(PedidoItem).filter(PedidoItem.pedido_id == pedido_id).delete()
         session.delete(pedido)
@@ -0,0 +1,154 @@
+"""
+CRUD para la tabla de agregados ventas_diarias.
+
+Las funciones de escritura no confirman la transacción: se llaman desde
+create_pedido/delete_pedido dentro de la misma transacción que el pedido,
+para que el resumen nunca quede desfasado de los pedidos.
+"""
+
+import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Pedido, PedidoItem, VentaDiaria
+from periodos_sql import periodo_fecha
+
+# INSERT con soporte de ON CONFLICT ... DO UPDATE, por motor de base de datos
+_INSERTS_CON_UPSERT = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+# Filas insertadas por sentencia al recalcular
+_LOTE_RECALCULO = 5000
+
+_Clave = Tuple[datetime.date, int, int]
+
+
+def _agregar_items(fecha: datetime.datetime, cliente_id: int, items: Iterable) -> Dict[_Clave, List]:
+    """
+    Agrupa los items de un pedido por menú: (fecha, cliente, menú) -> [cantidad, total].
+    Acepta diccionarios con 'menu_id', 'cantidad' y 'precio_unitario' u objetos PedidoItem.
+    """
+    agregados: Dict[_Clave, List] = {}
+    for item in items:
+        if isinstance(item, dict):
+            menu_id, cantidad, precio = item['menu_id'], item['cantidad'], item['precio_unitario']
+        else:
+            menu_id, cantidad, precio = item.menu_id, item.cantidad, item.precio_unitario
+        clave = (fecha.date(), cliente_id, menu_id)
+        fila = agregados.setdefault(clave, [0, Decimal('0')])
+        fila[0] += int(cantidad)
+        fila[1] += Decimal(cantidad) * Decimal(precio)
+    return agregados
+
+
+def registrar_pedido(session: Session, fecha: datetime.datetime, cliente_id: int, items: Iterable) -> None:
+    """
+    Suma un pedido nuevo al resumen diario (INSERT ... ON CONFLICT DO UPDATE).
+    No hace commit.
+    """
+    agregados = _agregar_items(fecha, cliente_id, items)
+    if not agregados:
+        return
+    filas = [
+        {'fecha': clave[0], 'cliente_id': clave[1], 'menu_id': clave[2],
+         'pedidos': 1, 'cantidad': cantidad, 'total': total}
+        for clave, (cantidad, total) in agregados.items()
+    ]
+
+    insert = _INSERTS_CON_UPSERT.get(session.get_bind().dialect.name)
+    if insert is None:
+        # Motores sin upsert: leer y actualizar cada fila dentro de la transacción
+        for fila in filas:
+            venta = session.get(VentaDiaria, (fila['fecha'], fila['cliente_id'], fila['menu_id']))
+            if venta is None:
+                session.add(VentaDiaria(**fila))
+            else:
+                venta.pedidos += fila['pedidos']
+                venta.cantidad += fila['cantidad']
+                venta.total += fila['total']
+        session.flush()
+        return
+
+    tabla = VentaDiaria.__table__
+    stmt = insert(tabla).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.fecha, tabla.c.cliente_id, tabla.c.menu_id],
+        set_={
+            'pedidos': tabla.c.pedidos + stmt.excluded.pedidos,
+            'cantidad': tabla.c.cantidad + stmt.excluded.cantidad,
+            'total': tabla.c.total + stmt.excluded.total,
+        },
+    )
+    session.execute(stmt)
+
+
+def descontar_pedido(session: Session, fecha: datetime.datetime, cliente_id: int, items: Iterable) -> None:
+    """
+    Resta un pedido eliminado del resumen diario y borra las filas que
+    quedan sin pedidos. No hace commit.
+    """
+    tabla = VentaDiaria.__table__
+    for (dia, cliente, menu_id), (cantidad, total) in _agregar_items(fecha, cliente_id, items).items():
+        condicion = (tabla.c.fecha == dia) & (tabla.c.cliente_id == cliente) & (tabla.c.menu_id == menu_id)
+        session.execute(
+            update(tabla).where(condicion).values(
+                pedidos=tabla.c.pedidos - 1,
+                cantidad=tabla.c.cantidad - cantidad,
+                total=tabla.c.total - total,
+            )
+        )
+        session.execute(delete(tabla).where(condicion & (tabla.c.pedidos <= 0)))
+
+
+def recalcular_ventas_diarias(session: Session, desde: Optional[datetime.date] = None) -> int:
+    """
+    Reconstruye el resumen a partir de pedidos y pedido_items (backfill).
+
+    La agregación la hace la BD; solo viaja una fila por (día, cliente, menú).
+    Con ``desde`` se recalculan únicamente los días a partir de esa fecha.
+    Confirma la transacción.
+
+    Returns:
+        Número de filas del resumen escritas
+    """
+    dia = periodo_fecha(Pedido.fecha, 'dia')
+    consulta = (
+        session.query(
+            dia,
+            Pedido.cliente_id,
+            PedidoItem.menu_id,
+            func.count(func.distinct(Pedido.id)),
+            func.sum(PedidoItem.cantidad),
+            func.sum(PedidoItem.cantidad * PedidoItem.precio_unitario),
+        )
+        .join(PedidoItem, PedidoItem.pedido_id == Pedido.id)
+        .group_by(dia, Pedido.cliente_id, PedidoItem.menu_id)
+    )
+    borrar = delete(VentaDiaria)
+    if desde is not None:
+        consulta = consulta.filter(Pedido.fecha >= datetime.datetime.combine(desde, datetime.time.min))
+        borrar = borrar.where(VentaDiaria.fecha >= desde)
+
+    session.execute(borrar)
+    escritas = 0
+    lote = []
+    for fecha, cliente_id, menu_id, pedidos, cantidad, total in consulta.yield_per(_LOTE_RECALCULO):
+        lote.append({
+            'fecha': datetime.date.fromisoformat(fecha), 'cliente_id': cliente_id, 'menu_id': menu_id,
+            'pedidos': pedidos, 'cantidad': cantidad, 'total': total,
+        })
+        if len(lote) >= _LOTE_RECALCULO:
+            session.execute(VentaDiaria.__table__.insert(), lote)
+            escritas += len(lote)
+            lote = []
+    if lote:
+        session.execute(VentaDiaria.__table__.insert(), lote)
+        escritas += len(lote)
+    session.commit()
+    return escritas
@@ -1,21 +1,53 @@
 
-from typing import Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
 import customtkinter
 from customtkinter import CTk, CTkFrame
 from PIL import Image
 import fitz
-from threading import Thread
-import math
+import hashlib
 import io
+import math
 import os
+import queue
+import threading
+from cache_manager import cache_paginas_pdf
+
+# Pool compartido por todos los visores abiertos (boleta, carta, ...): los
+# hilos de rasterizado quedan acotados sin importar cuántos PDF se abran
+_render_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf-viewer")
+# Cada cuánto y cuántas páginas rasterizadas toma el hilo de Tk de la cola
+_DRAIN_INTERVAL_MS = 30
+_DRAIN_BATCH = 4
 
 class CTkPDFViewer(customtkinter.CTkScrollableFrame):
+    """
+    Visor de PDF con renderizado bajo demanda.
+
+    Al abrir el documento solo se crea un marcador del tamaño de cada página;
+    una página se rasteriza (directamente al tamaño de destino) cuando entra
+    en la zona visible, junto con sus vecinas inmediatas. Las últimas
+    ``max_cached_pages`` páginas rasterizadas se guardan en un LRU; las demás
+    vuelven a ser marcadores y se regeneran si se vuelven a mostrar.
+
+    El rasterizado ocurre en el pool compartido ``_render_pool``; los workers
+    nunca tocan Tk, solo dejan las imágenes en ``self._results``. El hilo de
+    Tk vacía esa cola con ``after()`` en lotes de a lo más ``_DRAIN_BATCH``.
+
+    Las páginas rasterizadas se guardan además en ``cache_paginas_pdf`` (en
+    disco) con clave hash del PDF + página + tamaño, así que reabrir la misma
+    boleta o carta las muestra sin volver a rasterizarlas.
+    """
+
     def __init__(self,
                  master: Union[CTk, CTkFrame],
-                 file: str,
+                 file: Optional[str] = None,
+                 stream: Optional[Union[bytes, bytearray, memoryview]] = None,
                  page_width: int = 600,
                  page_height: int = 700,
                  page_separation_height: int = 2,
+                 max_cached_pages: int = 8,
                  **kwargs):
         
         super().__init__(master, **kwargs)
@@ -23,101 +55,242 @@ class CTkPDFViewer(customtkinter.CTkScrollableFrame):
         self.page_width = page_width
         self.page_height = page_height
         self.separation = page_separation_height
-        self.pdf_images = []
+        self.max_cached_pages = max_cached_pages
+        # índice de página -> CTkImage, en orden de uso (LRU)
+        self.pdf_images = OrderedDict()
         self.labels = []
         self.file = file
+        # PDF ya cargado en memoria: se abre sin leer el archivo desde disco
+        self.stream = stream
+
+        self._document = None
+        self._document_hash = None
+        # PyMuPDF no admite accesos concurrentes al mismo documento
+        self._document_lock = threading.Lock()
+        self._placeholder = None
+        # Resultados de los workers: (generación, página, imagen, error)
+        self._results = queue.Queue()
+        # Se incrementa al cambiar de documento o de tamaño: descarta resultados viejos
+        self._generation = 0
+        self._wanted = set()
+        self._in_flight = set()
+        self._failed = set()
+        self._draining = False
 
-        self.percentage_view = 0
         self.percentage_load = customtkinter.StringVar()
         
         self.loading_message = customtkinter.CTkLabel(self, textvariable=self.percentage_load, justify="center")
         self.loading_message.pack(pady=10)
 
-        self.loading_bar = customtkinter.CTkProgressBar(self, width=100)
-        self.loading_bar.set(0)
-        self.loading_bar.pack(side="top", fill="x", padx=10)
+        # Re-evaluar las páginas visibles cada vez que el área visible cambia
+        self._parent_canvas.configure(yscrollcommand=self._on_yscroll)
 
         self.after(250, self.start_process)
 
+    def _on_yscroll(self, first, last):
+        self._scrollbar.set(first, last)
+        self.update_visible_pages()
+
     def start_process(self):
-        Thread(target=self.add_pages).start()
-        
-    def add_pages(self):
-        """add images and labels"""
+        """abre el documento y crea un marcador por página"""
+        if not self.winfo_exists():
+            return
+        self.percentage_load.set(f"Cargando {self._display_name()}...")
         try:
-            if not self.winfo_exists():
-                return
-            self.percentage_bar = 0
-            open_pdf = fitz.open(self.file)
-            
-            for page in open_pdf:
-                if not self.winfo_exists():
-                    return
-                # Convert PDF page to image using current PyMuPDF API
-                pix = page.get_displaylist().get_pixmap(alpha=False)
-                img = Image.open(io.BytesIO(pix.tobytes('ppm')))
-                label_img = customtkinter.CTkImage(img, size=(self.page_width, self.page_height))
-                self.pdf_images.append(label_img)
-                    
-                self.percentage_bar = self.percentage_bar + 1
-                percentage_view = (float(self.percentage_bar) / float(len(open_pdf)) * float(100))
-                
-                if not self.winfo_exists():
-                    return
-                self.loading_bar.set(percentage_view)
-                self.percentage_load.set(f"Cargando {os.path.basename(self.file)} \n{int(math.floor(percentage_view))}%")
-            
-            if not self.winfo_exists():
-                return
-            self.loading_bar.pack_forget()
-            self.loading_message.pack_forget()
-            open_pdf.close()
-            
-            for i in self.pdf_images:
-                if not self.winfo_exists():
-                    return
-                label = customtkinter.CTkLabel(self, image=i, text="")
+            self._close_document()
+            data = self._read_document()
+            document = fitz.open(stream=data, filetype="pdf")
+            with self._document_lock:
+                self._document = document
+                self._document_hash = hashlib.sha256(data).hexdigest()
+            self._placeholder = customtkinter.CTkImage(Image.new("RGB", (1, 1), "white"),
+                                                       size=(self.page_width, self.page_height))
+            for _ in range(self._document.page_count):
+                label = customtkinter.CTkLabel(self, image=self._placeholder, text="")
                 label.pack(pady=(0, self.separation))
                 self.labels.append(label)
+            self.loading_message.pack_forget()
+            self.after_idle(self.update_visible_pages)
         except Exception as e:
-            if not self.winfo_exists():
-                return
-            error_message = customtkinter.CTkLabel(
-                self, 
-                text=f"Error al cargar el PDF:\n{str(e)}\n\nPuede abrir el archivo en:\n{os.path.abspath(self.file)}",
-                justify="center",
-                wraplength=400
-            )
-            error_message.pack(pady=20)
-            
-            open_button = customtkinter.CTkButton(
-                self,
-                text="Abrir PDF externamente",
-                command=lambda: os.startfile(self.file)
-            )
-            open_button.pack(pady=10)
+            self._show_error(e)
+
+    def _visible_pages(self):
+        """Índices de las páginas que intersectan el área visible."""
+        total = len(self.labels)
+        if not total:
+            return range(0)
+        top, bottom = self._parent_canvas.yview()
+        first = min(total - 1, int(top * total))
+        last = min(total - 1, max(first, math.ceil(bottom * total) - 1))
+        return range(first, last + 1)
+
+    def update_visible_pages(self):
+        """Encola en el pool las páginas visibles y luego sus vecinas (prefetch) que aún no están rasterizadas."""
+        if self._document is None:
+            return
+        visible = self._visible_pages()
+        if not visible:
+            return
+        neighbours = [visible.start - 1, visible.stop]
+        wanted = [i for i in list(visible) + neighbours if 0 <= i < len(self.labels)]
+        self._wanted = set(wanted)
+        for index in wanted:
+            if index in self.pdf_images:
+                self.pdf_images.move_to_end(index)
+            elif index not in self._in_flight and index not in self._failed:
+                self._in_flight.add(index)
+                _render_pool.submit(self._render_job, self._generation, index, self.page_width, self.page_height)
+        if self._in_flight and not self._draining:
+            self._draining = True
+            self.after(_DRAIN_INTERVAL_MS, self._drain_results)
+
+    def _render_job(self, generation, index, width, height):
+        """Se ejecuta en un worker del pool: rasteriza y deja el resultado en la cola, sin tocar Tk."""
+        if generation != self._generation or index not in self._wanted:
+            # La página dejó de ser visible antes de llegar su turno
+            self._results.put((generation, index, None, None))
+            return
+        try:
+            with self._document_lock:
+                if self._document is None:
+                    self._results.put((generation, index, None, None))
+                    return
+                cache_key = f"{self._document_hash}:{index}:{width}x{height}"
+                cached = cache_paginas_pdf.get(cache_key)
+                if cached is not None:
+                    img = Image.open(io.BytesIO(cached))
+                    img.load()
+                else:
+                    img = self._rasterize(self._document, index, width, height)
+            if cached is None:
+                buffer = io.BytesIO()
+                img.save(buffer, format="PNG", compress_level=1)
+                cache_paginas_pdf.set(cache_key, buffer.getvalue())
+            self._results.put((generation, index, img, None))
+        except Exception as e:
+            self._results.put((generation, index, None, e))
+
+    def _drain_results(self):
+        """Muestra en el hilo de Tk a lo más _DRAIN_BATCH páginas ya rasterizadas."""
+        if not self.winfo_exists():
+            return
+        for _ in range(_DRAIN_BATCH):
+            try:
+                generation, index, img, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._generation:
+                continue
+            self._in_flight.discard(index)
+            if error is not None:
+                self._failed.add(index)
+                self._show_error(error)
+            elif img is not None:
+                self._show_page(index, img)
+        if self._in_flight or not self._results.empty():
+            self.after(_DRAIN_INTERVAL_MS, self._drain_results)
+        else:
+            self._draining = False
+            # Si se hizo scroll mientras tanto, puede faltar alguna página descartada
+            if any(i not in self.pdf_images and i not in self._failed for i in self._wanted):
+                self.update_visible_pages()
+
+    @staticmethod
+    def _rasterize(document, index, width, height):
+        """Rasteriza la página al tamaño de destino (sin renderizar a la resolución por defecto y escalar)."""
+        page = document[index]
+        matrix = fitz.Matrix(width / page.rect.width, height / page.rect.height)
+        pix = page.get_pixmap(matrix=matrix, alpha=False)
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    def _show_page(self, index, img):
+        label_img = customtkinter.CTkImage(img, size=(self.page_width, self.page_height))
+        self.pdf_images[index] = label_img
+        self.labels[index].configure(image=label_img)
+        while len(self.pdf_images) > self.max_cached_pages:
+            evicted, _ = self.pdf_images.popitem(last=False)
+            self.labels[evicted].configure(image=self._placeholder)
+
+    def _show_error(self, e):
+        if not self.winfo_exists():
+            return
+        self.loading_message.pack_forget()
+        if self.file is None:
+            # PDF en memoria: no hay archivo que ofrecer para abrir externamente
+            customtkinter.CTkLabel(self, text=f"Error al cargar el PDF:\n{str(e)}",
+                                   justify="center", wraplength=400).pack(pady=20)
+            return
+        error_message = customtkinter.CTkLabel(
+            self, 
+            text=f"Error al cargar el PDF:\n{str(e)}\n\nPuede abrir el archivo en:\n{os.path.abspath(self.file)}",
+            justify="center",
+            wraplength=400
+        )
+        error_message.pack(pady=20)
+        
+        open_button = customtkinter.CTkButton(
+            self,
+            text="Abrir PDF externamente",
+            command=lambda: os.startfile(self.file)
+        )
+        open_button.pack(pady=10)
         
+    def _read_document(self):
+        """Bytes del PDF: el stream en memoria si lo hay; si no, el contenido del archivo."""
+        if self.stream is not None:
+            return bytes(self.stream)
+        with open(self.file, "rb") as pdf_file:
+            return pdf_file.read()
+
+    def _close_document(self):
+        # Invalida los trabajos en curso antes de cerrar el documento que usan
+        self._generation += 1
+        self._in_flight.clear()
+        self._failed.clear()
+        with self._document_lock:
+            if self._document is not None:
+                self._document.close()
+                self._document = None
+
+    def _display_name(self):
+        return os.path.basename(self.file) if self.file else "PDF"
+
+    def _clear_pages(self):
+        self._generation += 1
+        self._wanted = set()
+        self._in_flight.clear()
+        self.pdf_images.clear()
+        for label in self.labels:
+            label.destroy()
+        self.labels = []
+
+    def destroy(self):
+        self._close_document()
+        super().destroy()
+
     def configure(self, **kwargs):
         """configurable options"""
-        if "file" in kwargs:
-            self.file = kwargs.pop("file")
+        if "file" in kwargs or "stream" in kwargs:
+            self.file = kwargs.pop("file", None)
+            self.stream = kwargs.pop("stream", None)
             # Limpiar visualizador actual
-            self.pdf_images = []
-            for label in self.labels:
-                label.destroy()
-            self.labels = []
+            self._clear_pages()
+            self.loading_message.pack(pady=10)
             # Reiniciar proceso de carga
             self.after(250, self.start_process)
-            
-        if "page_width" in kwargs:
-            self.page_width = kwargs.pop("page_width")
-            for img in self.pdf_images:
-                img.configure(size=(self.page_width, self.page_height))
-                
-        if "page_height" in kwargs:
-            self.page_height = kwargs.pop("page_height")
-            for img in self.pdf_images:
-                img.configure(size=(self.page_width, self.page_height))
+
+        if "page_width" in kwargs or "page_height" in kwargs:
+            self.page_width = kwargs.pop("page_width", self.page_width)
+            self.page_height = kwargs.pop("page_height", self.page_height)
+            # Las páginas se vuelven a rasterizar al nuevo tamaño cuando se muestren
+            if self._placeholder is not None:
+                self._placeholder.configure(size=(self.page_width, self.page_height))
+            for index in list(self.pdf_images):
+                self.labels[index].configure(image=self._placeholder)
+            self.pdf_images.clear()
+            self._generation += 1
+            self._in_flight.clear()
+            self.after_idle(self.update_visible_pages)
             
         if "page_separation_height" in kwargs:
             self.separation = kwargs.pop("page_separation_height")
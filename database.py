@@ -1,8 +1,19 @@
+import itertools
 import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from models import Base
+from invalidacion_db import registrar_eventos
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -14,21 +25,261 @@ DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_PORT = os.getenv('DB_PORT', '5432')
 DB_NAME = os.getenv('DB_NAME', 'restaurant_proyect')
 
-DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides the PostgreSQL settings above, e.g.
+#   sqlite:///restaurante.db   (file, WAL mode)
+#   sqlite://                  (in-memory; transactions are serialized)
+DATABASE_URL = os.getenv('DATABASE_URL') or f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# --- Connection pool settings (from environment variables) ---
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+# 0 disables the server-side statement timeout (PostgreSQL only)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+# How long SQLite waits on a locked database before failing
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+
+
+class MetricasPool:
+    """Contadores de uso del pool de conexiones (checkouts y tiempos de espera)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.espera_total = 0.0
+            self.espera_maxima = 0.0
+
+    def registrar(self, espera: float, timeout: bool = False) -> None:
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.espera_total += espera
+            self.espera_maxima = max(self.espera_maxima, espera)
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            esperas = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'espera_total_s': round(self.espera_total, 4),
+                'espera_promedio_ms': round(self.espera_total / esperas * 1000, 3) if esperas else 0.0,
+                'espera_maxima_ms': round(self.espera_maxima * 1000, 3),
+            }
+
+
+# Shared across pool instances: the engine recreates the pool after dispose()
+metricas_pool = MetricasPool()
+
+
+class PoolConMetricas(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            metricas_pool.registrar(time.perf_counter() - inicio, timeout=True)
+            raise
+        metricas_pool.registrar(time.perf_counter() - inicio)
+        return conexion
+
+
+def _es_sqlite_en_memoria(url) -> bool:
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+
+# Conexiones que mantienen vivas las bases SQLite en memoria: una base
+# shared-cache desaparece cuando se cierra su última conexión
+_bases_en_memoria: List[sqlite3.Connection] = []
+_numero_base_memoria = itertools.count(1)
+
+
+def _url_memoria_compartida(url):
+    """
+    Convierte ``sqlite://`` en una base en memoria con nombre y caché
+    compartida, que sobrevive aunque el pool recicle su conexión.
+    """
+    nombre = f"restaurante_memoria_{os.getpid()}_{next(_numero_base_memoria)}"
+    uri = f"file:{nombre}?mode=memory&cache=shared"
+    _bases_en_memoria.append(sqlite3.connect(uri, uri=True, check_same_thread=False))
+    return make_url(f"sqlite:///{uri}&uri=true")
+
 
-engine = create_engine(DATABASE_URL)
+def _configurar_sqlite(conexion_dbapi, en_memoria: bool) -> None:
+    """Pragmas aplicados a cada conexión SQLite nueva."""
+    cursor = conexion_dbapi.cursor()
+    try:
+        if not en_memoria:
+            # WAL: los lectores no bloquean al escritor ni viceversa
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Caché de páginas de 64 MB (valor negativo = KiB)
+        cursor.execute("PRAGMA cache_size=-65536")
+    finally:
+        cursor.close()
+
+
+def crear_motor(url: str = DATABASE_URL) -> Engine:
+    """
+    Crea el engine para la URL indicada con los ajustes de pool de .env.
+
+    PostgreSQL usa PoolConMetricas y, si se configuró, statement_timeout.
+    SQLite en archivo usa el mismo pool con WAL y pragmas de rendimiento.
+
+    SQLite en memoria (``sqlite://``) se abre como base con nombre y caché
+    compartida, con un pool de una sola conexión: cada sesión la toma en
+    exclusiva hasta confirmar o revertir, así que las transacciones de
+    distintos hilos se serializan en vez de mezclarse. (Con varias
+    conexiones shared-cache, SQLite rechaza de inmediato con "table is
+    locked" en vez de esperar.) Una sesión no debe abrir otra en el mismo
+    hilo mientras tiene la conexión: esperaría ``DB_POOL_TIMEOUT`` y fallaría.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        en_memoria = _es_sqlite_en_memoria(url)
+        opciones: Dict[str, Any] = dict(
+            poolclass=PoolConMetricas,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+        if en_memoria:
+            if url.database in (None, '', ':memory:'):
+                url = _url_memoria_compartida(url)
+            opciones.update(pool_size=1, max_overflow=0)
+        motor = create_engine(url, connect_args={'check_same_thread': False}, **opciones)
+        event.listen(motor, 'connect', lambda conexion, _registro: _configurar_sqlite(conexion, en_memoria))
+        return motor
+
+    connect_args: Dict[str, Any] = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0 and url.get_backend_name() == 'postgresql':
+        connect_args['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    return create_engine(
+        url,
+        poolclass=PoolConMetricas,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+engine = crear_motor(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Publish committed changes so subscribed caches can invalidate themselves
+registrar_eventos(SessionLocal)
+
+# Session of the unit of work currently open in each thread (see session_scope)
+_scope_actual = threading.local()
+
+def usar_motor(url: str) -> Engine:
+    """
+    Cambia la base de datos de toda la aplicación (por ejemplo, a una SQLite
+    temporal en benchmarks). Las sesiones creadas desde ahora usan el nuevo engine.
+    """
+    global engine
+    engine = crear_motor(url)
+    SessionLocal.configure(bind=engine)
+    return engine
 
 def get_db_session():
     """Provides a new database session."""
     return SessionLocal()
 
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Unidad de trabajo: una sesión y una transacción para toda una acción.
+
+    Confirma al salir sin errores, hace rollback si hay una excepción y
+    siempre cierra la sesión. Los ``session_scope()`` anidados en el mismo
+    hilo reutilizan la sesión del más externo, que es el único que confirma.
+
+    Ejemplo:
+        with session_scope() as session:
+            cliente = cliente_crud.get_cliente_by_id(session, cliente_id)
+            ...
+    """
+    actual = getattr(_scope_actual, 'session', None)
+    if actual is not None:
+        yield actual
+        return
+
+    session = SessionLocal()
+    _scope_actual.session = session
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        _scope_actual.session = None
+        session.close()
+
+def obtener_metricas_pool() -> Dict[str, Any]:
+    """Estado actual del pool de conexiones y métricas acumuladas de checkout."""
+    pool = SessionLocal.kw['bind'].pool
+    metricas = metricas_pool.resumen()
+    if isinstance(pool, QueuePool):
+        metricas.update({
+            'tamano': pool.size(),
+            'en_uso': pool.checkedout(),
+            'libres': pool.checkedin(),
+            'overflow': pool.overflow(),
+        })
+    return metricas
+
+def actualizar_indices(motor: Optional[Engine] = None) -> List[str]:
+    """
+    Crea los índices declarados en los modelos que falten en la BD.
+
+    create_all no agrega índices a tablas que ya existen; este paso sí, y es
+    idempotente (cada índice se crea con checkfirst), por lo que puede
+    ejecutarse en cada inicio.
+
+    Returns:
+        Nombres de los índices creados
+    """
+    motor = motor or engine
+    inspector = inspect(motor)
+    creados = []
+    for tabla in Base.metadata.sorted_tables:
+        existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        for indice in sorted(tabla.indexes, key=lambda indice: indice.name):
+            if indice.name not in existentes:
+                indice.create(bind=motor, checkfirst=True)
+                creados.append(indice.name)
+    return creados
+
 def initialize_database():
     """Initializes the database and creates tables."""
     try:
-        # The database itself should be created manually in PostgreSQL.
-        # This function will create the tables.
+        # A PostgreSQL database must be created manually; SQLite files are
+        # created on first connection. This function will create the tables.
         Base.metadata.create_all(bind=engine)
+        # Existing databases get the indexes added after their tables were created
+        creados = actualizar_indices()
+        if creados:
+            print(f"Índices creados: {', '.join(creados)}")
         print("Tablas de la base de datos aseguradas.")
     except Exception as e:
         print(f"Ocurrió un error durante la inicialización de la base de datos: {e}")
@@ -4,6 +4,7 @@ from decimal import Decimal
 from sqlalchemy.orm import Session
 from database import get_db_session, initialize_database
 from models import Cliente, Ingrediente, Menu, MenuIngrediente, Pedido, PedidoItem
+from crud.venta_diaria_crud import recalcular_ventas_diarias
 
 def generate_sample_data(db: Session, num_clients=10, num_menus=10, num_pedidos=100):
     # Clear existing data (optional, for fresh generation)
@@ -121,6 +122,10 @@ def generate_sample_data(db: Session, num_clients=10, num_menus=10, num_pedidos=
     db.commit()
     print(f"Generados {num_pedidos} pedidos con sus ítems.")
 
+    # Los pedidos se insertaron directamente: reconstruir el resumen de ventas
+    recalcular_ventas_diarias(db)
+    print("Resumen de ventas diarias recalculado.")
+
     print("Generación de datos completada.")
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from database import engine, Base, get_db_session
 from models import Ingrediente, Menu, MenuIngrediente, Cliente, Pedido, PedidoItem
+from crud.venta_diaria_crud import recalcular_ventas_diarias
 from datetime import datetime, timedelta
 from decimal import Decimal
 import os
@@ -167,6 +168,10 @@ def populate_database():
 
         session.commit()
         print(f"{num_pedidos} pedidos y sus items agregados.")
+
+        # Los pedidos se insertaron directamente: reconstruir el resumen de ventas
+        recalcular_ventas_diarias(session)
+        print("Resumen de ventas diarias calculado.")
         print("La base de datos ha sido poblada exitosamente.")
 
     except Exception as e:
@@ -0,0 +1,88 @@
+"""
+Publica en el bus de invalidación los cambios confirmados en la base de datos.
+
+Durante una transacción se acumulan las tablas modificadas (y, cuando se
+conocen, las claves primarias de las filas) en ``session.info``. Solo al
+confirmar (``after_commit``) se publican en ``cache_manager.bus_invalidacion``;
+si la transacción se revierte, los cambios se descartan. Así los cachés
+suscritos nunca se invalidan por escrituras que no llegaron a la BD.
+
+Se capturan:
+- Objetos ORM agregados, modificados o eliminados (``after_flush``), con sus
+  claves primarias.
+- Sentencias INSERT/UPDATE/DELETE ejecutadas con ``session.execute`` o
+  ``query.update``/``query.delete`` (``do_orm_execute``); como no se sabe qué
+  filas tocaron, se marca la tabla completa.
+
+No se capturan ``bulk_insert_mappings``/``bulk_update_mappings`` (no emiten
+eventos de sesión); quien los use debe publicar los cambios a mano.
+
+El bus es local al proceso: los commits de otras terminales (u otros
+procesos) no llegan. Los cachés que deben reflejarlos usan además un TTL
+corto (ver ``statistics_tab``).
+"""
+
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, inspect
+
+from cache_manager import BusInvalidacion, bus_invalidacion
+
+_CLAVE_INFO = 'cambios_invalidacion'
+
+
+def _cambios(session) -> Dict[str, Optional[Set]]:
+    return session.info.setdefault(_CLAVE_INFO, {})
+
+
+def _marcar(cambios: Dict[str, Optional[Set]], tabla: str, clave=None) -> None:
+    """Agrega una clave modificada a la tabla; clave None marca la tabla completa."""
+    if clave is None:
+        cambios[tabla] = None
+    elif tabla not in cambios:
+        cambios[tabla] = {clave}
+    elif cambios[tabla] is not None:
+        cambios[tabla].add(clave)
+
+
+def _clave_primaria(obj):
+    estado = inspect(obj)
+    clave = estado.mapper.primary_key_from_instance(obj)
+    return clave[0] if len(clave) == 1 else tuple(clave)
+
+
+def registrar_eventos(session_factory, bus: Optional[BusInvalidacion] = None) -> None:
+    """
+    Registra los listeners de invalidación en una sessionmaker (o clase Session).
+
+    Args:
+        session_factory: sessionmaker cuyas sesiones publicarán sus cambios
+        bus: Bus donde publicar (por defecto, bus_invalidacion)
+    """
+    bus = bus or bus_invalidacion
+
+    @event.listens_for(session_factory, 'after_flush')
+    def _acumular_flush(session, contexto_flush):
+        cambios = _cambios(session)
+        for obj in session.new | session.deleted:
+            _marcar(cambios, inspect(obj).mapper.local_table.name, _clave_primaria(obj))
+        for obj in session.dirty:
+            if session.is_modified(obj, include_collections=False):
+                _marcar(cambios, inspect(obj).mapper.local_table.name, _clave_primaria(obj))
+
+    @event.listens_for(session_factory, 'do_orm_execute')
+    def _acumular_sentencia(estado):
+        if estado.is_insert or estado.is_update or estado.is_delete:
+            tabla = getattr(estado.statement, 'table', None)
+            if tabla is not None:
+                _marcar(_cambios(estado.session), tabla.name)
+
+    @event.listens_for(session_factory, 'after_commit')
+    def _publicar(session):
+        cambios = session.info.pop(_CLAVE_INFO, None)
+        if cambios:
+            bus.publicar(cambios)
+
+    @event.listens_for(session_factory, 'after_rollback')
+    def _descartar(session):
+        session.info.pop(_CLAVE_INFO, None)
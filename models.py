@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import String, DECIMAL, ForeignKey, DateTime
+from sqlalchemy import String, DECIMAL, ForeignKey, Date, DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship, declarative_base
 from decimal import Decimal
 import datetime
@@ -35,6 +35,11 @@ class Menu(Base):
 
 class MenuIngrediente(Base):
     __tablename__ = 'menu_ingredientes'
+    # La PK (menu_id, ingrediente_id) ya cubre las búsquedas por menú; este
+    # índice cubre las recetas que usan un ingrediente y el ON DELETE CASCADE
+    __table_args__ = (
+        Index('ix_menu_ingredientes_ingrediente_id', 'ingrediente_id'),
+    )
     menu_id: Mapped[int] = mapped_column(ForeignKey('menus.id'), primary_key=True)
     ingrediente_id: Mapped[int] = mapped_column(ForeignKey('ingredientes.id', ondelete="CASCADE"), primary_key=True)
     cantidad_necesaria: Mapped[Decimal] = mapped_column(DECIMAL(10, 2))
@@ -43,6 +48,12 @@ class MenuIngrediente(Base):
 
 class Pedido(Base):
     __tablename__ = 'pedidos'
+    __table_args__ = (
+        # Gráficos de ventas: agrupan por fecha y suman total sin leer la tabla
+        Index('ix_pedidos_fecha_total', 'fecha', 'total'),
+        # Pedidos y ventas de un cliente por fecha (también cubre la FK cliente_id)
+        Index('ix_pedidos_cliente_id_fecha', 'cliente_id', 'fecha', postgresql_include=['total']),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     cliente_id: Mapped[int] = mapped_column(ForeignKey('clientes.id'))
     fecha: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
@@ -54,6 +65,12 @@ class Pedido(Base):
 
 class PedidoItem(Base):
     __tablename__ = 'pedido_items'
+    __table_args__ = (
+        # Carga de los items de un pedido y borrado de pedidos
+        Index('ix_pedido_items_pedido_id', 'pedido_id'),
+        # Menús más vendidos: join por menú sumando cantidades
+        Index('ix_pedido_items_menu_id', 'menu_id', postgresql_include=['pedido_id', 'cantidad']),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     pedido_id: Mapped[int] = mapped_column(ForeignKey('pedidos.id'))
     menu_id: Mapped[int] = mapped_column(ForeignKey('menus.id'))
@@ -72,6 +89,12 @@ class Boleta(Base):
     para referencia y auditoría.
     """
     __tablename__ = 'boletas'
+    __table_args__ = (
+        # Última boleta y listado ordenado por fecha
+        Index('ix_boletas_fecha_generacion', 'fecha_generacion'),
+        # Listado y conteo por estado
+        Index('ix_boletas_estado_fecha_generacion', 'estado', 'fecha_generacion'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     pedido_id: Mapped[int] = mapped_column(ForeignKey('pedidos.id'), unique=True)
     fecha_generacion: Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.utcnow)
@@ -80,4 +103,26 @@ class Boleta(Base):
     total: Mapped[Decimal] = mapped_column(DECIMAL(10, 2))
     pdf_path: Mapped[str] = mapped_column(String(255))
     estado: Mapped[str] = mapped_column(String(50), default='generada')  # generada, anulada, etc.
-    pedido: Mapped[Pedido] = relationship()
\ No newline at end of file
+    pedido: Mapped[Pedido] = relationship()
+
+class VentaDiaria(Base):
+    """
+    Resumen de ventas por día, cliente y menú (tabla de agregados).
+
+    Se mantiene en la misma transacción que crea o elimina cada pedido
+    (ver crud/venta_diaria_crud.py), de modo que los gráficos de ventas
+    agregan unos cientos de filas en vez de recorrer todos los pedidos.
+    ``pedidos`` cuenta los pedidos que incluyeron el menú ese día, y
+    ``total`` suma cantidad * precio unitario de sus items.
+    """
+    __tablename__ = 'ventas_diarias'
+    __table_args__ = (
+        # Gráficos de ventas filtrados por cliente
+        Index('ix_ventas_diarias_cliente_id_fecha', 'cliente_id', 'fecha'),
+    )
+    fecha: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    cliente_id: Mapped[int] = mapped_column(ForeignKey('clientes.id'), primary_key=True)
+    menu_id: Mapped[int] = mapped_column(ForeignKey('menus.id'), primary_key=True)
+    pedidos: Mapped[int] = mapped_column(default=0)
+    cantidad: Mapped[int] = mapped_column(default=0)
+    total: Mapped[Decimal] = mapped_column(DECIMAL(14, 2), default=Decimal('0'))
@@ -0,0 +1,80 @@
+"""
+Agrupación de fechas por periodo, portable entre motores de base de datos.
+
+``periodo_fecha(columna, 'mes')`` es una expresión SQL que convierte una
+fecha/hora en la etiqueta de su periodo (texto), y se compila a la función
+nativa de cada motor: ``to_char`` en PostgreSQL y ``strftime`` en SQLite.
+Ambos motores producen exactamente las mismas etiquetas:
+
+- ``dia``:    2025-01-31
+- ``semana``: 2025-05  (semana del año; la semana 1 empieza el 1 de enero)
+- ``mes``:    2025-01
+- ``anio``:   2025
+
+Ejemplo:
+    >>> periodo = periodo_fecha(Pedido.fecha, 'mes')
+    >>> session.query(periodo, func.sum(Pedido.total)).group_by(periodo).order_by(periodo)
+"""
+
+from sqlalchemy import String
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+PERIODOS = ('dia', 'semana', 'mes', 'anio')
+
+_FORMATOS_POSTGRESQL = {
+    'dia': 'YYYY-MM-DD',
+    'semana': 'YYYY-WW',
+    'mes': 'YYYY-MM',
+    'anio': 'YYYY',
+}
+
+_FORMATOS_SQLITE = {
+    'dia': '%Y-%m-%d',
+    'mes': '%Y-%m',
+    'anio': '%Y',
+}
+
+
+class periodo_fecha(FunctionElement):
+    """Etiqueta de texto del periodo (dia, semana, mes o anio) de una fecha."""
+
+    type = String()
+    inherit_cache = True
+    name = 'periodo_fecha'
+
+    def __init__(self, columna, periodo: str):
+        if periodo not in PERIODOS:
+            raise ValueError(f"Periodo no soportado: '{periodo}'. Use uno de {PERIODOS}")
+        self.periodo = periodo
+        super().__init__(columna)
+
+    # El periodo forma parte de la clave de caché de la sentencia compilada
+    _traverse_internals = FunctionElement._traverse_internals + [('periodo', InternalTraversal.dp_string)]
+
+
+@compiles(periodo_fecha)
+def _compilar_generico(elemento, compilador, **kw):
+    raise CompileError(
+        f"periodo_fecha no está soportado para el motor '{compilador.dialect.name}'"
+    )
+
+
+@compiles(periodo_fecha, 'postgresql')
+def _compilar_postgresql(elemento, compilador, **kw):
+    columna = compilador.process(list(elemento.clauses)[0], **kw)
+    return f"to_char({columna}, '{_FORMATOS_POSTGRESQL[elemento.periodo]}')"
+
+
+@compiles(periodo_fecha, 'sqlite')
+def _compilar_sqlite(elemento, compilador, **kw):
+    columna = compilador.process(list(elemento.clauses)[0], **kw)
+    if elemento.periodo == 'semana':
+        # Mismo cálculo que 'WW' de PostgreSQL: (día del año - 1) / 7 + 1
+        return (
+            f"strftime('%Y', {columna}) || '-' || "
+            f"printf('%02d', (CAST(strftime('%j', {columna}) AS INTEGER) - 1) / 7 + 1)"
+        )
+    return f"strftime('{_FORMATOS_SQLITE[elemento.periodo]}', {columna})"
@@ -0,0 +1,155 @@
+"""
+Plantilla compilada de boletas.
+
+Las partes fijas de la boleta (datos del negocio, título del bloque de
+cliente y encabezado de la tabla) se dibujan una sola vez por proceso en un
+documento prototipo. Cada boleta parte de una copia de ese prototipo y solo
+dibuja lo que cambia: datos del cliente, filas de items, totales y pie.
+
+El diseño de la boleta vive en las funciones ``_dibujar_*``; tanto la
+plantilla como ``renderizar_sin_plantilla`` (la forma anterior, celda por
+celda desde cero) las usan, por lo que ambas producen la misma boleta.
+"""
+
+import copy
+import threading
+from fpdf import FPDF
+
+# Alto del bloque de datos del cliente (3 líneas de 8 mm)
+_ALTO_BLOQUE_CLIENTE = 3 * 8
+
+
+def _dibujar_encabezado(pdf: FPDF):
+    pdf.set_font("Arial", size=12)
+
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "Boleta Restaurante", ln=True, align='L')
+    pdf.set_font("Arial", size=12)
+    pdf.cell(0, 10, "Razón Social del Negocio", ln=True, align='L')
+    pdf.cell(0, 10, "RUT: 12345678-9", ln=True, align='L')
+    pdf.cell(0, 10, "Dirección: Calle Falsa 123", ln=True, align='L')
+    pdf.cell(0, 10, "Teléfono: +56 9 1234 5678", ln=True, align='L')
+    pdf.ln(5)
+
+    # Información del cliente
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, "Datos del Cliente", ln=True, align='L')
+
+
+def _dibujar_cliente(pdf: FPDF, datos: dict):
+    pdf.set_font("Arial", size=11)
+    pdf.cell(0, 8, f"Cliente: {datos['cliente_nombre']}", ln=True, align='L')
+    pdf.cell(0, 8, f"Email: {datos['cliente_email']}", ln=True, align='L')
+    pdf.cell(0, 8, f"Fecha: {datos['fecha_pedido'].strftime('%d/%m/%Y %H:%M:%S')}", ln=True, align='L')
+
+
+def _dibujar_encabezado_tabla(pdf: FPDF):
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(70, 10, "Nombre", border=1)
+    pdf.cell(20, 10, "Cantidad", border=1)
+    pdf.cell(35, 10, "Precio Unitario", border=1)
+    pdf.cell(30, 10, "Subtotal", border=1)
+    pdf.ln()
+
+
+def _dibujar_detalle(pdf: FPDF, datos: dict):
+    """Filas de items, totales y pie: todo lo que viene después del encabezado de la tabla."""
+    pdf.set_font("Arial", size=12)
+    for item in datos['detalle_items']:
+        nombre = item['nombre']
+        cantidad = item['cantidad']
+        precio_unitario = item['precio_unitario']
+        subtotal_item = precio_unitario * cantidad
+        pdf.cell(70, 10, nombre, border=1)
+        pdf.cell(20, 10, str(cantidad), border=1)
+        pdf.cell(35, 10, f"${precio_unitario:.2f}", border=1)
+        pdf.cell(30, 10, f"${subtotal_item:.2f}", border=1)
+        pdf.ln()
+
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(120, 10, "Subtotal:", 0, 0, 'R')
+    pdf.cell(30, 10, f"${datos['subtotal']:.2f}", ln=True, align='R')
+
+    pdf.cell(120, 10, "IVA (19%):", 0, 0, 'R')
+    pdf.cell(30, 10, f"${datos['iva']:.2f}", ln=True, align='R')
+
+    pdf.cell(120, 10, "Total:", 0, 0, 'R')
+    pdf.cell(30, 10, f"${datos['total']:.2f}", ln=True, align='R')
+
+    pdf.set_font("Arial", 'I', 10)
+    pdf.cell(0, 10, "Gracias por su compra. Para cualquier consulta, llámenos al +56 9 777 5678.", 0, 1, 'C')
+    pdf.cell(0, 10, "Los productos adquiridos no tienen garantía.", 0, 1, 'C')
+
+
+def _a_bytes(pdf: FPDF) -> bytes:
+    contenido = pdf.output(dest='S')
+    # fpdf 1.7 retorna str en latin-1; fpdf2, bytearray
+    return contenido.encode('latin-1') if isinstance(contenido, str) else bytes(contenido)
+
+
+def renderizar_sin_plantilla(datos: dict) -> bytes:
+    """Dibuja la boleta completa desde cero, celda por celda (sin plantilla)."""
+    pdf = FPDF()
+    pdf.add_page()
+    _dibujar_encabezado(pdf)
+    _dibujar_cliente(pdf, datos)
+    pdf.ln(10)
+    _dibujar_encabezado_tabla(pdf)
+    _dibujar_detalle(pdf, datos)
+    return _a_bytes(pdf)
+
+
+class PlantillaBoleta:
+    """
+    Documento prototipo con las regiones fijas de la boleta ya dibujadas.
+
+    ``renderizar`` copia el prototipo y dibuja encima solo los datos del
+    pedido. Con fpdf 1.7 el contenido de cada página es un str inmutable, así
+    que basta copiar los contenedores de primer nivel del documento; con
+    otras versiones de fpdf se usa una copia profunda.
+    """
+
+    def __init__(self):
+        pdf = FPDF()
+        pdf.add_page()
+        _dibujar_encabezado(pdf)
+        # Se reserva el bloque del cliente para dibujarlo en cada boleta
+        self._x_cliente = pdf.get_x()
+        self._y_cliente = pdf.get_y()
+        pdf.set_y(self._y_cliente + _ALTO_BLOQUE_CLIENTE)
+        pdf.ln(10)
+        _dibujar_encabezado_tabla(pdf)
+        self._y_detalle = pdf.get_y()
+        self._prototipo = pdf
+        self._copia_superficial = all(isinstance(contenido, str) for contenido in pdf.pages.values())
+
+    def _clonar(self) -> FPDF:
+        if not self._copia_superficial:
+            return copy.deepcopy(self._prototipo)
+        clon = copy.copy(self._prototipo)
+        for nombre, valor in vars(self._prototipo).items():
+            if isinstance(valor, (dict, list)):
+                setattr(clon, nombre, copy.copy(valor))
+        return clon
+
+    def renderizar(self, datos: dict) -> bytes:
+        """Dibuja la boleta descrita por ``datos`` (ver BoletaFacade._datos_pdf) y retorna el PDF."""
+        pdf = self._clonar()
+        pdf.set_xy(self._x_cliente, self._y_cliente)
+        _dibujar_cliente(pdf, datos)
+        pdf.set_y(self._y_detalle)
+        _dibujar_detalle(pdf, datos)
+        return _a_bytes(pdf)
+
+
+# Una plantilla por hilo: el prototipo es un FPDF mutable y no se comparte
+# entre hilos (en un ProcessPoolExecutor cada proceso tiene además la suya)
+_plantillas = threading.local()
+
+
+def obtener_plantilla() -> PlantillaBoleta:
+    """Plantilla del hilo actual; se compila en su primer uso en ese hilo."""
+    plantilla = getattr(_plantillas, 'plantilla', None)
+    if plantilla is None:
+        plantilla = _plantillas.plantilla = PlantillaBoleta()
+    return plantilla
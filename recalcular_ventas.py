@@ -0,0 +1,37 @@
+"""
+Reconstruye la tabla de resumen ventas_diarias a partir de los pedidos.
+
+Necesario una vez en bases de datos existentes (creadas antes del resumen)
+o tras cargar pedidos sin pasar por pedido_crud.create_pedido.
+
+Uso:
+    python recalcular_ventas.py                 # todo el historial
+    python recalcular_ventas.py --desde 2025-01-01
+"""
+
+import argparse
+import datetime
+import time
+
+from database import get_db_session, initialize_database
+from crud.venta_diaria_crud import recalcular_ventas_diarias
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula el resumen de ventas diarias")
+    parser.add_argument("--desde", type=datetime.date.fromisoformat, default=None,
+                        help="Recalcular solo desde esta fecha (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    # Asegura que la tabla ventas_diarias exista
+    initialize_database()
+    session = get_db_session()
+    try:
+        inicio = time.perf_counter()
+        filas = recalcular_ventas_diarias(session, desde=args.desde)
+        print(f"Resumen de ventas recalculado: {filas} filas en {time.perf_counter() - inicio:.1f}s")
+    except Exception as e:
+        session.rollback()
+        print(f"Error al recalcular el resumen de ventas: {e}")
+        raise
+    finally:
+        session.close()
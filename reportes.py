@@ -14,15 +14,16 @@ Uso:
     archivo = reporte_json.generar("pedidos")
 """
 
+import itertools
 import json
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, Optional
 from datetime import datetime
 from pathlib import Path
 
 from error_handler import logger, RestauranteException
 from database import get_db_session
-from models import Pedido
+from crud import pedido_crud
 from sqlalchemy.orm import Session
 
 
@@ -30,6 +31,9 @@ from sqlalchemy.orm import Session
 REPORTES_DIR = Path("reportes")
 REPORTES_DIR.mkdir(exist_ok=True)
 
+# Marca en la plantilla HTML donde se escriben las filas
+_MARCA_FILAS = '<!-- filas -->'
+
 
 class GeneradorReporteTemplate(ABC):
     """
@@ -42,6 +46,10 @@ class GeneradorReporteTemplate(ABC):
     3. Formatear estructura del reporte
     4. Guardar archivo
     5. Retornar ruta del archivo
+
+    Los pasos se encadenan como iteradores: los registros se leen de la BD
+    por lotes, se formatean y se escriben al archivo a medida que llegan,
+    sin tener todo el reporte en memoria.
     """
     
     def generar(self, tipo_reporte: str, db: Optional[Session] = None) -> str:
@@ -52,19 +60,16 @@ class GeneradorReporteTemplate(ABC):
         try:
             logger.info(f"Iniciando generacion de reporte: {tipo_reporte}")
             
-            # PASO 1: Obtener datos
+            # PASO 1: Obtener datos (iterador; la consulta corre al escribir)
             datos = self._obtener_datos(tipo_reporte, db)
-            logger.debug(f"Datos obtenidos: {len(datos)} registros")
             
             # PASO 2: Procesar datos
             datos_procesados = self._procesar_datos(datos)
-            logger.debug("Datos procesados correctamente")
             
-            # PASO 3: Formatear reporte
+            # PASO 3: Formatear reporte (fragmentos de texto)
             contenido_formateado = self._formatear_contenido(datos_procesados)
-            logger.debug("Contenido formateado")
             
-            # PASO 4: Guardar archivo
+            # PASO 4: Guardar archivo, consumiendo los fragmentos
             archivo_path = self._guardar_archivo(contenido_formateado, tipo_reporte)
             logger.info(f"Reporte guardado en: {archivo_path}")
             
@@ -75,80 +80,95 @@ class GeneradorReporteTemplate(ABC):
             raise RestauranteException(f"Error al generar reporte: {str(e)}")
     
     @abstractmethod
-    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> List[Dict]:
+    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> Iterable[Dict]:
         """Paso 1: Obtener datos de BD - implementar en subclases"""
         pass
     
-    def _procesar_datos(self, datos: List[Dict]) -> List[Dict]:
+    def _procesar_datos(self, datos: Iterable[Dict]) -> Iterable[Dict]:
         """Paso 2: Procesar datos - puede ser override"""
         return datos
     
     @abstractmethod
-    def _formatear_contenido(self, datos: List[Dict]) -> str:
-        """Paso 3: Formatear contenido - implementar en subclases"""
+    def _formatear_contenido(self, datos: Iterable[Dict]) -> Iterator[str]:
+        """Paso 3: Formatear contenido en fragmentos - implementar en subclases"""
         pass
     
     @abstractmethod
-    def _guardar_archivo(self, contenido: str, tipo_reporte: str) -> str:
+    def _guardar_archivo(self, contenido: Iterable[str], tipo_reporte: str) -> str:
         """Paso 4: Guardar archivo - implementar en subclases"""
         pass
     
-    def _obtener_datos_pedidos(self, db: Optional[Session]) -> List[Dict]:
-        """Obtiene todos los pedidos de la BD"""
-        if db is None:
+    def _obtener_datos_pedidos(self, db: Optional[Session]) -> Iterator[Dict]:
+        """Recorre todos los pedidos de la BD; la sesión propia se cierra al terminar"""
+        sesion_propia = db is None
+        if sesion_propia:
             db = get_db_session()
         
-        pedidos = db.query(Pedido).all()
-        datos = []
-        
-        for pedido in pedidos:
-            datos.append({
-                'id': pedido.id,
-                'cliente_id': pedido.cliente_id,
-                'cliente_nombre': pedido.cliente.nombre if pedido.cliente else 'N/A',
-                'fecha': pedido.fecha.isoformat() if pedido.fecha else '',
-                'total': float(pedido.total) if pedido.total else 0,
-                'estado': pedido.estado,
-                'cantidad_items': len(pedido.items)
-            })
-        
-        return datos
+        try:
+            # Lotes por clave (fecha, id) con cliente e ítems precargados: sin
+            # una consulta extra por pedido ni todos los pedidos en memoria a la vez
+            for pedido in pedido_crud.iter_pedidos(db, batch_size=1000):
+                yield {
+                    'id': pedido.id,
+                    'cliente_id': pedido.cliente_id,
+                    'cliente_nombre': pedido.cliente.nombre if pedido.cliente else 'N/A',
+                    'fecha': pedido.fecha.isoformat() if pedido.fecha else '',
+                    'total': float(pedido.total) if pedido.total else 0,
+                    'estado': pedido.estado,
+                    'cantidad_items': len(pedido.items)
+                }
+        finally:
+            if sesion_propia:
+                db.close()
 
 
 class ReporteJSON(GeneradorReporteTemplate):
     """Generador de reportes en formato JSON"""
     
-    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> List[Dict]:
+    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> Iterator[Dict]:
         """Obtiene datos según tipo de reporte"""
         if tipo_reporte == "pedidos":
             return self._obtener_datos_pedidos(db)
         else:
             raise RestauranteException(f"Tipo de reporte no soportado: {tipo_reporte}")
     
-    def _formatear_contenido(self, datos: List[Dict]) -> str:
-        """Formatea datos como JSON"""
-        reporte = {
-            'tipo': 'Reporte JSON',
-            'fecha_generacion': datetime.now().isoformat(),
-            'cantidad_registros': len(datos),
-            'datos': datos,
-            'resumen': {
-                'total_pedidos': len(datos),
-                'monto_total': sum(d['total'] for d in datos),
-                'promedio': sum(d['total'] for d in datos) / len(datos) if datos else 0
-            }
-        }
+    def _formatear_contenido(self, datos: Iterable[Dict]) -> Iterator[str]:
+        """
+        Formatea datos como JSON. La cantidad y el resumen se acumulan
+        mientras se escriben los registros, por eso van después de 'datos'.
+        """
+        def _json(valor) -> str:
+            return json.dumps(valor, indent=2, ensure_ascii=False, default=str)
         
-        return json.dumps(reporte, indent=2, ensure_ascii=False, default=str)
+        yield '{\n'
+        yield f'  "tipo": {_json("Reporte JSON")},\n'
+        yield f'  "fecha_generacion": {_json(datetime.now().isoformat())},\n'
+        yield '  "datos": ['
+        cantidad = 0
+        monto_total = 0
+        for dato in datos:
+            separador = ',' if cantidad else ''
+            yield separador + '\n    ' + _json(dato).replace('\n', '\n    ')
+            cantidad += 1
+            monto_total += dato['total']
+        yield '\n  ],\n' if cantidad else '],\n'
+        resumen = {
+            'total_pedidos': cantidad,
+            'monto_total': monto_total,
+            'promedio': monto_total / cantidad if cantidad else 0
+        }
+        yield f'  "cantidad_registros": {cantidad},\n'
+        yield '  "resumen": ' + _json(resumen).replace('\n', '\n  ') + '\n'
+        yield '}'
     
-    def _guardar_archivo(self, contenido: str, tipo_reporte: str) -> str:
+    def _guardar_archivo(self, contenido: Iterable[str], tipo_reporte: str) -> str:
         """Guarda contenido en archivo JSON"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         archivo_name = f"{tipo_reporte}_{timestamp}.json"
         archivo_path = REPORTES_DIR / archivo_name
         
         with open(archivo_path, 'w', encoding='utf-8') as f:
-            f.write(contenido)
+            f.writelines(contenido)
         
         return str(archivo_path)
 
@@ -156,41 +176,35 @@ class ReporteJSON(GeneradorReporteTemplate):
 class ReporteCSV(GeneradorReporteTemplate):
     """Generador de reportes en formato CSV"""
     
-    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> List[Dict]:
+    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> Iterator[Dict]:
         """Obtiene datos según tipo de reporte"""
         if tipo_reporte == "pedidos":
             return self._obtener_datos_pedidos(db)
         else:
             raise RestauranteException(f"Tipo de reporte no soportado: {tipo_reporte}")
     
-    def _formatear_contenido(self, datos: List[Dict]) -> str:
-        """Formatea datos como CSV"""
-        if not datos:
-            return ""
-        
-        # Obtener headers del primer registro
-        headers = list(datos[0].keys())
-        
-        # Crear contenido CSV
-        lineas = [','.join(headers)]
-        
+    def _formatear_contenido(self, datos: Iterable[Dict]) -> Iterator[str]:
+        """Formatea datos como CSV, una línea por registro"""
+        headers = None
         for fila in datos:
+            if headers is None:
+                # Obtener headers del primer registro
+                headers = list(fila.keys())
+                yield ','.join(headers)
             valores = [
                 str(fila.get(header, '')).replace(',', ';')
                 for header in headers
             ]
-            lineas.append(','.join(valores))
-        
-        return '\n'.join(lineas)
+            yield '\n' + ','.join(valores)
     
-    def _guardar_archivo(self, contenido: str, tipo_reporte: str) -> str:
+    def _guardar_archivo(self, contenido: Iterable[str], tipo_reporte: str) -> str:
         """Guarda contenido en archivo CSV"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         archivo_name = f"{tipo_reporte}_{timestamp}.csv"
         archivo_path = REPORTES_DIR / archivo_name
         
         with open(archivo_path, 'w', encoding='utf-8', newline='') as f:
-            f.write(contenido)
+            f.writelines(contenido)
         
         return str(archivo_path)
 
@@ -198,29 +212,24 @@ class ReporteCSV(GeneradorReporteTemplate):
 class ReporteHTML(GeneradorReporteTemplate):
     """Generador de reportes en formato HTML"""
     
-    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> List[Dict]:
+    def _obtener_datos(self, tipo_reporte: str, db: Optional[Session]) -> Iterator[Dict]:
         """Obtiene datos según tipo de reporte"""
         if tipo_reporte == "pedidos":
             return self._obtener_datos_pedidos(db)
         else:
             raise RestauranteException(f"Tipo de reporte no soportado: {tipo_reporte}")
     
-    def _formatear_contenido(self, datos: List[Dict]) -> str:
-        """Formatea datos como HTML"""
-        if not datos:
+    def _formatear_contenido(self, datos: Iterable[Dict]) -> Iterator[str]:
+        """Formatea datos como HTML; las filas se escriben a medida que llegan"""
+        datos = iter(datos)
+        primero = next(datos, None)
+        if primero is None:
+            headers_list = []
             headers = ""
-            filas = ""
         else:
-            # Headers
-            headers_list = list(datos[0].keys())
+            # Headers del primer registro
+            headers_list = list(primero.keys())
             headers = '\n'.join([f"<th>{h}</th>" for h in headers_list])
-            
-            # Filas
-            filas_list = []
-            for dato in datos:
-                fila = '\n'.join([f"<td>{dato.get(h, '')}</td>" for h in headers_list])
-                filas_list.append(f"<tr>\n{fila}\n</tr>")
-            filas = '\n'.join(filas_list)
         
         # Usar f-string para evitar conflictos con llaves del CSS
         fecha = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -252,22 +261,30 @@ class ReporteHTML(GeneradorReporteTemplate):
                     </tr>
                 </thead>
                 <tbody>
-                    {filas}
+                    {_MARCA_FILAS}
                 </tbody>
             </table>
         </body>
         </html>
         """
-        return html
+        # Las filas se escriben entre las dos mitades de la página
+        inicio, fin = html.split(_MARCA_FILAS)
+        yield inicio
+        if primero is not None:
+            for i, dato in enumerate(itertools.chain([primero], datos)):
+                fila = '\n'.join([f"<td>{dato.get(h, '')}</td>" for h in headers_list])
+                separador = '' if i == 0 else '\n'
+                yield f"{separador}<tr>\n{fila}\n</tr>"
+        yield fin
     
-    def _guardar_archivo(self, contenido: str, tipo_reporte: str) -> str:
+    def _guardar_archivo(self, contenido: Iterable[str], tipo_reporte: str) -> str:
         """Guarda contenido en archivo HTML"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         archivo_name = f"{tipo_reporte}_{timestamp}.html"
         archivo_path = REPORTES_DIR / archivo_name
         
         with open(archivo_path, 'w', encoding='utf-8') as f:
-            f.write(contenido)
+            f.writelines(contenido)
         
         return str(archivo_path)
 
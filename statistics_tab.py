@@ -2,9 +2,98 @@ import customtkinter as ctk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from CTkMessagebox import CTkMessagebox
-from database import get_db_session
-from models import Pedido, Menu, Ingrediente, PedidoItem, MenuIngrediente
-from sqlalchemy import func, extract, cast, Date
+from database import session_scope
+from models import Pedido, Menu, Ingrediente, PedidoItem, MenuIngrediente, VentaDiaria
+from sqlalchemy import func
+from cache_manager import cache_funciones
+from periodos_sql import periodo_fecha
+
+# El bus de invalidación descarta los datos de los gráficos en cuanto se
+# confirma un cambio en las tablas de las que dependen, pero solo ve los
+# commits de este proceso: las ventas de otras terminales se reflejan al
+# vencer el TTL, que acota cuánto puede quedar desactualizado un gráfico.
+# Ventas y menús más comprados se leen del resumen ventas_diarias
+_TTL_RESPALDO = 60
+_TABLAS_VENTAS = ('ventas_diarias', 'menus', 'clientes')
+_TABLAS_CONSUMO = ('pedidos', 'pedido_items', 'menus', 'menu_ingredientes', 'ingredientes', 'clientes')
+
+# Rango del combobox -> periodo de agrupación (ver periodos_sql)
+_PERIODOS_RANGO = {
+    "Diarias": 'dia',
+    "Semanales": 'semana',
+    "Mensuales": 'mes',
+    "Anuales": 'anio',
+}
+
+
+@cache_funciones(ttl=_TTL_RESPALDO, invalidar_con=('clientes',))
+def _nombres_clientes():
+    """Nombres completos de todos los clientes"""
+    from models import Cliente
+    with session_scope() as session:
+        return [f"{nombre} {apellido}" for nombre, apellido in session.query(Cliente.nombre, Cliente.apellido)]
+
+
+def _filtrar_por_cliente(query, cliente_seleccionado, columna_cliente=Pedido.cliente_id):
+    """Filtra la consulta por el cliente "nombre apellido" seleccionado, uniendo por columna_cliente"""
+    from models import Cliente
+    if cliente_seleccionado == "Todos":
+        return query
+    nombre_apellido = cliente_seleccionado.split()
+    nombre = nombre_apellido[0]
+    apellido = " ".join(nombre_apellido[1:]) if len(nombre_apellido) > 1 else ""
+    return query.join(Cliente, columna_cliente == Cliente.id).filter(
+        (Cliente.nombre == nombre) & (Cliente.apellido == apellido)
+    )
+
+
+@cache_funciones(ttl=_TTL_RESPALDO, max_items=64, invalidar_con=_TABLAS_VENTAS)
+def _ventas_por_fecha(date_range, cliente_seleccionado):
+    """Lista de (periodo, total) para el rango indicado, o None si el rango no está soportado"""
+    if date_range not in _PERIODOS_RANGO:
+        return None
+    with session_scope() as session:
+        periodo = periodo_fecha(VentaDiaria.fecha, _PERIODOS_RANGO[date_range])
+        query = session.query(periodo, func.sum(VentaDiaria.total))
+        query = _filtrar_por_cliente(query, cliente_seleccionado, VentaDiaria.cliente_id)
+        sales_data = query.group_by(periodo).order_by(periodo).all()
+        return [tuple(row) for row in sales_data]
+
+
+@cache_funciones(ttl=_TTL_RESPALDO, max_items=64, invalidar_con=_TABLAS_VENTAS)
+def _menus_mas_comprados(cliente_seleccionado):
+    """Los 9 menús más vendidos como lista de (nombre, cantidad)"""
+    with session_scope() as session:
+        query = (session.query(
+            Menu.nombre,
+            func.sum(VentaDiaria.cantidad).label('total_vendido')
+        ).join(VentaDiaria, Menu.id == VentaDiaria.menu_id))
+        query = _filtrar_por_cliente(query, cliente_seleccionado, VentaDiaria.cliente_id)
+        top_menus_data = (query
+        .group_by(Menu.nombre)
+        .order_by(func.sum(VentaDiaria.cantidad).desc())
+        .limit(9)).all()
+        return [tuple(row) for row in top_menus_data]
+
+
+@cache_funciones(ttl=_TTL_RESPALDO, max_items=64, invalidar_con=_TABLAS_CONSUMO)
+def _uso_ingredientes(cliente_seleccionado):
+    """Los 9 ingredientes más usados como lista de (nombre, cantidad usada)"""
+    with session_scope() as session:
+        query = (session.query(
+            Ingrediente.nombre,
+            func.sum(PedidoItem.cantidad * MenuIngrediente.cantidad_necesaria).label('total_cantidad_usada')
+        ).join(MenuIngrediente, Ingrediente.id == MenuIngrediente.ingrediente_id)
+        .join(Menu, Menu.id == MenuIngrediente.menu_id)
+        .join(PedidoItem, Menu.id == PedidoItem.menu_id)
+        .join(Pedido, PedidoItem.pedido_id == Pedido.id))
+        query = _filtrar_por_cliente(query, cliente_seleccionado)
+        ingredient_usage_data = (query
+        .group_by(Ingrediente.nombre)
+        .order_by(func.sum(PedidoItem.cantidad * MenuIngrediente.cantidad_necesaria).desc())
+        .limit(9)).all()
+        return [tuple(row) for row in ingredient_usage_data]
+
 
 class StatisticsTab(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
@@ -74,16 +163,11 @@ class StatisticsTab(ctk.CTkFrame):
 
     def _obtener_clientes(self):
         """Obtiene lista de clientes de la base de datos"""
-        session = get_db_session()
         try:
-            from models import Cliente
-            clientes = session.query(Cliente).all()
-            return [f"{cliente.nombre} {cliente.apellido}" for cliente in clientes]
+            return _nombres_clientes()
         except Exception as e:
             CTkMessagebox(title="Error", message=f"Error al cargar clientes: {e}")
             return []
-        finally:
-            session.close()
 
     def on_cliente_selected(self, cliente_nombre):
         """Manejador cuando cambia el cliente seleccionado"""
@@ -122,43 +206,12 @@ class StatisticsTab(ctk.CTkFrame):
             self.generate_ingredient_usage_chart()
 
     def generate_sales_by_date_chart(self):
-        session = get_db_session()
         try:
-            from models import Cliente
             date_range = self.date_range_combobox.get()
             cliente_seleccionado = self.cliente_combobox.get()
             
-            # Base query con filtro de cliente si es necesario
-            query = session.query(Pedido)
-            if cliente_seleccionado != "Todos":
-                nombre_apellido = cliente_seleccionado.split()
-                nombre = nombre_apellido[0]
-                apellido = " ".join(nombre_apellido[1:]) if len(nombre_apellido) > 1 else ""
-                query = query.join(Cliente).filter(
-                    (Cliente.nombre == nombre) & (Cliente.apellido == apellido)
-                )
-            
-            if date_range == "Diarias":
-                sales_data = query.with_entities(
-                    cast(Pedido.fecha, Date),
-                    func.sum(Pedido.total)
-                ).group_by(cast(Pedido.fecha, Date)).order_by(cast(Pedido.fecha, Date)).all()
-            elif date_range == "Semanales":
-                sales_data = query.with_entities(
-                    func.to_char(Pedido.fecha, 'YYYY-WW'),
-                    func.sum(Pedido.total)
-                ).group_by(func.to_char(Pedido.fecha, 'YYYY-WW')).order_by(func.to_char(Pedido.fecha, 'YYYY-WW')).all()
-            elif date_range == "Mensuales":
-                sales_data = query.with_entities(
-                    func.to_char(Pedido.fecha, 'YYYY-MM'),
-                    func.sum(Pedido.total)
-                ).group_by(func.to_char(Pedido.fecha, 'YYYY-MM')).order_by(func.to_char(Pedido.fecha, 'YYYY-MM')).all()
-            elif date_range == "Anuales":
-                sales_data = query.with_entities(
-                    extract('year', Pedido.fecha),
-                    func.sum(Pedido.total)
-                ).group_by(extract('year', Pedido.fecha)).order_by(extract('year', Pedido.fecha)).all()
-            else:
+            sales_data = _ventas_por_fecha(date_range, cliente_seleccionado)
+            if sales_data is None:
                 self.show_no_data_message("Tipo de rango de fecha no soportado.")
                 return
 
@@ -188,35 +241,11 @@ class StatisticsTab(ctk.CTkFrame):
         except Exception as e:
             CTkMessagebox(title="Error de Gráfico", message=f"Error al generar el gráfico de ventas: {e}")
             self.show_no_data_message("Error al cargar los datos de ventas.")
-        finally:
-            session.close()
 
     def generate_top_menus_chart(self):
-        session = get_db_session()
         try:
-            from models import Cliente
             cliente_seleccionado = self.cliente_combobox.get()
-            
-            # Base query
-            query = (session.query(
-                Menu.nombre,
-                func.sum(PedidoItem.cantidad).label('total_vendido')
-            ).join(PedidoItem, Menu.id == PedidoItem.menu_id)
-            .join(Pedido, PedidoItem.pedido_id == Pedido.id))
-            
-            # Filtrar por cliente si es necesario
-            if cliente_seleccionado != "Todos":
-                nombre_apellido = cliente_seleccionado.split()
-                nombre = nombre_apellido[0]
-                apellido = " ".join(nombre_apellido[1:]) if len(nombre_apellido) > 1 else ""
-                query = query.join(Cliente, Pedido.cliente_id == Cliente.id).filter(
-                    (Cliente.nombre == nombre) & (Cliente.apellido == apellido)
-                )
-            
-            top_menus_data = (query
-            .group_by(Menu.nombre)
-            .order_by(func.sum(PedidoItem.cantidad).desc())
-            .limit(9)).all()
+            top_menus_data = _menus_mas_comprados(cliente_seleccionado)
 
             if not top_menus_data:
                 self.show_no_data_message("No hay datos de menús vendidos disponibles.")
@@ -244,37 +273,11 @@ class StatisticsTab(ctk.CTkFrame):
         except Exception as e:
             CTkMessagebox(title="Error de Gráfico", message=f"Error al generar el gráfico de menús: {e}")
             self.show_no_data_message("Error al cargar los datos de menús.")
-        finally:
-            session.close()
 
     def generate_ingredient_usage_chart(self):
-        session = get_db_session()
         try:
-            from models import Cliente
             cliente_seleccionado = self.cliente_combobox.get()
-            
-            # Base query
-            query = (session.query(
-                Ingrediente.nombre,
-                func.sum(PedidoItem.cantidad * MenuIngrediente.cantidad_necesaria).label('total_cantidad_usada')
-            ).join(MenuIngrediente, Ingrediente.id == MenuIngrediente.ingrediente_id)
-            .join(Menu, Menu.id == MenuIngrediente.menu_id)
-            .join(PedidoItem, Menu.id == PedidoItem.menu_id)
-            .join(Pedido, PedidoItem.pedido_id == Pedido.id))
-            
-            # Filtrar por cliente si es necesario
-            if cliente_seleccionado != "Todos":
-                nombre_apellido = cliente_seleccionado.split()
-                nombre = nombre_apellido[0]
-                apellido = " ".join(nombre_apellido[1:]) if len(nombre_apellido) > 1 else ""
-                query = query.join(Cliente, Pedido.cliente_id == Cliente.id).filter(
-                    (Cliente.nombre == nombre) & (Cliente.apellido == apellido)
-                )
-            
-            ingredient_usage_data = (query
-            .group_by(Ingrediente.nombre)
-            .order_by(func.sum(PedidoItem.cantidad * MenuIngrediente.cantidad_necesaria).desc())
-            .limit(9)).all()
+            ingredient_usage_data = _uso_ingredientes(cliente_seleccionado)
 
             if not ingredient_usage_data:
                 self.show_no_data_message("No hay datos de uso de ingredientes disponibles.")
@@ -299,6 +302,4 @@ class StatisticsTab(ctk.CTkFrame):
 
         except Exception as e:
             CTkMessagebox(title="Error de Gráfico", message=f"Error al generar el gráfico de ingredientes: {e}")
-            self.show_no_data_message("Error al cargar los datos de ingredientes.")
-        finally:
-            session.close()
\ No newline at end of file
+            self.show_no_data_message("Error al cargar los datos de ingredientes.")
\ No newline at end of file
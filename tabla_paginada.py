@@ -0,0 +1,128 @@
+"""
+Tabla paginada basada en ttk.Treeview.
+
+Muestra una página de filas a la vez y obtiene cada página mediante una
+función de carga (típicamente una consulta con paginación por clave en los
+módulos crud). Al refrescar, solo se insertan, modifican, mueven o eliminan
+las filas que cambiaron, en lugar de vaciar y rellenar la tabla completa.
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+import customtkinter as ctk
+from tkinter import ttk
+
+# (iid, valores) de cada fila de una página
+Fila = Tuple[str, Sequence[Any]]
+# cargar_pagina(cursor, limite) -> (filas, cursor de la página siguiente o None si es la última)
+CargadorPagina = Callable[[Optional[Hashable], int], Tuple[List[Fila], Optional[Hashable]]]
+
+
+class TablaPaginada(ctk.CTkFrame):
+    """
+    Treeview con navegación por páginas y actualización diferencial.
+
+    La tabla expone el Treeview en ``self.tree`` para enlazar eventos y leer
+    la selección igual que con un Treeview normal. Los iid de las filas son
+    la clave estable de cada registro, lo que permite conservar la selección
+    entre refrescos.
+    """
+
+    def __init__(self,
+                 master,
+                 columnas: Sequence[str],
+                 cargar_pagina: CargadorPagina,
+                 tamano_pagina: int = 200,
+                 height: int = 20,
+                 **kwargs):
+        super().__init__(master, **kwargs)
+        self.columnas = list(columnas)
+        self.cargar_pagina = cargar_pagina
+        self.tamano_pagina = tamano_pagina
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self, columns=self.columnas, show="headings", height=height)
+        for col in self.columnas:
+            self.tree.heading(col, text=col)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.tree["yscroll"] = scrollbar.set
+
+        frame_navegacion = ctk.CTkFrame(self, fg_color="transparent")
+        frame_navegacion.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        frame_navegacion.grid_columnconfigure(1, weight=1)
+
+        self.boton_anterior = ctk.CTkButton(frame_navegacion, text="< Anterior", width=90, command=self.pagina_anterior)
+        self.boton_anterior.grid(row=0, column=0, padx=5)
+        self.label_pagina = ctk.CTkLabel(frame_navegacion, text="Página 1")
+        self.label_pagina.grid(row=0, column=1)
+        self.boton_siguiente = ctk.CTkButton(frame_navegacion, text="Siguiente >", width=90, command=self.pagina_siguiente)
+        self.boton_siguiente.grid(row=0, column=2, padx=5)
+
+        # Cursor de inicio de cada página visitada; el último es la página actual
+        self._cursores: List[Optional[Hashable]] = [None]
+        self._cursor_siguiente: Optional[Hashable] = None
+        # Valores mostrados por iid, para comparar sin consultar al Treeview
+        self._valores: Dict[str, Tuple[str, ...]] = {}
+
+    def refrescar(self):
+        """Vuelve a cargar la página actual y aplica solo las diferencias."""
+        filas, self._cursor_siguiente = self.cargar_pagina(self._cursores[-1], self.tamano_pagina)
+        if not filas and len(self._cursores) > 1:
+            # La página quedó vacía (p. ej. se eliminaron registros): retroceder
+            self._cursores.pop()
+            filas, self._cursor_siguiente = self.cargar_pagina(self._cursores[-1], self.tamano_pagina)
+        self.sincronizar(filas)
+        self._actualizar_navegacion()
+
+    def reiniciar(self, cargar_pagina: Optional[CargadorPagina] = None):
+        """Vuelve a la primera página, opcionalmente con una nueva fuente de datos."""
+        if cargar_pagina is not None:
+            self.cargar_pagina = cargar_pagina
+        self._cursores = [None]
+        self.refrescar()
+
+    def pagina_siguiente(self):
+        if self._cursor_siguiente is None:
+            return
+        self._cursores.append(self._cursor_siguiente)
+        self.refrescar()
+
+    def pagina_anterior(self):
+        if len(self._cursores) <= 1:
+            return
+        self._cursores.pop()
+        self.refrescar()
+
+    def sincronizar(self, filas: List[Fila]):
+        """
+        Deja el Treeview con exactamente las filas indicadas, en ese orden,
+        tocando solo las filas nuevas, modificadas, movidas o eliminadas.
+        """
+        nuevos = {iid: tuple(str(v) for v in valores) for iid, valores in filas}
+
+        eliminados = [iid for iid in self._valores if iid not in nuevos]
+        if eliminados:
+            self.tree.delete(*eliminados)
+            for iid in eliminados:
+                del self._valores[iid]
+
+        for indice, (iid, _) in enumerate(filas):
+            valores = nuevos[iid]
+            actuales = self._valores.get(iid)
+            if actuales is None:
+                self.tree.insert("", indice, iid=iid, values=valores)
+            else:
+                if actuales != valores:
+                    self.tree.item(iid, values=valores)
+                if self.tree.index(iid) != indice:
+                    self.tree.move(iid, "", indice)
+            self._valores[iid] = valores
+
+    def _actualizar_navegacion(self):
+        self.label_pagina.configure(text=f"Página {len(self._cursores)}")
+        self.boton_anterior.configure(state="normal" if len(self._cursores) > 1 else "disabled")
+        self.boton_siguiente.configure(state="normal" if self._cursor_siguiente is not None else "disabled")